@@ -118,6 +118,21 @@ class LineItemImportAdmin(admin.ModelAdmin):
     )
 
 
+class LineItemUploadAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "fundcenter",
+        "costcenter",
+        "fy",
+        "user",
+        "delta",
+        "inserted",
+        "updated",
+        "orphaned",
+        "unchanged",
+    )
+
+
 class CostCenterChargeImportAdmin(admin.ModelAdmin):
     list_display = [
         "fund",
@@ -141,6 +156,7 @@ admin.site.register(BftUser, BftUserAdmin)
 admin.site.register(models.LineItem, LineItemAdmin)
 admin.site.register(models.LineForecast, LineForecastAdmin)
 admin.site.register(models.LineItemImport, LineItemImportAdmin)
+admin.site.register(models.LineItemUpload, LineItemUploadAdmin)
 admin.site.register(Fund, FundAdmin)
 admin.site.register(CostCenter, CostCenterAdmin)
 admin.site.register(Source)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BftConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bft"
+
+    def ready(self):
+        from bft import signals  # noqa: F401
@@ -1,6 +1,29 @@
 import pytest
 
 from bft.management.commands import uploadcsv
+from bft.models import BftStatusManager, FinancialStructureTree
+
+
+@pytest.fixture(autouse=True)
+def financial_structure_tree():
+    """Test transactions are rolled back without sending signals, start every test with a fresh tree."""
+    FinancialStructureTree.invalidate()
+    yield
+    FinancialStructureTree.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def bft_status():
+    """Statuses saved by a test are rolled back without sending signals, start every test with a fresh snapshot."""
+    BftStatusManager.invalidate()
+    yield
+    BftStatusManager.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def period_history_dir(settings, tmp_path):
+    """Keep the period history written by a test out of drmis_data."""
+    settings.PERIOD_HISTORY_DIR = tmp_path / "history"
 
 
 @pytest.fixture
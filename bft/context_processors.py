@@ -0,0 +1,7 @@
+from bft.models import BftStatus
+
+
+def bft_status(request) -> dict:
+    """Make the current status available to every template, as {{ bft_status.fy }}, {{ bft_status.quarter }} and
+    {{ bft_status.period }}.  Values are read from the cached snapshot, and only when a template uses them."""
+    return {"bft_status": BftStatus.current}
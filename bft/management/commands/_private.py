@@ -64,3 +64,18 @@ class UserInput(BaseCommand):
                 if not self._get_user_input(quarter):
                     quarter = None
         return quarter
+
+
+def add_snapshot_arguments(parser):
+    """Options of the commands that write a slice of a snapshot table, see reports.utils.SnapshotWriter."""
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Number of rows written per insert",
+    )
+    parser.add_argument(
+        "--insert-select",
+        action="store_true",
+        help="Write the rows with a single INSERT ... SELECT, without loading them in memory",
+    )
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bft.structureaudit import StructureAudit
+
+
+class Command(BaseCommand):
+    """Validate the financial structure, optionally repair it, and print a JSON report.  The command fails when
+    problems remain, so that it can gate the nightly downloads.
+    """
+
+    help = "Validate the financial structure and print a JSON report of the problems found."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Renumber sequences and levels from the parent of every element and rebuild the ancestor table",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default=None,
+            help="Write the report to this file instead of the standard output",
+        )
+
+    def handle(self, *args, **options):
+        audit = StructureAudit()
+        problems = audit.problems()
+        repaired = None
+        if options["repair"] and problems:
+            repaired = audit.repair()
+            audit = StructureAudit()
+            problems = audit.problems()
+
+        report = json.dumps(audit.report(problems, repaired), indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
+        if problems:
+            raise CommandError(f"Financial structure has {len(problems)} problems.")
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from bft.management.commands._private import UserInput
+from bft.management.commands._private import UserInput, add_snapshot_arguments
 from bft.models import CostCenter, CostCenterManager
 from reports.utils import CostCenterInYearEncumbranceReport
 
@@ -37,8 +37,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Print dataframe of monthly data for given cost center, fund, fy",
         )
+        add_snapshot_arguments(parser)
 
     def handle(self, *args, update, fy, view, costcenter, fund, **options):
+        self.batch_size = options.get("batch_size")
+        self.insert_select = options.get("insert_select")
         self.fund = fund
         self.fy = fy
         if view:
@@ -58,7 +61,7 @@ class Command(BaseCommand):
         self.stdout.write(style_func=self.style.SUCCESS, msg=f"UPDATING... In year for FY {fy}")
 
         c = CostCenterInYearEncumbranceReport(fy)
-        c.insert_line_items(c.sum_line_items())
+        c.insert_line_items(c.sum_line_items(), batch_size=self.batch_size, insert_select=self.insert_select)
 
     def show_in_year(self, fy, costcenter: str, fund: str):
         if costcenter:
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from bft.conf import PERIODKEYS
-from bft.management.commands._private import UserInput
+from bft.management.commands._private import UserInput, add_snapshot_arguments
 from bft.models import BftStatus, CostCenter, CostCenterManager
 from reports.utils import CostCenterMonthlyAllocationReport
 
@@ -49,8 +49,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Print dataframe of allocation data for given cost center, fund, fy and period",
         )
+        add_snapshot_arguments(parser)
 
     def handle(self, *args, update, fy, period, view, costcenter, fund, quarter, **options):
+        self.batch_size = options.get("batch_size")
+        self.insert_select = options.get("insert_select")
         self.fund = fund
         self.fy = fy
         self.quarter = quarter
@@ -80,7 +83,9 @@ class Command(BaseCommand):
 
         print(f"UPDATING... for FY {fy} and period {period} using quarter {quarter} as reference")
         c = CostCenterMonthlyAllocationReport(fy, period, quarter=quarter)
-        c.insert_grouped_allocation(c.sum_allocation_cost_center())
+        c.insert_grouped_allocation(
+            c.sum_allocation_cost_center(), batch_size=self.batch_size, insert_select=self.insert_select
+        )
 
     def show_monthly(self, fy, period, costcenter, fund):
         if costcenter:
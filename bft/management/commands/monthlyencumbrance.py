@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from bft.conf import PERIODKEYS
-from bft.management.commands._private import UserInput
+from bft.management.commands._private import UserInput, add_snapshot_arguments
 from bft.models import CostCenter, CostCenterManager
 from reports.utils import CostCenterMonthlyEncumbranceReport
 
@@ -43,8 +43,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Print dataframe of monthly data for given cost center, fund, fy and period",
         )
+        add_snapshot_arguments(parser)
 
     def handle(self, *args, update, fy, period, view, costcenter, fund, **options):
+        self.batch_size = options.get("batch_size")
+        self.insert_select = options.get("insert_select")
         self.fund = fund
         self.fy = fy
         if view:
@@ -67,7 +70,7 @@ class Command(BaseCommand):
 
         print(f"UPDATING... for FY {fy} and period {period}")
         c = CostCenterMonthlyEncumbranceReport(fy, period)
-        c.insert_line_items(c.sum_line_items())
+        c.insert_line_items(c.sum_line_items(), batch_size=self.batch_size, insert_select=self.insert_select)
 
     def show_monthly(self, fy, period, costcenter: str, fund: str):
         if costcenter:
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from bft.conf import PERIODKEYS
+from bft.management.commands._private import UserInput, add_snapshot_arguments
+from reports.utils import CostCenterMonthlySnapshot
+
+
+class Command(BaseCommand):
+    """A management command class to take the month-end snapshot of encumbrance, line item forecast, allocation,
+    forecast adjustment and in-year data in one run.  It replaces running monthlyencumbrance, monthlyallocation,
+    monthlyforecastadjustment, monthlyforecastlineitem and inyearencumbrance one after the other.
+    """
+
+    help = "Update all monthly tables and the in-year table for a FY and period in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fy",
+            action="store",
+            help="Use this FY for updating data",
+        )
+        parser.add_argument(
+            "--period",
+            action="store",
+            help="Use this Period for updating data",
+        )
+        parser.add_argument(
+            "--quarter",
+            action="store",
+            help="Use allocations from this quarter to populate the given period.",
+        )
+        add_snapshot_arguments(parser)
+
+    def handle(self, *args, fy, period, quarter, **options):
+        if period and period not in PERIODKEYS:
+            raise ValueError(f"Period [{period}] not valid.  Must be one of {PERIODKEYS}")
+        fy = UserInput().set_fy(fy=fy)
+        period = UserInput().set_period(period=period)
+        quarter = UserInput().set_quarter(quarter=quarter)
+        if not fy or not period or not quarter:
+            self.stdout.write(style_func=self.style.WARNING, msg="Operation cancelled")
+            return
+
+        self.stdout.write(f"UPDATING... for FY {fy} and period {period} using quarter {quarter} as reference")
+        counts = CostCenterMonthlySnapshot(fy, period, quarter=quarter).main(
+            options.get("batch_size"), options.get("insert_select")
+        )
+        for table, count in counts.items():
+            self.stdout.write(f"{table}: {count} rows")
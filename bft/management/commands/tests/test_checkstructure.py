@@ -0,0 +1,51 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from bft.models import CostCenter, CostCenterAncestor, FundCenter
+
+
+@pytest.mark.django_db
+class TestCheckStructure:
+    def call_command(self, command, *args, **kwargs):
+        out = StringIO()
+        call_command(command, *args, stdout=out, stderr=StringIO(), **kwargs)
+        return json.loads(out.getvalue())
+
+    def test_structure_is_valid(self):
+        call_command("populate")
+        report = self.call_command("checkstructure")
+        assert [] == report["problems"]
+        assert FundCenter.objects.count() == report["fundcenters"]
+
+    def test_problems_are_reported_and_repaired(self, tmp_path):
+        call_command("populate")
+        root = FundCenter.objects.get(fundcenter="0162ND")
+        child = FundCenter.objects.filter(fundcenter_parent=root).first()
+        FundCenter.objects.filter(pk=child.pk).update(level=9)
+        FundCenter.objects.filter(pk=root.pk).update(fundcenter_parent=child)
+        cc = CostCenter.objects.first()
+        CostCenter.objects.filter(pk=cc.pk).update(sequence="1.0.99.0.1")
+        CostCenterAncestor.objects.filter(costcenter=cc).delete()
+
+        output = tmp_path / "report.json"
+        with pytest.raises(CommandError):
+            call_command("checkstructure", output=str(output))
+        report = json.loads(output.read_text())
+        assert {"cycle": 2, "costcenter_marker": 1, "parent_sequence": 1, "wrong_level": 1} == {
+            check: n for check, n in report["counts"].items() if check != "stale_ancestors"
+        }
+        assert "1.0.99.0.1" in [p["sequence"] for p in report["problems"] if p["check"] == "stale_ancestors"]
+        assert {"check", "model", "id", "code", "sequence", "detail"} == set(report["problems"][0])
+
+        report = self.call_command("checkstructure", repair=True)
+        assert [] == report["problems"]
+        assert 1 == report["repaired"]["roots"]
+        root.refresh_from_db()
+        assert root.fundcenter_parent is None
+        assert 1 == root.level
+        cc.refresh_from_db()
+        assert cc.sequence.startswith(f"{cc.costcenter_parent.sequence}.0.")
@@ -0,0 +1,102 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from bft.models import BftStatus, CostCenterManager, ForecastAdjustment, FundManager, LineForecast, LineItem
+from reports.models import (
+    CostCenterInYearEncumbrance,
+    CostCenterMonthlyAllocation,
+    CostCenterMonthlyEncumbrance,
+    CostCenterMonthlyForecastAdjustment,
+    CostCenterMonthlyLineItemForecast,
+)
+
+MONTHLY_TABLES = [
+    CostCenterMonthlyEncumbrance,
+    CostCenterMonthlyLineItemForecast,
+    CostCenterMonthlyAllocation,
+    CostCenterMonthlyForecastAdjustment,
+]
+
+
+@pytest.mark.django_db
+class TestCommandMonthlySnapshot:
+    def call_command(self, command, *args, **kwargs):
+        out = StringIO()
+        call_command(
+            command,
+            *args,
+            stdout=out,
+            stderr=StringIO(),
+            **kwargs,
+        )
+        return out.getvalue()
+
+    def rows(self, model, period):
+        fields = [f.name for f in model._meta.fields if f.name not in ("id", "period")]
+        return sorted(model.objects.filter(period=period).values_list(*fields))
+
+    def test_snapshot_matches_monthly_commands(self):
+        self.call_command("populate")
+        self.call_command("uploadcsv", "test-data/encumbrance_2184A3.txt")
+        assert LineForecast.objects.exists()
+        ForecastAdjustment.objects.create(
+            costcenter=CostCenterManager().cost_center("8484WA"), fund=FundManager().fund("C113"), amount=10
+        )
+        args = ["--fy", "2023", "--period", "1"]
+        self.call_command("monthlyencumbrance", "--update", *args)
+        self.call_command("monthlyforecastlineitem", "--update", *args)
+        self.call_command("monthlyforecastadjustment", "--update", *args)
+        self.call_command("monthlyallocation", "--update", *args, "--quarter", "1")
+        self.call_command("inyearencumbrance", "--update", "--fy", "2023")
+        inyear = self.rows(CostCenterInYearEncumbrance, "")
+
+        status = BftStatus.objects.get(status="PERIOD")
+        status.value = "2"
+        status.save()
+
+        out = self.call_command("monthlysnapshot", "--fy", "2023", "--period", "2", "--quarter", "1")
+        assert "CostCenterMonthlyEncumbrance: 2 rows" in out
+        for model in MONTHLY_TABLES:
+            assert self.rows(model, "2"), model.__name__
+            assert self.rows(model, "1") == self.rows(model, "2"), model.__name__
+        assert inyear == self.rows(CostCenterInYearEncumbrance, "")
+
+        # Running the snapshot again replaces the period
+        self.call_command("monthlysnapshot", "--fy", "2023", "--period", "2", "--quarter", "1")
+        for model in MONTHLY_TABLES:
+            assert self.rows(model, "1") == self.rows(model, "2"), model.__name__
+
+    def test_snapshot_without_line_items_keeps_encumbrance(self):
+        self.call_command("populate")
+        self.call_command("uploadcsv", "test-data/encumbrance_2184A3.txt")
+        args = ["--fy", "2023", "--period", "1", "--quarter", "1"]
+        self.call_command("monthlysnapshot", *args)
+        encumbrance = self.rows(CostCenterMonthlyEncumbrance, "1")
+        inyear = self.rows(CostCenterInYearEncumbrance, "")
+        assert encumbrance
+
+        LineItem.objects.all().delete()
+        self.call_command("monthlysnapshot", *args)
+
+        assert encumbrance == self.rows(CostCenterMonthlyEncumbrance, "1")
+        assert inyear == self.rows(CostCenterInYearEncumbrance, "")
+
+    def test_snapshot_with_insert_select(self):
+        self.call_command("populate")
+        self.call_command("uploadcsv", "test-data/encumbrance_2184A3.txt")
+        ForecastAdjustment.objects.create(
+            costcenter=CostCenterManager().cost_center("8484WA"), fund=FundManager().fund("C113"), amount=10
+        )
+        args = ["--fy", "2023", "--period", "1", "--quarter", "1"]
+        self.call_command("monthlysnapshot", *args)
+        rows = {model: self.rows(model, "1") for model in MONTHLY_TABLES}
+        inyear = self.rows(CostCenterInYearEncumbrance, "")
+
+        out = self.call_command("monthlysnapshot", *args, "--insert-select")
+        assert "CostCenterMonthlyEncumbrance: 2 rows" in out
+        for model in MONTHLY_TABLES:
+            assert rows[model], model.__name__
+            assert rows[model] == self.rows(model, "1"), model.__name__
+        assert inyear == self.rows(CostCenterInYearEncumbrance, "")
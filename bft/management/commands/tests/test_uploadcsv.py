@@ -1,7 +1,12 @@
+import glob
+import os
+import shutil
+
 import pytest
 from django.core.management import call_command
 
-from bft.models import CostCenterManager, LineItem, LineItemManager
+from bft.models import CostCenterManager, LineItem, LineItemManager, LineItemUpload
+from bft.uploadprocessor import LineItemProcessor
 
 
 @pytest.mark.django_db
@@ -22,3 +27,32 @@ class TestCommandUploadCsv:
         mgr = LineItemManager()
         assert mgr.has_line_items(ccmgr.cost_center("8484wa"))
         assert 7 == LineItem.objects.count()
+
+    def test_running_uploadbatch_has_lines(self, tmp_path):
+        """Check that a batch upload records one upload for all reports."""
+        self.call_command("populate")
+        shutil.copy("test-data/encumbrance_2184A3.txt", tmp_path)
+        self.call_command("uploadbatch", str(tmp_path), workers=1)
+        assert 7 == LineItem.objects.count()
+        upload = LineItemUpload.objects.get()
+        assert "" == upload.fundcenter
+        assert 7 == upload.inserted
+        assert [] == glob.glob(os.path.join(LineItemProcessor.DRMIS_DIR, "encumbrance-*.csv"))
+
+    def test_uploadbatch_keeps_lines_of_other_fund_centers(self, tmp_path):
+        self.call_command("populate")
+        self.call_command("uploadcsv", "test-data/encumbrance_2184A3.txt")
+        with open("test-data/encumbrance_2184A3.txt", encoding="windows-1252") as f:
+            report = [line.replace("2184A3", "2184A6") for line in f if not line.startswith("|1")]
+        (tmp_path / "encumbrance_2184A6.txt").write_text("".join(report), encoding="windows-1252")
+        self.call_command("uploadbatch", str(tmp_path), workers=1)
+        assert 0 == LineItemUpload.objects.get(fundcenter="").orphaned
+        assert not LineItem.objects.filter(workingplan=0).exists()
+
+    def test_uploadbatch_cancelled_on_invalid_report(self, tmp_path):
+        self.call_command("populate")
+        shutil.copy("test-data/encumbrance_2184A3.txt", tmp_path)
+        (tmp_path / "other.txt").write_text("DND Some Other Report\n\nFunds Center :     2184DA\n")
+        self.call_command("uploadbatch", str(tmp_path), workers=1)
+        assert 0 == LineItem.objects.count()
+        assert not LineItemUpload.objects.exists()
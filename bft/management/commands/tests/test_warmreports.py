@@ -0,0 +1,28 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from bft.models import DataVersion
+from reports.models import ReportCacheEntry
+
+
+@pytest.mark.django_db
+class TestCommandWarmReports:
+    def test_warm_top_fundcenters(self):
+        call_command("populate", stdout=StringIO())
+        call_command("uploadcsv", "test-data/encumbrance_2184A3.txt", stdout=StringIO())
+        out = StringIO()
+        call_command("warmreports", "--fy", "2023", "--quarter", "1", "--level", "2", "--fund", "c113", stdout=out)
+
+        keys = set(ReportCacheEntry.objects.values_list("key", flat=True))
+        assert 4 == len(keys)  # 0162ND and 0153ZZ, screening and allocation status
+        assert "screening?fund=C113&fundcenter=0153ZZ&fy=2023&quarter=1" in keys
+        assert {DataVersion.objects.current()} == set(ReportCacheEntry.objects.values_list("version", flat=True))
+        assert "4 reports cached" in out.getvalue()
+
+    def test_clear(self):
+        call_command("populate", stdout=StringIO())
+        ReportCacheEntry.objects.create(key="stale", version=0, used="2023-01-01T00:00Z")
+        call_command("warmreports", "--fy", "2023", "--quarter", "1", "--level", "1", "--clear", stdout=StringIO())
+        assert not ReportCacheEntry.objects.filter(key="stale").exists()
@@ -0,0 +1,67 @@
+import glob
+import logging
+import os
+
+from django.core.management.base import BaseCommand
+
+from bft.uploadprocessor import LineItemBatchProcessor, LineItemProcessor
+
+logger = logging.getLogger("uploadcsv")
+
+
+class Command(BaseCommand):
+    """Import many Encumbrance reports into Line item table in one run.  Reports are parsed in parallel and
+    imported together, so all fund centers are updated at once or not at all.  Line items of fund centers that
+    have no report in the batch are left as they are.
+    """
+
+    help = (
+        "Import many Encumbrance reports into Line item table.  Only line items under the fund centers of the "
+        "reports can become orphans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "reports",
+            type=str,
+            help="Directory containing the encumbrance reports (*.txt) or a glob pattern matching them",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of processes used to parse the reports, defaults to the number of CPUs",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=LineItemProcessor.BATCH_SIZE,
+            help="Number of lines written per insert in the encumbrance import table",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only update line items whose content changed since the last upload",
+        )
+
+    def handle(self, *args, **options):
+        pattern = options["reports"]
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.txt")
+        filepaths = sorted(os.path.realpath(f) for f in glob.glob(pattern))
+        if not filepaths:
+            logger.warning(f"No encumbrance report found in {options['reports']}")
+            return
+
+        logger.info(f"-- BFT batch download starts, {len(filepaths)} reports")
+        batch = LineItemBatchProcessor(
+            filepaths, options.get("workers"), options.get("batch_size"), options.get("delta")
+        )
+        counts = batch.main()
+        if counts:
+            self.stdout.write(
+                f"{len(filepaths)} reports imported: {counts['inserted']} new lines, {counts['updated']} updated lines, "
+                f"{counts['unchanged']} unchanged lines, {counts['orphaned']} orphan lines."
+            )
+        else:
+            self.stderr.write("Batch upload cancelled, see upload log for details.")
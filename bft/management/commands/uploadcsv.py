@@ -22,6 +22,17 @@ class Command(BaseCommand):
             type=str,
             help="Encumbrance report full path",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=LineItemProcessor.BATCH_SIZE,
+            help="Number of lines written per insert in the encumbrance import table",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only update line items whose content changed since the last upload",
+        )
 
     def handle(self, *args, **options):
         LineItemImport.objects.all().delete()
@@ -30,7 +41,7 @@ class Command(BaseCommand):
         if os.path.exists(rawtextfile):
             logger.info("-- BFT Download starts")
             rawtextfile = os.path.realpath(rawtextfile)
-            er = LineItemProcessor(rawtextfile, None)
+            er = LineItemProcessor(rawtextfile, None, options.get("batch_size"), options.get("delta", False))
             if er.main():
                 logger.info("Encumbrance data saved as csv and import raw table filled")
                 li = LineItem()
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bft.models import BftStatusManager, Fund, FundCenter
+from reports.reportcache import ReportCache, allocation_status_report, screening_report
+
+
+class Command(BaseCommand):
+    """Build the screening and allocation status reports of the top fund centers, so that they are cached before
+    anyone asks for them.  Meant to run after the nightly download, which outdates every cached report.
+    """
+
+    help = "Pre-build the screening and allocation status reports of the top fund centers for every fund."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fy",
+            action="store",
+            help="Fiscal year of the reports.  Defaults to the current FY.",
+        )
+        parser.add_argument(
+            "--quarter",
+            action="store",
+            help="Quarter of the reports.  Defaults to the current quarter.",
+        )
+        parser.add_argument(
+            "--level",
+            type=int,
+            default=2,
+            help="Warm the reports of fund centers down to this level of the financial structure.",
+        )
+        parser.add_argument(
+            "--fund",
+            action="append",
+            help="Warm the reports of this fund only.  Can be repeated.  Defaults to all funds.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Drop every cached report first.",
+        )
+
+    def handle(self, *args, fy, quarter, level, fund, clear, **options):
+        status = BftStatusManager()
+        fy = fy or status.fy()
+        quarter = quarter or status.quarter()
+        if not fy or not quarter:
+            raise CommandError("FY and quarter must be given or set in BFT status.")
+        if fund:
+            funds = [f.upper() for f in fund]
+        else:
+            funds = list(Fund.objects.order_by("fund").values_list("fund", flat=True))
+        fundcenters = FundCenter.objects.filter(level__lte=level).order_by("sequence")
+        fundcenters = list(fundcenters.values_list("fundcenter", flat=True))
+
+        if clear:
+            self.stdout.write(f"{ReportCache.clear()} cached reports dropped")
+        built = 0
+        for fundcenter in fundcenters:
+            for fund_code in funds:
+                screening_report(fundcenter, fund_code, fy, quarter)
+                allocation_status_report(fundcenter, fund_code, fy, quarter)
+                built += 2
+        self.stdout.write(
+            style_func=self.style.SUCCESS,
+            msg=f"{built} reports cached for {len(fundcenters)} fund centers and {len(funds)} funds, "
+            f"FY {fy} Q{quarter}",
+        )
@@ -0,0 +1,23 @@
+from bft.models import BftStatusManager, ReferenceData
+
+
+class ReferenceDataMiddleware:
+    """Resolve funds, sources, fund centers and cost centers from one identity map per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ReferenceData.scope():
+            return self.get_response(request)
+
+
+class BftStatusMiddleware:
+    """Read the BFT status again once per request, so that a status saved by another process is seen."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with BftStatusManager.scope():
+            return self.get_response(request)
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bft", "0002_alter_capitalinyear_fy_alter_capitalnewyear_fy_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LineItemUpload",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("fundcenter", models.CharField(max_length=6)),
+                ("fy", models.CharField(max_length=4)),
+                ("costcenter", models.CharField(blank=True, default="", max_length=6)),
+                ("user", models.CharField(max_length=150)),
+                ("delta", models.BooleanField(default=False)),
+                ("inserted", models.PositiveIntegerField(default=0)),
+                ("updated", models.PositiveIntegerField(default=0)),
+                ("orphaned", models.PositiveIntegerField(default=0)),
+                ("unchanged", models.PositiveIntegerField(default=0)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "Line Item Uploads",
+                "ordering": ["-created"],
+            },
+        ),
+        migrations.AddField(
+            model_name="lineitem",
+            name="contenthash",
+            field=models.CharField(blank=True, default="", max_length=40),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bft", "0003_lineitemupload_lineitem_contenthash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fundcenter",
+            index=models.Index(fields=["sequence"], name="bft_fundcen_sequenc_53ea56_idx"),
+        ),
+    ]
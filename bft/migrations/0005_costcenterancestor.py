@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_ancestors(apps, schema_editor):
+    FundCenter = apps.get_model("bft", "FundCenter")
+    CostCenter = apps.get_model("bft", "CostCenter")
+    CostCenterAncestor = apps.get_model("bft", "CostCenterAncestor")
+    fundcenters = {fc.id: fc for fc in FundCenter.objects.only("id", "sequence", "fundcenter_parent_id")}
+    rows = []
+    for cc in CostCenter.objects.only("id", "costcenter_parent_id"):
+        fc, seen = fundcenters.get(cc.costcenter_parent_id), set()
+        while fc and fc.id not in seen:
+            seen.add(fc.id)
+            rows.append(
+                CostCenterAncestor(costcenter_id=cc.id, fundcenter_id=fc.id, level=len(fc.sequence.split(".")))
+            )
+            fc = fundcenters.get(fc.fundcenter_parent_id)
+    CostCenterAncestor.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bft", "0004_fundcenter_bft_fundcen_sequenc_53ea56_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CostCenterAncestor",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("level", models.PositiveSmallIntegerField()),
+                (
+                    "costcenter",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="ancestors", to="bft.costcenter"
+                    ),
+                ),
+                (
+                    "fundcenter",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="costcenter_descendants",
+                        to="bft.fundcenter",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Cost Center Ancestors",
+                "indexes": [models.Index(fields=["level", "fundcenter"], name="bft_costcen_level_a17d04_idx")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="costcenterancestor",
+            constraint=models.UniqueConstraint(
+                fields=("costcenter", "level"), name="bft_costcenterancestor_is_unique"
+            ),
+        ),
+        migrations.RunPython(populate_ancestors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
 import csv
+import hashlib
 import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator
 
 import numpy as np
 import pandas as pd
@@ -9,8 +16,9 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.db import IntegrityError, models
-from django.db.models import F, QuerySet, Sum, Value
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Concat, Substr
 from django.forms.models import model_to_dict
 from pandas.io.formats.style import Styler
 
@@ -29,6 +37,11 @@ class BftStatusManager(models.Manager):
     This manager provides methods to retrieve specific status values from the BftStatus model,
     focusing on fiscal year (FY), quarter, and period information.
 
+    The values are read with one query and shared by the threads of the process, but they are not kept for the
+    life of the process: statuses are also saved by other processes, such as the other web workers and the
+    management commands.  The status table holds a few rows, reading them costs no more than reading a stamp of
+    them, so the values are read again once per request instead (see scope()).
+
     Methods:
         fy() -> str | None:
             Retrieves the value associated with the "FY" status.
@@ -43,23 +56,51 @@ class BftStatusManager(models.Manager):
             Returns None if the status does not exist.
     """
 
-    def fy(self) -> str | None:
+    _lock = threading.Lock()
+    _local = threading.local()
+    _snapshot = None
+
+    @classmethod
+    @contextmanager
+    def scope(cls) -> Iterator[None]:
+        """Reload the snapshot on its first read within the with block, and only then, so that a status saved by
+        another process is seen by the next request (see bft.middleware.BftStatusMiddleware).  Scopes are per
+        thread and nested scopes are part of the outermost one."""
+        if getattr(cls._local, "active", False):
+            yield
+            return
+        cls._local.active, cls._local.fresh = True, False
         try:
-            return BftStatus.objects.get(status="FY").value
-        except BftStatus.DoesNotExist:
-            return None
+            yield
+        finally:
+            cls._local.active = False
+
+    def snapshot(self) -> dict:
+        """Value of every status, as {status: value}.  The values are reloaded on the first read of a scope, and
+        are otherwise kept until invalidate() is called, which happens whenever a BftStatus is saved or deleted
+        (see bft.signals)."""
+        cls = BftStatusManager
+        local = cls._local
+        with cls._lock:
+            if cls._snapshot is None or (getattr(local, "active", False) and not local.fresh):
+                cls._snapshot = dict(BftStatus.objects.values_list("status", "value"))
+            local.fresh = True
+            return cls._snapshot
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Drops the snapshot.  The next read reloads it."""
+        with cls._lock:
+            cls._snapshot = None
+
+    def fy(self) -> str | None:
+        return self.snapshot().get("FY")
 
     def quarter(self) -> str | None:
-        try:
-            return BftStatus.objects.get(status="QUARTER").value
-        except BftStatus.DoesNotExist:
-            return None
+        return self.snapshot().get("QUARTER")
 
     def period(self) -> str | None:
-        try:
-            return BftStatus.objects.get(status="PERIOD").value
-        except BftStatus.DoesNotExist:
-            return None
+        return self.snapshot().get("PERIOD")
 
 
 class BftStatus(models.Model):
@@ -116,6 +157,37 @@ class BftStatus(models.Model):
     current = BftStatusManager()
 
 
+class DataVersionManager(models.Manager):
+    def current(self) -> int:
+        """Current version of the financial data, 0 until the data changes for the first time."""
+        return self.values_list("version", flat=True).first() or 0
+
+    def bump(self) -> None:
+        """Marks every result computed from the financial data as outdated.  Called by the signals of the models
+        that reports are made of (see bft.signals), and by bulk operations that do not send signals."""
+        if not self.filter(pk=1).update(version=F("version") + 1):
+            self.get_or_create(pk=1, defaults={"version": 1})
+
+
+class DataVersion(models.Model):
+    """A single row holding a stamp of the financial data: line items, forecasts, allocations and the financial
+    structure.  The stamp changes whenever any of them does, so that results cached by other processes, such as
+    reports.reportcache.ReportCache, can tell they are outdated.
+
+    Attributes:
+        version (int): Increased by one with every change.
+        updated (DateTime): When the data last changed.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = DataVersionManager()
+
+    def __str__(self) -> str:
+        return f"{self.version}"
+
+
 class BftUserManager(BaseUserManager):
     """BftUserManager class for managing BFT user accounts.
 
@@ -473,7 +545,9 @@ class FundManager(models.Manager):
             ... else:
             ...     print("Fund not found")
         """
-
+        references = ReferenceData.current()
+        if references:
+            return references.fund(fund)
         try:
             obj = Fund.objects.get(fund__iexact=fund)
         except Fund.DoesNotExist:
@@ -667,6 +741,9 @@ class SourceManager(models.Manager):
             >>> source_obj = source('example_source')
             >>> print(source_obj)  # Returns Source object or None
         """
+        references = ReferenceData.current()
+        if references:
+            return references.source(source)
         try:
             obj = Source.objects.get(source__iexact=source)
         except Source.DoesNotExist:
@@ -783,15 +860,10 @@ class FundCenterManager(models.Manager):
         Note:
             The search is case-insensitive, but the input is converted to uppercase before querying.
         """
-
-        fundcenter = fundcenter.upper()
-        try:
-            obj = FundCenter.objects.filter(fundcenter__iexact=fundcenter)[0]
-        except FundCenter.DoesNotExist:
-            return None
-        except IndexError:
-            return None
-        return obj
+        references = ReferenceData.current()
+        if references:
+            return references.fundcenter(fundcenter)
+        return FundCenter.objects.filter(fundcenter=fundcenter.upper()).first()
 
     def pk(self, pk: int):
         """
@@ -950,9 +1022,8 @@ class FundCenterManager(models.Manager):
         if not fundcenter:
             return []
         if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
-            except FundCenter.DoesNotExist:
+            fundcenter = self.fundcenter(fundcenter)
+            if not fundcenter:
                 return None
         return self.get_fund_centers(fundcenter) + self.get_cost_centers(fundcenter)
 
@@ -978,9 +1049,8 @@ class FundCenterManager(models.Manager):
         """
 
         if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
-            except FundCenter.DoesNotExist:
+            fundcenter = self.fundcenter(fundcenter)
+            if not fundcenter:
                 return None
         fc = pd.DataFrame(self.get_fund_centers(fundcenter))
         cc = pd.DataFrame(self.get_cost_centers(fundcenter))
@@ -1067,6 +1137,209 @@ class FundCenterManager(models.Manager):
             return None
 
 
+#: One fund center or cost center of the financial structure, as held by FinancialStructureTree.
+StructureNode = namedtuple("StructureNode", "id code sequence parent")
+
+
+class FinancialStructureTree:
+    """An in-memory snapshot of the financial structure, shared by the whole process.
+
+    The fund centers and the cost centers are loaded with one query each.  Parent, children and descendants
+    of any element are then found with dictionary lookups.  Use FinancialStructureTree.get() to obtain the
+    current tree.  The tree is rebuilt on first use after invalidate() is called, which happens whenever a
+    FundCenter or CostCenter is saved or deleted (see bft.signals).  Changes made by other processes, or with
+    QuerySet.update(), do not send signals; the tree is therefore also rebuilt once it is older than MAX_AGE
+    seconds.
+
+    Attributes:
+        version (int): Version of the structure the tree was built from.
+        fundcenters (dict): StructureNode of every fund center, keyed by fund center code.
+        costcenters (dict): StructureNode of every cost center, keyed by cost center code.
+        sequences (dict): StructureNode of every fund center and cost center, keyed by sequence number.
+    """
+
+    #: Seconds after which the tree is rebuilt even if it was not invalidated.
+    MAX_AGE = 300
+
+    _lock = threading.Lock()
+    _version = 0
+    _tree = None
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.built = time.monotonic()
+        self.fundcenters = {}
+        self.costcenters = {}
+        self.sequences = {}
+        self._fundcenter_children = defaultdict(list)
+        self._costcenter_children = defaultdict(list)
+        self._fundcenter_descendants = defaultdict(list)
+        self._costcenter_descendants = defaultdict(list)
+        self._load()
+
+    def _load(self):
+        fundcenters = FundCenter.objects.order_by("id").values_list(
+            "id", "fundcenter", "sequence", "fundcenter_parent__fundcenter"
+        )
+        for row in fundcenters:
+            node = StructureNode(*row)
+            self.fundcenters[node.code] = node
+            self.sequences[node.sequence] = node
+        costcenters = CostCenter.objects.order_by("id").values_list(
+            "id", "costcenter", "sequence", "costcenter_parent__fundcenter"
+        )
+        for row in costcenters:
+            node = StructureNode(*row)
+            self.costcenters[node.code] = node
+            self.sequences[node.sequence] = node
+
+        for node in self.fundcenters.values():
+            self._fundcenter_children[node.parent].append(node.code)
+            for ancestor in self._ancestors(node.parent):
+                self._fundcenter_descendants[ancestor].append(node.code)
+        for node in self.costcenters.values():
+            self._costcenter_children[node.parent].append(node.code)
+            for ancestor in self._ancestors(node.parent):
+                self._costcenter_descendants[ancestor].append(node.code)
+
+    def _ancestors(self, fundcenter: str | None) -> list[str]:
+        ancestors = []
+        while fundcenter and fundcenter not in ancestors:
+            ancestors.append(fundcenter)
+            fundcenter = self.fundcenters[fundcenter].parent if fundcenter in self.fundcenters else None
+        return ancestors
+
+    @classmethod
+    def get(cls) -> "FinancialStructureTree":
+        """Returns the current tree, building it if the structure changed since it was last built."""
+        with cls._lock:
+            tree = cls._tree
+            if tree is None or tree.version != cls._version or time.monotonic() - tree.built > cls.MAX_AGE:
+                tree = cls._tree = cls(cls._version)
+            return tree
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Marks the current tree as outdated.  The next call to get() rebuilds it."""
+        with cls._lock:
+            cls._version += 1
+            cls._tree = None
+
+    def fundcenter_parent(self, fundcenter: str) -> str | None:
+        node = self.fundcenters.get(fundcenter)
+        return node.parent if node else None
+
+    def costcenter_parent(self, costcenter: str) -> str | None:
+        node = self.costcenters.get(costcenter)
+        return node.parent if node else None
+
+    def fundcenter_ancestors(self, fundcenter: str) -> list[str]:
+        """Fund center codes from fundcenter up to its root, fundcenter included."""
+        return self._ancestors(fundcenter)
+
+    def roots(self) -> list[str]:
+        """Fund center codes that have no parent."""
+        return self._fundcenter_children.get(None, [])
+
+    def fundcenter_children(self, fundcenter: str) -> list[str]:
+        """Fund center codes whose parent is fundcenter."""
+        return self._fundcenter_children.get(fundcenter, []) if fundcenter else []
+
+    def costcenter_children(self, fundcenter: str) -> list[str]:
+        """Cost center codes whose parent is fundcenter."""
+        return self._costcenter_children.get(fundcenter, []) if fundcenter else []
+
+    def fundcenter_descendants(self, fundcenter: str) -> list[str]:
+        """Fund center codes found anywhere below fundcenter, fundcenter excluded."""
+        return self._fundcenter_descendants.get(fundcenter, [])
+
+    def costcenter_descendants(self, fundcenter: str) -> list[str]:
+        """Cost center codes found anywhere below fundcenter."""
+        return self._costcenter_descendants.get(fundcenter, [])
+
+    def sequence_children(self, sequence: str) -> list[str]:
+        """Sequence numbers of the fund centers and cost centers whose parent has the given sequence number."""
+        node = self.sequences.get(sequence)
+        if node is None or self.fundcenters.get(node.code) is not node:
+            return []  # Cost centers have no children
+        return [self.fundcenters[fc].sequence for fc in self.fundcenter_children(node.code)] + [
+            self.costcenters[cc].sequence for cc in self.costcenter_children(node.code)
+        ]
+
+
+class ReferenceData:
+    """An identity map of the reference tables, Fund, Source, FundCenter and CostCenter, keyed by code.
+
+    Lookups made through FundManager().fund(), SourceManager().source(), FundCenterManager().fundcenter(),
+    CostCenterManager().cost_center() and the AllocationQuerySet filters become dictionary hits while a scope is
+    active.  Each table is loaded whole, with one query, the first time one of its codes is looked up in the scope.
+    Outside of a scope, lookups query the database as usual.
+
+    A scope lasts for one HTTP request (see bft.middleware.ReferenceDataMiddleware) or one upload job.  Scopes are
+    per thread and nested scopes share the identity map of the outermost one.  Tables are reloaded on next use after
+    invalidate() is called, which happens whenever one of their rows is saved or deleted (see bft.signals) and after
+    bulk changes to the financial structure.
+
+    Usage:
+        with ReferenceData.scope() as references:
+            fund = references.fund("C113")
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _versions = defaultdict(int)
+
+    def __init__(self):
+        self._tables = {}
+
+    @classmethod
+    def current(cls) -> "ReferenceData | None":
+        """The identity map of the active scope, None when no scope is active."""
+        return getattr(cls._local, "references", None)
+
+    @classmethod
+    @contextmanager
+    def scope(cls) -> Iterator["ReferenceData"]:
+        """Activate an identity map for the duration of the with block."""
+        references = cls.current()
+        if references is not None:
+            yield references
+            return
+        cls._local.references = references = cls()
+        try:
+            yield references
+        finally:
+            cls._local.references = None
+
+    @classmethod
+    def invalidate(cls, *models) -> None:
+        """Marks the tables of the given models as outdated in every scope."""
+        with cls._lock:
+            for model in models:
+                cls._versions[model] += 1
+
+    def _table(self, model, field: str, related: tuple = ()) -> dict:
+        version, table = self._tables.get(model, (None, None))
+        if version != self._versions[model]:
+            version = self._versions[model]
+            table = {getattr(obj, field).upper(): obj for obj in model.objects.select_related(*related)}
+            self._tables[model] = (version, table)
+        return table
+
+    def fund(self, fund: str) -> "Fund | None":
+        return self._table(Fund, "fund").get(str(fund).upper())
+
+    def source(self, source: str) -> "Source | None":
+        return self._table(Source, "source").get(str(source).upper())
+
+    def fundcenter(self, fundcenter: str) -> "FundCenter | None":
+        return self._table(FundCenter, "fundcenter", ("fundcenter_parent",)).get(str(fundcenter).upper())
+
+    def costcenter(self, costcenter: str) -> "CostCenter | None":
+        table = self._table(CostCenter, "costcenter", ("fund", "source", "costcenter_parent"))
+        return table.get(str(costcenter).upper())
+
+
 class FinancialStructureManager(models.Manager):
     """A Django model manager class for handling financial structure operations.
 
@@ -1124,8 +1397,11 @@ class FinancialStructureManager(models.Manager):
         new_root() -> str:
             Creates a new root sequence number.
 
-        financial_structure_dataframe() -> pd.DataFrame:
-            Creates a pandas DataFrame representing the entire financial structure.
+        financial_structure_rows(root: "FundCenter|str" = None) -> Iterator[dict]:
+            Yields the financial structure report rows in sequence order, optionally from a subtree root.
+
+        financial_structure_dataframe(root: "FundCenter|str" = None) -> pd.DataFrame:
+            Creates a pandas DataFrame representing the financial structure.
 
         financial_structure_styler(data: pd.DataFrame):
             Applies styling to the financial structure DataFrame.
@@ -1161,7 +1437,7 @@ class FinancialStructureManager(models.Manager):
             if fundcenter:
                 obj = FundCenter.objects.filter(fundcenter=fundcenter.upper())
             elif seqno:
-                obj = FundCenter.objects.filter(sequence__startswith=seqno)
+                obj = FundCenter.objects.filter(self.descendants_filter(seqno))
             elif fcid:
                 obj = FundCenter.objects.filter(id=fcid)
             else:
@@ -1184,11 +1460,6 @@ class FinancialStructureManager(models.Manager):
                 Returns 0 if the fund center does not exist.
         """
 
-        if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter)
-            except FundCenter.DoesNotExist:
-                return 0
         return self.has_cost_centers(fundcenter) + self.has_fund_centers(fundcenter)
 
     def has_fund_centers(self, fundcenter: "FundCenter|str") -> int:
@@ -1202,12 +1473,9 @@ class FinancialStructureManager(models.Manager):
             int: Number of child fund centers associated with the given fund center.
                  Returns 0 if fund center doesn't exist.
         """
-        if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter)
-            except FundCenter.DoesNotExist:
-                return 0
-        return FundCenter.objects.filter(fundcenter_parent=fundcenter).count()
+        if isinstance(fundcenter, FundCenter):
+            fundcenter = fundcenter.fundcenter
+        return len(FinancialStructureTree.get().fundcenter_children(fundcenter))
 
     def has_cost_centers(self, fundcenter: "FundCenter|str") -> int:
         """
@@ -1226,12 +1494,9 @@ class FinancialStructureManager(models.Manager):
             >>> fc.has_cost_centers()
             2  # Returns number of associated cost centers
         """
-        if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter)
-            except FundCenter.DoesNotExist:
-                return 0
-        return CostCenter.objects.filter(costcenter_parent=fundcenter).count()
+        if isinstance(fundcenter, FundCenter):
+            fundcenter = fundcenter.fundcenter
+        return len(FinancialStructureTree.get().costcenter_children(fundcenter))
 
     def is_child_of(
         self, parent: "FundCenter", child: "FundCenter | CostCenter"
@@ -1244,29 +1509,24 @@ class FinancialStructureManager(models.Manager):
 
         Returns:
             bool: True is child is direct descendant of parent.
+
+        Note:
+            FundCenter.save and CostCenter.save rely on this check to decide whether the element must be given a
+            new sequence number, so it reads the database rather than FinancialStructureTree, which may not have
+            seen changes made by other processes yet.
         """
+        if not isinstance(parent, FundCenter):
+            return False
+        try:
+            _parent = FundCenter.objects.get(fundcenter=parent.fundcenter)
+        except (FundCenter.DoesNotExist, ValueError):
+            return False
         if isinstance(child, FundCenter):
-            try:
-                _parent = FundCenter.objects.get(fundcenter=parent.fundcenter)
-            except FundCenter.DoesNotExist:
-                return False
-            except ValueError:
-                return False
-            try:
-                _child = FundCenter.objects.get(fundcenter=child.fundcenter)
-            except FundCenter.DoesNotExist:
-                return False
-            return self.is_sequence_child_of(_parent.sequence, _child.sequence)
+            _child = FundCenter.objects.filter(fundcenter=child.fundcenter).values_list("sequence", flat=True)
+            sequence = _child.first()
+            return sequence is not None and self.is_sequence_child_of(_parent.sequence, sequence)
         elif isinstance(child, CostCenter):
-            try:
-                _parent = FundCenter.objects.get(fundcenter=parent.fundcenter)
-            except FundCenter.DoesNotExist:
-                return False
-            try:
-                _child = CostCenter.objects.get(costcenter=child.costcenter)
-            except CostCenter.DoesNotExist:
-                return False
-            return _parent.fundcenter == _child.costcenter_parent.fundcenter
+            return CostCenter.objects.filter(costcenter=child.costcenter, costcenter_parent=_parent).exists()
         else:
             return False
 
@@ -1332,11 +1592,7 @@ class FinancialStructureManager(models.Manager):
         """
         if ".0." in seq_parent or seq_parent.endswith(".0"):
             raise AttributeError("Parent connot contains .0. in sequence number")
-        if len(seq_child) == len(seq_parent):
-            return False
-        if seq_child.startswith(seq_parent):
-            return True
-        return False
+        return seq_child.startswith(f"{seq_parent}.")
 
     def is_sequence_child_of(self, seq_parent: str, seq_child: str) -> bool:
         """Compare two sequence numbers to determine if one is a direct descendant of the other.
@@ -1351,12 +1607,24 @@ class FinancialStructureManager(models.Manager):
 
         if not self.is_sequence_descendant_of(seq_parent, seq_child):
             return False
-        if ".0." not in seq_child and len(seq_child) - 2 == len(seq_parent):
-            return True
-        if ".0." in seq_child:
-            seq_child = seq_child.replace(".0.", ".")
-            return self.is_sequence_child_of(seq_parent, seq_child)
-        return False
+        remainder = seq_child[len(seq_parent) + 1 :].removeprefix("0.")  # Cost centers are numbered .0.n
+        return remainder.isdigit()
+
+    def descendants_filter(self, sequence: str, field: str = "sequence") -> Q:
+        """Build a filter matching the given sequence number and all its descendants.
+
+        Descendants are matched on the range ]sequence + ".", sequence + "/"[ rather than with a LIKE, so the
+        index on the sequence field can be used, and "1.1" does not match "1.10".
+
+        Args:
+            sequence (str): The sequence number of the parent.
+            field (str, optional): Lookup of the sequence field to filter on, e.g. "costcenter__sequence".
+                Defaults to "sequence".
+
+        Returns:
+            Q: A filter to use with FundCenter, CostCenter or any model related to them.
+        """
+        return Q(**{field: sequence}) | Q(**{f"{field}__gt": f"{sequence}.", f"{field}__lt": f"{sequence}/"})
 
     def get_fundcenter_descendants(self, fundcenter: "FundCenter") -> QuerySet | None:
         """Create a QuerySet of fundcenters that are descendants of the fund center passed as argument.
@@ -1368,7 +1636,7 @@ class FinancialStructureManager(models.Manager):
             QuerySet: Returns a QuerySet of FundCenter objects that are descendants.  Returns None if no descendants exists.
         """
         try:
-            return FundCenter.objects.filter(sequence__startswith=fundcenter.sequence)
+            return FundCenter.objects.filter(self.descendants_filter(fundcenter.sequence))
         except AttributeError:
             return None
 
@@ -1397,18 +1665,10 @@ class FinancialStructureManager(models.Manager):
         Returns:
             list: A list of sequence numbers that are direct descendants of the parent.  The parent is not included in the returned list.
         """
-        family = list(self.FundCenters().values_list("sequence", flat=True))
-        if CostCenter.objects.all().count():
-            cc_seq = list(CostCenter.objects.values_list("sequence", flat=True))
-            family = family + cc_seq
-        if seq_parent not in family:
+        tree = FinancialStructureTree.get()
+        if seq_parent not in tree.sequences:
             raise exceptions.ParentDoesNotExistError
-
-        descendants = []
-        for d in family:
-            if self.is_sequence_child_of(seq_parent, d):
-                descendants.append(d)
-        return descendants
+        return tree.sequence_children(seq_parent)
 
     def create_child(self, parent: str = None, costcenter_child: bool = False) -> str:
         """Create a new sequence number to be attributed to a cost center or a fund center.
@@ -1461,94 +1721,313 @@ class FinancialStructureManager(models.Manager):
             return "1"
         return str(int(lr) + 1)
 
-    def financial_structure_dataframe(self) -> pd.DataFrame:
+    def _next_child_numbers(self) -> dict:
+        """Map each parent sequence ("" for the roots) to the last number used by its fund center and cost center
+        children, as {parent sequence: [last fund center number, last cost center number]}.
+
+        Sequences are read from the database rather than FinancialStructureTree, which may not know the changes
+        made by other processes.  Call it within the transaction that inserts the new children.
         """
-        Creates a DataFrame representing the financial structure by merging fund centers and cost centers data.
+        last = defaultdict(lambda: [0, 0])
+        for sequence in FundCenter.objects.values_list("sequence", flat=True):
+            parent, _, number = sequence.rpartition(".")
+            last[parent][0] = max(last[parent][0], int(number))
+        for sequence in CostCenter.objects.values_list("sequence", flat=True):
+            parent, _, number = sequence.rpartition(".0.")
+            last[parent][1] = max(last[parent][1], int(number))
+        return last
+
+    def bulk_create_fundcenters(self, fundcenters: list[dict], errors: list = None) -> list["FundCenter"]:
+        """Create many fund centers at once, assigning sequence numbers and levels in memory.
+
+        Rows are sorted so that parents are created before their children, whatever their order in the list.
+        Children of a parent are numbered in the order they appear in the list.  Fund centers are inserted with
+        one bulk_create per level of the hierarchy.
+
+        Args:
+            fundcenters (list[dict]): Rows with fundcenter, shortname and fundcenter_parent, the code of the parent
+                fund center. A blank or "None" parent makes the fund center a root.
+            errors (list, optional): Receives one message per row that has not been uploaded.
 
         Returns:
-            pd.DataFrame: A DataFrame containing the merged financial structure with the following columns:
-                - FC Path: Fund center hierarchical path
-                - Fund Center: Fund center identifier
-                - Fund Center Name: Name of the fund center
-                - Cost Center: Cost center identifier
-                - Cost Center Name: Name of the cost center
-                - Level: Hierarchical level
-                - Procurement Officer: Name of the procurement officer
+            list[FundCenter]: The fund centers created.  Rows that already exist, refer to an unknown parent or
+            are part of a cycle are logged and skipped.
+        """
+        with transaction.atomic():
+            created = self._bulk_create_fundcenters(fundcenters, [] if errors is None else errors)
+        FinancialStructureTree.invalidate()
+        ReferenceData.invalidate(FundCenter, CostCenter)
+        DataVersion.objects.bump()
+        return created
+
+    def _bulk_create_fundcenters(self, fundcenters: list[dict], errors: list) -> list["FundCenter"]:
+        def skip(msg):
+            logger.warning(msg)
+            errors.append(msg)
+
+        last = self._next_child_numbers()
+        sequences, ids = {}, {}
+        for code, sequence, pk in FundCenter.objects.values_list("fundcenter", "sequence", "id"):
+            sequences[code] = sequence
+            ids[code] = pk
+
+        children = defaultdict(list)
+        for item in fundcenters:
+            code = item["fundcenter"].upper()
+            parent = str(item.get("fundcenter_parent") or "").upper()
+            parent = "" if parent == "NONE" else parent
+            if code in sequences:
+                skip(f"Fund center {code} already exists, it has not been uploaded.")
+            elif code == parent:
+                skip(f"Fund center {code} cannot assign itself as parent, it has not been uploaded.")
+            else:
+                children[parent].append({**item, "fundcenter": code, "fundcenter_parent": parent})
+
+        levels = []
+        pending = [""] + [code for code in sequences if code in children]
+        while pending:
+            level = []
+            for parent in pending:
+                parent_seq = sequences.get(parent, "")
+                for item in children.pop(parent, []):
+                    if item["fundcenter"] in sequences:
+                        skip(f"Fund center {item['fundcenter']} is duplicated, it has been uploaded once.")
+                        continue
+                    last[parent_seq][0] += 1
+                    number = str(last[parent_seq][0])
+                    sequence = f"{parent_seq}.{number}" if parent_seq else number
+                    sequences[item["fundcenter"]] = sequence
+                    level.append(item)
+            if level:
+                levels.append(level)
+            pending = [item["fundcenter"] for item in level]
+        for parent, items in children.items():
+            for item in items:
+                skip(f"Fund center {item['fundcenter']} parent ({parent}) does not exist, it has not been uploaded.")
+
+        created = []
+        for level in levels:
+            objs = [
+                FundCenter(
+                    fundcenter=item["fundcenter"],
+                    shortname=item["shortname"].upper() if item.get("shortname") else item.get("shortname"),
+                    sequence=sequences[item["fundcenter"]],
+                    level=len(sequences[item["fundcenter"]].split(".")),
+                    fundcenter_parent_id=ids.get(item["fundcenter_parent"]),
+                )
+                for item in level
+            ]
+            objs = FundCenter.objects.bulk_create(objs)
+            ids.update({obj.fundcenter: obj.id for obj in objs})
+            created += objs
+        return created
 
-        Notes:
-            - Returns empty DataFrame if either fund centers or cost centers data is empty
-            - Removes various internal IDs and user-related columns from the final output
-            - Sorts the resulting DataFrame by FC Path
-            - Sets multi-level index using FC Path, Fund Center, Fund Center Name, Cost Center, and Cost Center Name
+    def bulk_create_costcenters(self, costcenters: list[dict], errors: list = None) -> list["CostCenter"]:
+        """Create many cost centers at once, assigning sequence numbers in memory, with a single bulk_create.
+
+        Args:
+            costcenters (list[dict]): Rows of CostCenter fields, where costcenter_parent is a FundCenter object.
+            errors (list, optional): Receives one message per row that has not been uploaded.
+
+        Returns:
+            list[CostCenter]: The cost centers created.  Rows that already exist under the same parent are
+            logged and skipped.
+        """
+        errors = [] if errors is None else errors
+        with transaction.atomic():
+            last = self._next_child_numbers()
+            seen = set(CostCenter.objects.values_list("costcenter", "costcenter_parent__fundcenter"))
+            objs = []
+            for item in costcenters:
+                parent = item["costcenter_parent"]
+                code = item["costcenter"].upper()
+                if (code, parent.fundcenter) in seen:
+                    msg = f"Cost center {code} already exists under {parent.fundcenter}, it has not been uploaded."
+                    logger.warning(msg)
+                    errors.append(msg)
+                    continue
+                seen.add((code, parent.fundcenter))
+                last[parent.sequence][1] += 1
+                obj = CostCenter(**{**item, "costcenter": code})
+                obj.sequence = f"{parent.sequence}.0.{last[parent.sequence][1]}"
+                if obj.shortname:
+                    obj.shortname = obj.shortname.upper()
+                objs.append(obj)
+            created = CostCenter.objects.bulk_create(objs)
+        FinancialStructureTree.invalidate()
+        ReferenceData.invalidate(FundCenter, CostCenter)
+        DataVersion.objects.bump()
+        CostCenterAncestor.objects.rebuild([obj.pk for obj in created])
+        return created
+
+    def move_subtree(self, fundcenter: "FundCenter|str", new_parent: "FundCenter|str|None") -> int:
+        """Move a fund center, with all its descendants, under another fund center.
+
+        The fund center gets the next sequence number under its new parent.  Sequence numbers and levels of all
+        descendant fund centers and cost centers are rewritten with one UPDATE per model, in a single transaction.
+
+        Args:
+            fundcenter (FundCenter | str): The fund center to move.
+            new_parent (FundCenter | str | None): The new parent.  None makes the fund center a root.
+
+        Raises:
+            FundCenter.DoesNotExist: fundcenter or new_parent does not exist.
+            IntegrityError: new_parent is the fund center itself or one of its descendants.
+
+        Returns:
+            int: Number of fund centers and cost centers whose sequence number changed.
         """
+        if isinstance(fundcenter, str):
+            fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
+        if isinstance(new_parent, str):
+            new_parent = FundCenter.objects.get(fundcenter=new_parent.upper())
+        old_seq = fundcenter.sequence
+        if new_parent and (new_parent.pk == fundcenter.pk or new_parent.sequence.startswith(f"{old_seq}.")):
+            raise IntegrityError(f"Fund center {fundcenter.fundcenter} cannot be moved under itself or its descendants")
+        if (new_parent.pk if new_parent else None) == fundcenter.fundcenter_parent_id:
+            return 0
 
-        fc = FundCenterManager().fund_center_dataframe(FundCenter.objects.all())
-        cc = CostCenterManager().cost_center_dataframe(CostCenter.objects.all())
-        if fc.empty or cc.empty:
-            return pd.DataFrame()
-        merged = pd.merge(
-            fc,
-            cc,
-            how="left",
-            left_on=["Fundcenter_ID", "FC Path", "Fund Center", "Fund Center Name"],
-            right_on=[
-                "Costcenter_parent_ID",
-                "FC Path",
-                "Fund Center",
-                "Fund Center Name",
-            ],
-        )
-        merged = merged.fillna("")
-        merged.set_index(
-            [
-                "FC Path",
-                "Fund Center",
-                "Fund Center Name",
-                "Cost Center",
-                "Cost Center Name",
-            ],
-            inplace=True,
-        )
-        unwanted_columns = [
-            "Fundcenter_ID_x",
-            "Fundcenter_ID_y",
-            "Fundcenter_parent_ID_x",
-            "Fundcenter_parent_ID_y",
-            "Costcenter_ID",
-            "CC Path",
-            "Fund_ID",
-            "Source_ID",
-            "Costcenter_parent_ID",
-            "Level_y",
-            "first name",
-            "last name",
-            "superuser status",
-            "Password",
-            "active",
-            "date joined",
-            "active",
-            "email address",
-            "staff status",
-            "Default_fc_ID",
-            "Default_cc_ID",
-            "Bftuser_ID",
-            "last login",
-            "procurement officer",
-            "Procurement_officer_ID",
-        ]
-        for col in unwanted_columns:
-            try:
-                merged.drop(
-                    col,
-                    axis=1,
-                    inplace=True,
+        with transaction.atomic():
+            if new_parent:
+                new_seq = f"{new_parent.sequence}.{self._next_child_numbers()[new_parent.sequence][0] + 1}"
+            else:
+                new_seq = self.new_root()
+            level_change = len(new_seq.split(".")) - len(old_seq.split("."))
+            new_path = Concat(Value(new_seq), Substr("sequence", len(old_seq) + 1))
+            FundCenter.objects.filter(pk=fundcenter.pk).update(fundcenter_parent=new_parent)
+            moved = FundCenter.objects.filter(self.descendants_filter(old_seq)).update(
+                sequence=new_path, level=F("level") + level_change
+            )
+            moved += CostCenter.objects.filter(self.descendants_filter(old_seq)).update(sequence=new_path)
+        FinancialStructureTree.invalidate()
+        ReferenceData.invalidate(FundCenter, CostCenter)
+        DataVersion.objects.bump()
+        CostCenterAncestor.objects.rebuild_fundcenter(fundcenter.fundcenter)
+        fundcenter.refresh_from_db()
+        logger.info(f"Moved {fundcenter.fundcenter} from {old_seq} to {new_seq}, {moved} sequences rewritten.")
+        return moved
+
+    #: Columns of the financial structure report, in order.
+    FINANCIAL_STRUCTURE_COLUMNS = [
+        "FC Path",
+        "Fund Center",
+        "Fund Center Name",
+        "Cost Center",
+        "Cost Center Name",
+        "Level",
+        "Is Forecastable",
+        "Is Updatable",
+        "Procurement Officer",
+        "Note",
+    ]
+
+    def financial_structure_nodes(self, root: "FundCenter|str" = None) -> Iterator[tuple[str, str | None]]:
+        """Walks FinancialStructureTree in sequence order, without querying the database, and yields the codes of
+        each row of the financial structure report: one per cost center, or one for a fund center that has no cost
+        centers.
+
+        Args:
+            root (FundCenter | str, optional): Limit the walk to this fund center and its descendants.
+                Defaults to None which walks the whole structure.
+
+        Yields:
+            tuple[str, str | None]: The fund center, and the cost center or None.
+        """
+        tree = FinancialStructureTree.get()
+        if root:
+            root = root.fundcenter if isinstance(root, FundCenter) else root.upper()
+            if root not in tree.fundcenters:
+                return
+            pending = [root]
+        else:
+            pending = tree.roots()
+
+        def by_sequence(code: str) -> list[int]:
+            return [int(n) for n in tree.fundcenters[code].sequence.split(".")]
+
+        pending = sorted(pending, key=by_sequence, reverse=True)
+        while pending:
+            code = pending.pop()
+            children = tree.costcenter_children(code)
+            if not children:
+                yield code, None
+            for cc in children:
+                yield code, cc
+            pending += sorted(tree.fundcenter_children(code), key=by_sequence, reverse=True)
+
+    def financial_structure_rows(
+        self, root: "FundCenter|str" = None, nodes: Iterable[tuple[str, str | None]] = None, chunk_size: int = 500
+    ) -> Iterator[dict]:
+        """Yields the rows of the financial structure report, in the order of financial_structure_nodes.
+
+        Field values are fetched chunk_size rows at a time, with one query per model, so the report is streamed
+        without building it whole in memory, and a page of the report only fetches the values of its rows.
+
+        Args:
+            root (FundCenter | str, optional): Limit the report to this fund center and its descendants.
+                Defaults to None which reports the whole structure.
+            nodes (Iterable, optional): The rows to report, as yielded by financial_structure_nodes, such as one
+                page of them.  Defaults to all the rows under root.
+            chunk_size (int, optional): Rows per query. Defaults to 500.
+
+        Yields:
+            dict: A row keyed by FINANCIAL_STRUCTURE_COLUMNS.  Rows whose elements are no longer in the database
+            are skipped.
+        """
+        nodes = iter(self.financial_structure_nodes(root) if nodes is None else nodes)
+        while chunk := list(islice(nodes, chunk_size)):
+            fundcenters = FundCenter.objects.filter(fundcenter__in={fc for fc, _ in chunk})
+            fundcenters = {
+                fc["fundcenter"]: fc for fc in fundcenters.values("fundcenter", "shortname", "sequence", "level")
+            }
+            costcenters = CostCenter.objects.filter(costcenter__in={cc for _, cc in chunk if cc})
+            costcenters = {
+                cc["costcenter"]: cc
+                for cc in costcenters.values(
+                    "costcenter", "shortname", "isforecastable", "isupdatable", "note", "procurement_officer__username"
                 )
-            except KeyError:
-                pass
+            }
+            for fc_code, cc_code in chunk:
+                fc = fundcenters.get(fc_code)
+                cc = costcenters.get(cc_code)
+                if fc is None or (cc_code and cc is None):
+                    continue
+                row = {
+                    "FC Path": fc["sequence"],
+                    "Fund Center": fc["fundcenter"],
+                    "Fund Center Name": fc["shortname"] or "",
+                    "Level": fc["level"],
+                }
+                if cc:
+                    row.update(
+                        {
+                            "Cost Center": cc["costcenter"],
+                            "Cost Center Name": cc["shortname"] or "",
+                            "Is Forecastable": cc["isforecastable"],
+                            "Is Updatable": cc["isupdatable"],
+                            "Procurement Officer": cc["procurement_officer__username"] or "",
+                            "Note": cc["note"] or "",
+                        }
+                    )
+                yield {column: row.get(column, "") for column in self.FINANCIAL_STRUCTURE_COLUMNS}
+
+    def financial_structure_dataframe(self, root: "FundCenter|str" = None) -> pd.DataFrame:
+        """
+        Creates a DataFrame representing the financial structure from financial_structure_rows.
+
+        Args:
+            root (FundCenter | str, optional): Limit the report to this fund center and its descendants.
 
-        merged.sort_values(by=["FC Path"], inplace=True)
-        merged.rename(columns={"Level_x": "Level", "Username": "Procurement Officer"}, inplace=True)
-        return merged
+        Returns:
+            pd.DataFrame: A DataFrame with FINANCIAL_STRUCTURE_COLUMNS, in sequence order, indexed by FC Path,
+            Fund Center, Fund Center Name, Cost Center and Cost Center Name.  Empty if there are no fund centers.
+        """
+        rows = list(self.financial_structure_rows(root))
+        if not rows:
+            return pd.DataFrame()
+        return pd.DataFrame(rows, columns=self.FINANCIAL_STRUCTURE_COLUMNS).set_index(
+            self.FINANCIAL_STRUCTURE_COLUMNS[:5]
+        )
 
     def financial_structure_styler(self, data: pd.DataFrame):
         """Styles a financial structure DataFrame for display.
@@ -1606,7 +2085,7 @@ class FinancialStructureManager(models.Manager):
         if isinstance(fundcenter, str):
             fundcenter = FundCenterManager().fundcenter(fundcenter)
         if fundcenter:
-            return CostCenter.objects.filter(sequence__startswith=fundcenter.sequence)
+            return CostCenter.objects.filter(self.descendants_filter(fundcenter.sequence))
         return None
 
     def all(self):
@@ -1670,6 +2149,7 @@ class FundCenter(models.Model):
     class Meta:
         ordering = ["fundcenter"]
         verbose_name_plural = "Fund Centers"
+        indexes = [models.Index(fields=["sequence"])]
 
         constraints = [
             models.UniqueConstraint(
@@ -1685,7 +2165,7 @@ class FundCenter(models.Model):
         """Saves a FundCenter instance with proper sequence and hierarchy validation.
 
         This method handles the following operations before saving:
-        1. Assigns a new root sequence if no parent is specified
+        1. Assigns a new root sequence if no parent is specified and the fund center is not already a root
         2. Validates parent-child relationships to prevent self-referencing
         3. Sets the sequence based on parent if valid
         4. Normalizes fundcenter and shortname to uppercase
@@ -1702,7 +2182,8 @@ class FundCenter(models.Model):
             None
         """
         if self.fundcenter_parent is None:
-            self.sequence = FinancialStructureManager().new_root()
+            if not self.sequence or "." in self.sequence:
+                self.sequence = FinancialStructureManager().new_root()
         elif (
             self.fundcenter_parent
             and self.fundcenter == self.fundcenter_parent.fundcenter
@@ -1777,6 +2258,9 @@ class CostCenterManager(models.Manager):
         Returns:
             CostCenter|None: The matching CostCenter instance if found, None otherwise.
         """
+        references = ReferenceData.current()
+        if references:
+            return references.costcenter(costcenter)
         costcenter = costcenter.upper()
         try:
             cc = CostCenter.objects.get(costcenter=costcenter)
@@ -2184,6 +2668,129 @@ class CostCenter(models.Model):
         super(CostCenter, self).save(*args, **kwargs)
 
 
+class CostCenterAncestorManager(models.Manager):
+    def rebuild(self, costcenter_ids: list[int] = None) -> int:
+        """Rewrite the ancestor chain of cost centers from the current financial structure.
+
+        Args:
+            costcenter_ids (list[int], optional): Primary keys of the cost centers to rebuild.  Defaults to None,
+                which rebuilds the whole table from a freshly loaded structure.
+
+        Returns:
+            int: Number of ancestor rows written.
+        """
+        if costcenter_ids is None:
+            FinancialStructureTree.invalidate()
+        tree = FinancialStructureTree.get()
+        costcenters = tree.costcenters.values()
+        if costcenter_ids is not None:
+            costcenter_ids = set(costcenter_ids)
+            costcenters = [node for node in costcenters if node.id in costcenter_ids]
+        rows = []
+        for node in costcenters:
+            for fundcenter in tree.fundcenter_ancestors(node.parent):
+                fc = tree.fundcenters[fundcenter]
+                rows.append(
+                    CostCenterAncestor(
+                        costcenter_id=node.id, fundcenter_id=fc.id, level=len(fc.sequence.split("."))
+                    )
+                )
+        with transaction.atomic():
+            if costcenter_ids is None:
+                self.all().delete()
+            else:
+                self.filter(costcenter_id__in=costcenter_ids).delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def rebuild_from_sequences(self, costcenters: QuerySet) -> int:
+        """Rewrite the ancestor chain of cost centers from the sequence numbers found in the database, without
+        loading FinancialStructureTree, so that saving the structure one element at a time stays linear.  The
+        ancestors of a cost center are the fund centers whose sequence number prefixes the one of its parent.
+
+        Args:
+            costcenters (QuerySet): The cost centers to rebuild.
+
+        Returns:
+            int: Number of ancestor rows written.
+        """
+        chains = {}
+        for pk, sequence in costcenters.values_list("id", "sequence"):
+            parts = sequence.rpartition(".0.")[0].split(".")
+            chains[pk] = [".".join(parts[: i + 1]) for i in range(len(parts))]
+        if not chains:
+            return 0
+        sequences = {sequence for chain in chains.values() for sequence in chain}
+        fundcenters = dict(FundCenter.objects.filter(sequence__in=sequences).values_list("sequence", "id"))
+        rows = [
+            CostCenterAncestor(costcenter_id=pk, fundcenter_id=fundcenters[sequence], level=len(sequence.split(".")))
+            for pk, chain in chains.items()
+            for sequence in chain
+            if sequence in fundcenters
+        ]
+        with transaction.atomic():
+            self.filter(costcenter_id__in=list(chains)).delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def rebuild_fundcenter(self, fundcenter: str) -> int:
+        """Rewrite the ancestor chain of every cost center found below a fund center."""
+        tree = FinancialStructureTree.get()
+        ids = [tree.costcenters[cc].id for cc in tree.costcenter_descendants(fundcenter)]
+        return self.rebuild(ids) if ids else 0
+
+    def totals_by_level(self, queryset: QuerySet, level: int, **aggregates) -> QuerySet:
+        """Group a queryset of any model with a costcenter foreign key by the fund center found at the given level
+        above each cost center.  Aggregation is done by the database with one join on the ancestor table.
+
+        Args:
+            queryset (QuerySet): Rows to aggregate, such as LineItem.objects.filter(fund="C113").
+            level (int): Level of the fund centers to group by, 1 being the roots.
+            **aggregates: Aggregate expressions, as for annotate(), such as spent=Sum("spent").
+
+        Returns:
+            QuerySet: One dict per fund center of that level, with the fund center code under "ancestor" and the
+            aggregates.  Rows of cost centers that are above that level are left out.
+        """
+        return (
+            queryset.filter(costcenter__ancestors__level=level)
+            .values(ancestor=F("costcenter__ancestors__fundcenter__fundcenter"))
+            .annotate(**aggregates)
+            .order_by("ancestor")
+        )
+
+
+class CostCenterAncestor(models.Model):
+    """
+    A denormalized lookup holding, for every cost center, one row per fund center found above it, from its parent
+    up to the root.  It lets reports group cost center data at any level of the financial structure with a join
+    instead of climbing sequence numbers.
+
+    The table is maintained by bft.signals when a fund center or a cost center is saved, from the sequence numbers
+    in the database, and by the bulk operations of FinancialStructureManager, from FinancialStructureTree.  Rows go away with their cost center or fund center.
+
+    Attributes:
+        costcenter (CostCenter): The cost center.
+        fundcenter (FundCenter): One of its ancestor fund centers.
+        level (int): Level of the fund center, 1 for a root.
+    """
+
+    costcenter = models.ForeignKey(CostCenter, on_delete=models.CASCADE, related_name="ancestors")
+    fundcenter = models.ForeignKey(FundCenter, on_delete=models.CASCADE, related_name="costcenter_descendants")
+    level = models.PositiveSmallIntegerField()
+    objects = CostCenterAncestorManager()
+
+    def __str__(self):
+        return f"{self.costcenter.costcenter} - {self.fundcenter.fundcenter} ({self.level})"
+
+    class Meta:
+        verbose_name_plural = "Cost Center Ancestors"
+        indexes = [models.Index(fields=["level", "fundcenter"])]
+        constraints = [
+            models.UniqueConstraint(fields=("costcenter", "level"), name="%(app_label)s_%(class)s_is_unique")
+        ]
+
+
 class CapitalProjectManager(models.Manager):
     """Manager class for CapitalProject model.
 
@@ -2539,7 +3146,7 @@ class ForecastAdjustmentManager(models.Manager):
         """
 
         root = FundCenterManager().fundcenter(fundcenter)
-        cc = CostCenter.objects.filter(sequence__startswith=root.sequence)
+        cc = FinancialStructureManager().CostCenters(root)
         if cc:
             fcst_adj = ForecastAdjustment.objects.filter(costcenter__in=cc)
             if fund:
@@ -2692,9 +3299,8 @@ class AllocationQuerySet(models.QuerySet):
         if not fund:
             return self
         if isinstance(fund, str):
-            try:
-                fund = Fund.objects.get(fund=fund.upper())
-            except Fund.DoesNotExist:
+            fund = FundManager().fund(fund)
+            if not fund:
                 return None
         return self.filter(fund=fund)
 
@@ -2717,9 +3323,8 @@ class AllocationQuerySet(models.QuerySet):
         if not costcenter:
             return self
         if isinstance(costcenter, str):
-            try:
-                costcenter = CostCenter.objects.get(costcenter=costcenter.upper())
-            except CostCenter.DoesNotExist:
+            costcenter = CostCenterManager().cost_center(costcenter)
+            if not costcenter:
                 return None
         return self.filter(costcenter=costcenter)
 
@@ -2749,11 +3354,10 @@ class AllocationQuerySet(models.QuerySet):
         if not fundcenter:
             return self
         if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
-            except FundCenter.DoesNotExist:
+            fundcenter = FundCenterManager().fundcenter(fundcenter)
+            if not fundcenter:
                 return None
-        fc_family = FundCenter.objects.filter(sequence__startswith=fundcenter.sequence)
+        fc_family = FinancialStructureManager().get_fundcenter_descendants(fundcenter)
         return self.filter(fundcenter__in=fc_family)
 
     def descendants_costcenter(self, fundcenter: FundCenter | str) -> QuerySet | None:
@@ -2781,11 +3385,10 @@ class AllocationQuerySet(models.QuerySet):
         if not fundcenter:
             return self
         if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
-            except FundCenter.DoesNotExist:
+            fundcenter = FundCenterManager().fundcenter(fundcenter)
+            if not fundcenter:
                 return None
-        cc_family = CostCenter.objects.filter(sequence__startswith=fundcenter.sequence)
+        cc_family = FinancialStructureManager().CostCenters(fundcenter)
         return self.filter(costcenter__in=cc_family)
 
     def fundcenter(self, fundcenter: FundCenter | str) -> QuerySet | None:
@@ -2809,9 +3412,8 @@ class AllocationQuerySet(models.QuerySet):
         if not fundcenter:
             return self
         if isinstance(fundcenter, str):
-            try:
-                fundcenter = FundCenter.objects.get(fundcenter=fundcenter.upper())
-            except FundCenter.DoesNotExist:
+            fundcenter = FundCenterManager().fundcenter(fundcenter)
+            if not fundcenter:
                 return None
         return self.filter(fundcenter=fundcenter)
 
@@ -3115,7 +3717,7 @@ class LineItemManager(models.Manager):
         if doctype:
             data = data.filter(doctype=doctype.upper())
         if data:
-            df = BFTDataFrame(LineItem).build(data)
+            df = BFTDataFrame(LineItem).build(data).drop(columns=["Contenthash"])
             df["CO"] = np.where(df["Doctype"] == "CO", df["Balance"], 0)
             df["PC"] = np.where(df["Doctype"] == "PC", df["Balance"], 0)
             df["FR"] = np.where(df["Doctype"] == "FR", df["Balance"], 0)
@@ -3196,6 +3798,7 @@ class LineItem(models.Model):
         createdby (CharField): Creator's identifier, max 50 characters, optional
         status (CharField): Current status of the line item, max 10 characters, optional
         fcintegrity (BooleanField): Fund center integrity check flag
+        contenthash (CharField): Hash of the imported values, used to skip unchanged lines on delta uploads
 
     Methods:
         get_orphan_lines(costcenter): Returns lines that exist in line items but not in encumbrances
@@ -3237,6 +3840,7 @@ class LineItem(models.Model):
     createdby = models.CharField(max_length=50, null=True, blank=True, default="")
     status = models.CharField(max_length=10, null=True, blank=True, default="")
     fcintegrity = models.BooleanField(default=False)
+    contenthash = models.CharField(max_length=40, blank=True, default="")  # sha1 of HASH_FIELDS as imported
 
     # lineitem = models.Manager()
     objects = LineItemManager()
@@ -3249,7 +3853,9 @@ class LineItem(models.Model):
         ordering = ["-docno", "lineno"]
         verbose_name_plural = "Line Items"
 
-    def get_orphan_lines(self, costcenter: str | CostCenter = None):
+    def get_orphan_lines(
+        self, costcenter: str | CostCenter = None, exclude_marked: bool = False, fundcenters: list[str] = None
+    ):
         """Return orphaned line items.
 
         This method identifies line items that exist in LineItem but not in LineItemImport.
@@ -3260,6 +3866,9 @@ class LineItem(models.Model):
             costcenter (Union[str, CostCenter], optional): Cost center to filter lines by.
                 Can be either a string cost center code or CostCenter object.
                 If None, checks all cost centers. Defaults to None.
+            exclude_marked (bool, optional): Leave out lines already marked as orphan. Defaults to False.
+            fundcenters (list[str], optional): Only consider lines of the cost centers under these fund centers,
+                such as the fund centers of the reports of a batch upload. Defaults to None.
 
         Returns:
             Set[Tuple[str, str]] | None: Set of tuples containing (docno, lineno) for orphaned lines.
@@ -3279,13 +3888,18 @@ class LineItem(models.Model):
                     costcenter = CostCenter.objects.get(costcenter=costcenter.upper())
                 except CostCenter.DoesNotExist:
                     return None
-            lines = set(
-                LineItem.objects.filter(costcenter=costcenter).values_list(
-                    "docno", "lineno"
-                )
-            )
-        else:
-            lines = set(LineItem.objects.values_list("docno", "lineno"))
+        lines = LineItem.objects.all()
+        if costcenter:
+            lines = lines.filter(costcenter=costcenter)
+        if fundcenters is not None:
+            fsm = FinancialStructureManager()
+            scope = Q(pk__in=[])
+            for fc in FundCenter.objects.filter(fundcenter__in=[fc.upper() for fc in fundcenters]):
+                scope |= fsm.descendants_filter(fc.sequence, "costcenter__sequence")
+            lines = lines.filter(scope)
+        if exclude_marked:
+            lines = lines.exclude(status="orphan")
+        lines = set(lines.values_list("docno", "lineno"))
 
         enc = set(LineItemImport.objects.values_list("docno", "lineno"))
         orphans = lines.difference(enc)
@@ -3294,6 +3908,10 @@ class LineItem(models.Model):
             logger.info(
                 f"Found {len(orphans)} orphan lines for cost center {costcenter}."
             )
+        elif fundcenters is not None:
+            logger.info(
+                f"Found {len(orphans)} orphan lines under fund centers {', '.join(fundcenters)}."
+            )
         else:
             logger.info(
                 f"Found {len(orphans)} orphan lines considering all cost centers."
@@ -3301,39 +3919,49 @@ class LineItem(models.Model):
 
         return orphans
 
-    def mark_orphan_lines(self, orphans: set):
-
-        def mark_orphan_lines(self, orphans: set) -> None:
-            """
-            Marks specified lines as orphan and updates their financial values to zero.
-
-            This method processes a set of docno/lineno tuples, setting their status to 'orphan'
-            and zeroing out their financial fields (spent, workingplan, balance).
-            It also updates any associated line forecasts to zero.
+    def mark_orphan_lines(self, orphans: set, batch_size: int = 500) -> dict:
+        """
+        Marks specified lines as orphan and updates their financial values to zero.
 
-            Args:
-                orphans (set): A set of tuples containing (docno, lineno) pairs to be marked as orphans
+        This method processes a set of docno/lineno tuples, setting their status to 'orphan'
+        and zeroing out their financial fields (spent, workingplan, balance).  Their content hash is cleared so
+        that a delta upload restores a line that comes back unchanged.
+        It also updates any associated line forecasts to zero.  Keys are resolved to line item ids batch_size
+        document numbers at a time, then lines and forecasts are updated batch_size ids at a time, in one
+        transaction.
 
-            Returns:
-                None
+        Args:
+            orphans (set): A set of tuples containing (docno, lineno) pairs to be marked as orphans
+            batch_size (int, optional): Number of line items per UPDATE statement. Defaults to 500.
 
-            Example:
-                >>> mark_orphan_lines({('DOC123', 1), ('DOC124', 2)})
-            """
+        Returns:
+            dict: Number of line items and line forecasts marked as orphan.
 
+        Example:
+            >>> mark_orphan_lines({('DOC123', 1), ('DOC124', 2)})
+            {'lines': 2, 'forecasts': 1}
+        """
         logger.info("Begin marking orphan lines")
-        for o in orphans:
-            docno, lineno = o
-            try:
-                li = LineItem.objects.get(docno=docno, lineno=lineno)
-                li.spent = 0
-                li.workingplan = 0
-                li.balance = 0
-                li.status = "orphan"
-                li.save()
-            except LineItem.DoesNotExist:
-                logger.info(f"LineItem {docno} - {lineno} does not exist")
-        LineForecast.objects.filter(lineitem__status="orphan").update(forecastamount=0)
+        counts = {"lines": 0, "forecasts": 0}
+        if not orphans:
+            return counts
+        docnos = sorted({docno for docno, _ in orphans})
+        ids = []
+        for i in range(0, len(docnos), batch_size):
+            lines = LineItem.objects.filter(docno__in=docnos[i : i + batch_size]).values_list("docno", "lineno", "id")
+            ids += [pk for docno, lineno, pk in lines if (docno, lineno) in orphans]
+        with transaction.atomic():
+            for i in range(0, len(ids), batch_size):
+                chunk = ids[i : i + batch_size]
+                counts["lines"] += LineItem.objects.filter(id__in=chunk).update(
+                    spent=0, workingplan=0, balance=0, status="orphan", contenthash=""
+                )
+                counts["forecasts"] += LineForecast.objects.filter(lineitem_id__in=chunk).update(forecastamount=0)
+        missing = len(orphans) - counts["lines"]
+        if missing > 0:
+            logger.info(f"{missing} orphan lines do not exist")
+        logger.info(f"Marked {counts['lines']} lines and {counts['forecasts']} forecasts as orphan")
+        return counts
 
     def insert_line_item(self, ei: "LineItemImport"):
         """
@@ -3407,75 +4035,132 @@ class LineItem(models.Model):
         else:
             return None
 
-    def import_lines(self):
-        """
-        Import and update line items from LineItemImport table to LineItem table.
+    #: Fields of an existing LineItem refreshed from the encumbrance import table.
+    UPDATE_FIELDS = ["costcenter", "fundcenter", "spent", "workingplan", "balance", "fund", "contenthash", "status"]
+    #: Fields of the encumbrance import table that make up the line item content hash.
+    HASH_FIELDS = ["costcenter", "fundcenter", "spent", "workingplan", "balance", "fund"]
 
-        First marks all existing LineItem records as "old" status. Then processes each LineItemImport record:
-        - Skips lines with cost centers marked as not updatable
-        - Updates existing LineItem records that match on docno and lineno
-        - Creates new LineItem records for lines that don't exist
+    @classmethod
+    def content_hash(cls, line: dict) -> str:
+        """Hash of the values a line item takes from an encumbrance import line.
 
-        Updates are logged using the logger.
+        Args:
+            line (dict): LineItemImport values, with costcenter as its code.
 
         Returns:
-            None
+            str: sha1 hex digest of the HASH_FIELDS values.
+        """
+        return hashlib.sha1("|".join(str(line[f]) for f in cls.HASH_FIELDS).encode()).hexdigest()
 
-        Side Effects:
-            - Updates status field of all existing LineItem records to "old"
-            - Creates or updates LineItem records based on LineItemImport data
-            - Logs import progress and counts
+    def import_lines(self, batch_size: int = 1000, delta: bool = False) -> dict:
         """
+        Import and update line items from LineItemImport table to LineItem table.
 
-        count = LineItem.objects.all().update(status="old")
-        logger.info(f"Set {count} lines to old.")
+        First marks existing LineItem records as "old" status.  Existing (docno, lineno) keys and cost
+        centers are then loaded once in memory and the LineItemImport records are split in sets:
+        - Lines with cost centers marked as not updatable, or not found, are skipped
+        - Lines matching an existing LineItem on docno and lineno are updated
+        - Lines that don't exist are inserted
 
-        cc_no_update = CostCenter.objects.filter(isupdatable=False).values_list("costcenter", flat=True)
-        encumbrance = LineItemImport.objects.all()
-        logger.info(f"Retreived {encumbrance.count()} encumbrance lines.")
-        for e in encumbrance:
-            if e.costcenter in cc_no_update:
-                continue
-            try:
-                target = LineItem.objects.get(docno=e.docno, lineno=e.lineno)
-                self.update_line_item(target, e)
-            except LineItem.DoesNotExist:
-                self.insert_line_item(e)
+        Inserts and updates are applied with bulk_create and bulk_update, batch_size rows at a time, in one
+        transaction.  The content hash of every line is stored so that delta uploads can tell unchanged lines
+        apart.
+
+        In delta mode, only lines that were New or Updated on the previous upload are set to "old", and
+        lines whose content hash did not change are left untouched and counted as unchanged.
 
-    def set_fund_center_integrity(self):
+        Args:
+            batch_size (int, optional): Number of rows per INSERT or UPDATE statement. Defaults to 1000.
+            delta (bool, optional): Skip lines whose content did not change. Defaults to False.
+
+        Returns:
+            dict: Number of lines inserted, updated, unchanged, skipped (not updatable) and without cost center.
         """
-        Validates and updates fund center integrity for line items based on cost center relationships.
 
-        This method performs the following operations:
-        1. Creates a set of valid (cost center, fund center) pairs from CostCenter objects
-        2. Resets fund center integrity flag to False for all LineItem objects
-        3. Updates fund center integrity flag to True for LineItems where cost center and fund center match valid pairs
+        with transaction.atomic():
+            if delta:
+                count = LineItem.objects.filter(status__in=["New", "Updated"]).update(status="old")
+            else:
+                count = LineItem.objects.all().update(status="old")
+            logger.info(f"Set {count} lines to old.")
+
+            costcenters = {cc.costcenter: cc for cc in CostCenter.objects.all()}
+            existing = {
+                (docno, lineno): (pk, contenthash)
+                for docno, lineno, pk, contenthash in LineItem.objects.values_list(
+                    "docno", "lineno", "id", "contenthash"
+                )
+            }
+            inserts = {}
+            updates = {}
+            counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "no_costcenter": 0}
+
+            for e in LineItemImport.objects.values().iterator(chunk_size=batch_size):
+                del e["id"]
+                cc = costcenters.get(e["costcenter"])
+                if cc is None:
+                    counts["no_costcenter"] += 1
+                    continue
+                if not cc.isupdatable:
+                    counts["skipped"] += 1
+                    continue
+                e["contenthash"] = self.content_hash(e)
+                e["costcenter"] = cc
+                key = (e["docno"], e["lineno"])
+                if key in existing:
+                    pk, contenthash = existing[key]
+                    if delta and contenthash == e["contenthash"]:
+                        counts["unchanged"] += 1
+                        continue
+                    target = updates.setdefault(key, LineItem(id=pk))
+                    for field in self.UPDATE_FIELDS[:-1]:
+                        setattr(target, field, e[field])
+                    target.status = "Updated"
+                elif key in inserts:
+                    for field in self.UPDATE_FIELDS[:-1]:
+                        setattr(inserts[key], field, e[field])
+                else:
+                    inserts[key] = LineItem(**e, status="New")
+
+            LineItem.objects.bulk_create(inserts.values(), batch_size=batch_size)
+            LineItem.objects.bulk_update(updates.values(), self.UPDATE_FIELDS, batch_size=batch_size)
+        counts["inserted"] = len(inserts)
+        counts["updated"] = len(updates)
+        logger.info(f"Retreived {sum(counts.values())} encumbrance lines.")
+        logger.info(
+            f"Inserted {counts['inserted']}, updated {counts['updated']}, left {counts['unchanged']} unchanged, "
+            f"skipped {counts['skipped']} not updatable and {counts['no_costcenter']} lines without cost center."
+        )
+        return counts
+
+    def set_fund_center_integrity(self) -> int:
+        """
+        Validates and updates fund center integrity for line items based on cost center relationships.
 
         The fund center integrity is considered valid when a line item's cost center and fund center combination
-        exists in the established cost center hierarchy relationships.
+        exists in the established cost center hierarchy relationships, that is when the line item fund center is
+        the fund center parent of the line item cost center.
+
+        The check is done in the database with a correlated subquery, and only rows whose fcintegrity flag
+        actually changes are written.
 
         Returns
-            None
+            int: Number of line items whose fcintegrity flag changed.
 
         Side Effects:
             - Updates fcintegrity field in LineItem table
             - Logs process start and completion via logger
         """
         logger.info("Fund center integrity check begins.")
-        cc = CostCenter.objects.select_related()
-        cc_set = set()
-        for c in cc:
-            cc_set.add((c.costcenter, c.costcenter_parent.fundcenter))
-
-        li = LineItem.objects.select_related()
-        li.update(fcintegrity=False)
-
-        for item in li:
-            t = (item.costcenter.costcenter, item.fundcenter)
-            if t in cc_set:
-                item.fcintegrity = True
-                item.save()
+        valid_pair = Exists(
+            CostCenter.objects.filter(pk=OuterRef("costcenter_id"), costcenter_parent__fundcenter=OuterRef("fundcenter"))
+        )
+        with transaction.atomic():
+            now_valid = LineItem.objects.filter(valid_pair, fcintegrity=False).update(fcintegrity=True)
+            now_invalid = LineItem.objects.filter(~valid_pair, fcintegrity=True).update(fcintegrity=False)
+        logger.info(f"Fund center integrity set on {now_valid} lines and removed from {now_invalid} lines.")
         logger.info("Fund center integrity check completed.")
+        return now_valid + now_invalid
 
     def set_doctype(self):
         """Sets document type for line items based on encoding type.
@@ -3501,11 +4186,15 @@ class LineItem(models.Model):
             {"enctype": "Purchase Order", "doctype": "CO"},
             {"enctype": "Purchase Requisitions", "doctype": "PC"},
         ]
+        changed = 0
         for t in types:
             li = LineItem.objects.filter(enctype=t["enctype"]).update(
                 doctype=t["doctype"]
             )
+            changed += li
             logger.info(f"Set {li} lines to {t['doctype']}")
+        if changed:
+            DataVersion.objects.bump()  # QuerySet.update sends no signal
         logger.info("Set doctype complete")
 
 
@@ -3580,17 +4269,41 @@ class LineForecastManager(models.Manager):
 
         lines = LineForecast.objects.filter(lineitem__costcenter=costcenter)
         if lines:
-            return lines.update(owner=new_owner)
+            updated = lines.update(owner=new_owner)
+            DataVersion.objects.bump()  # QuerySet.update sends no signal
+            return updated
+
+    def _lines_in_costcenters(
+        self, lines: QuerySet, costcenter: CostCenter | str | list[CostCenter | str] = None
+    ) -> QuerySet:
+        """Limits line forecasts to the given cost centers, given as objects or codes."""
+        if not costcenter:
+            return lines
+        if not isinstance(costcenter, (list, tuple, set, QuerySet)):
+            costcenter = [costcenter]
+        codes = [cc.upper() for cc in costcenter if isinstance(cc, str)]
+        objects = [cc for cc in costcenter if not isinstance(cc, str)]
+        return lines.filter(Q(lineitem__costcenter__in=objects) | Q(lineitem__costcenter__costcenter__in=codes))
+
+    def _clamp_forecast_to(self, lines: QuerySet, field: str) -> int:
+        """Sets forecastamount to the value of field of the related line item, in one UPDATE.  The data version is
+        bumped when lines change, since QuerySet.update sends no signal."""
+        value = LineItem.objects.filter(pk=OuterRef("lineitem_id")).values(field)[:1]
+        affected = lines.update(forecastamount=Subquery(value))
+        if affected:
+            DataVersion.objects.bump()
+        return affected
 
-    def set_underforecasted(self, costcenter: CostCenter = None) -> int:
+    def set_underforecasted(self, costcenter: CostCenter | str | list[CostCenter | str] = None) -> int:
         """Updates forecast amounts for lines where actual spent exceeds forecast amount.
 
         This method finds all line items where the actual spent amount is greater than
-        the forecasted amount and updates the forecast to match the spent amount.
+        the forecasted amount and updates the forecast to match the spent amount.  The update is
+        done in a single UPDATE statement.
 
         Args:
-            costcenter (CostCenter, optional): If provided, only updates lines for the specified
-                cost center. If None, updates lines across all cost centers. Defaults to None.
+            costcenter (CostCenter | str | list, optional): If provided, only updates lines for the specified
+                cost center or list of cost centers. If None, updates lines across all cost centers. Defaults to None.
 
         Returns:
             int: Number of line items that were successfully updated.
@@ -3598,27 +4311,23 @@ class LineForecastManager(models.Manager):
         Example:
             >>> budget.set_underforecasted()  # Updates all underforecasted lines
             >>> budget.set_underforecasted(cost_center_obj)  # Updates only specified cost center
+            >>> budget.set_underforecasted(["8484WA", "8484XA"])  # Updates only specified cost centers
         """
         lines = LineForecast.objects.filter(lineitem__spent__gt=F("forecastamount"))
-        if costcenter:
-            lines = lines.filter(lineitem__costcenter=costcenter)
-        maxlines = lines.count()
-        logger.info(f"{maxlines} lines with spent greater than forecast.")
-        for li in lines:
-            li.forecastamount = li.lineitem.spent
-        affected = LineForecast.objects.bulk_update(lines, ["forecastamount"])
-        logger.info(f"Forecasted to spent {affected} out of {maxlines} lines")
+        lines = self._lines_in_costcenters(lines, costcenter)
+        affected = self._clamp_forecast_to(lines, "spent")
+        logger.info(f"Forecasted to spent {affected} lines with spent greater than forecast.")
         return affected
 
-    def set_overforecasted(self, costcenter: CostCenter | str = None) -> int:
+    def set_overforecasted(self, costcenter: CostCenter | str | list[CostCenter | str] = None) -> int:
         """Sets forecast amount equal to working plan for overforecasted lines.
 
         This method identifies line forecasts where the working plan is less than the forecast
         amount (overforecasted) and adjusts the forecast amount to match the working plan.
 
         Args:
-            costcenter (Union[CostCenter, str], optional): Cost center to filter lines by.
-                If None, all overforecasted lines are processed. Defaults to None.
+            costcenter (CostCenter | str | list, optional): Cost center, or list of cost centers, to filter lines
+                by. If None, all overforecasted lines are processed. Defaults to None.
 
         Returns:
             int: Number of line forecasts that were successfully updated.
@@ -3628,36 +4337,32 @@ class LineForecastManager(models.Manager):
             >>> model.set_overforecasted("CC001")  # Update only lines for cost center CC001
 
         Note:
-            Uses bulk_update for efficient database operations.
+            The update is done in a single UPDATE statement.
         """
-        lines = LineForecast.objects.filter(
-            lineitem__workingplan__lt=F("forecastamount")
-        )
-        if costcenter:
-            lines = lines.filter(lineitem__costcenter=costcenter)
-        maxlines = lines.count()
-        logger.info(f"{maxlines} lines with working plan less than forecast.")
-        for li in lines:
-            li.forecastamount = li.lineitem.workingplan
-        affected = LineForecast.objects.bulk_update(lines, ["forecastamount"])
-        logger.info(f"Forecasted to working plan {affected} out of {maxlines} lines")
+        lines = LineForecast.objects.filter(lineitem__workingplan__lt=F("forecastamount"))
+        lines = self._lines_in_costcenters(lines, costcenter)
+        affected = self._clamp_forecast_to(lines, "workingplan")
+        logger.info(f"Forecasted to working plan {affected} lines with working plan less than forecast.")
         return affected
 
-    def set_encumbrance_history_record(self, costcenter: CostCenter = None) -> int:
+    def set_encumbrance_history_record(self, costcenter: CostCenter = None, batch_size: int = 1000) -> int:
         """Sets encumbrance history record for line items with 'New' status.
 
         This method creates LineForecast records for eligible line items that are in 'New' status.
-        Only line items with forecastable cost centers are processed.
+        Only line items with forecastable cost centers are processed.  Initial forecasts are clamped in memory
+        the same way LineForecast.save does, and records are written with bulk_create.
 
         Args:
             costcenter (CostCenter, optional): If provided, only process line items for this cost center.
                 Defaults to None which processes all eligible line items.
+            batch_size (int, optional): Number of LineForecast rows written per insert. Defaults to 1000.
 
         Returns:
             int: Number of line items for which encumbrance history was successfully set.
 
         Note:
             - Only processes line items where costcenter.isforecastable is True
+            - Line items that already have a forecast are left untouched
             - Logs information about number of records processed
             - Creates LineForecast entries with initial spent, workingplan and balance values
         """
@@ -3666,19 +4371,28 @@ class LineForecastManager(models.Manager):
             lines = lines.filter(costcenter=costcenter)
         maxlines = lines.count()
         logger.info(f"{maxlines} new lines need encumbrance record history to be set.")
+        lines = lines.filter(costcenter__isforecastable=True, fcst__isnull=True).only(
+            "id", "spent", "workingplan", "balance"
+        )
         counter = 0
-        li: LineItem
-        for li in lines:
-            if not li.costcenter.isforecastable:
-                continue
-            counter += 1
-            li_fcst = LineForecast(
-                lineitem=li,
-                spent_initial=li.spent,
-                workingplan_initial=li.workingplan,
-                balance_initial=li.balance,
-            )
-            li_fcst.save()
+        batch = []
+        with transaction.atomic():
+            li: LineItem
+            for li in lines.iterator(chunk_size=batch_size):
+                batch.append(
+                    LineForecast(
+                        lineitem=li,
+                        forecastamount=max(min(0, li.workingplan), li.spent),
+                        spent_initial=li.spent,
+                        workingplan_initial=li.workingplan,
+                        balance_initial=li.balance,
+                    )
+                )
+                if len(batch) >= batch_size:
+                    counter += len(LineForecast.objects.bulk_create(batch))
+                    batch = []
+            if batch:
+                counter += len(LineForecast.objects.bulk_create(batch))
         if counter == maxlines:
             logger.info(f"Encumbrance history set for {counter} out of {maxlines}")
         else:
@@ -3999,6 +4713,45 @@ class LineItemImport(models.Model):
     createdby = models.CharField(max_length=50, null=True, blank=True, default="")
 
 
+class LineItemUpload(models.Model):
+    """
+    A Django model recording the outcome of one encumbrance report upload.
+
+    Attributes:
+        fundcenter (str): Fund center found in the report header, blank for a batch of several reports
+        fy (str): Base fiscal year found in the report header
+        costcenter (str): Cost center of a cost center upload, blank for a fund center upload
+        user (str): Name of the user who ran the upload
+        delta (bool): Whether unchanged lines were skipped
+        inserted (int): Number of new line items
+        updated (int): Number of line items updated
+        orphaned (int): Number of line items marked as orphan
+        unchanged (int): Number of line items left untouched because their content did not change
+        created (DateTime): When the upload completed
+    """
+
+    fundcenter = models.CharField(max_length=6)
+    fy = models.CharField(max_length=4)
+    costcenter = models.CharField(max_length=6, blank=True, default="")
+    user = models.CharField(max_length=150)
+    delta = models.BooleanField(default=False)
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    orphaned = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return (
+            f"{self.fundcenter} FY{self.fy}: {self.inserted} new, {self.updated} updated, "
+            f"{self.orphaned} orphan, {self.unchanged} unchanged"
+        )
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name_plural = "Line Item Uploads"
+
+
 class CostCenterChargeImport(models.Model):
     """This class defines the model that represents the DND Actual Listings, Cost Center Transaction Listing report.
     Historically known as Charges against cost center. Each line read from the report during the uploadcsv command must match this model.
@@ -0,0 +1,88 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bft.models import (
+    BftStatus,
+    BftStatusManager,
+    CostCenter,
+    CostCenterAllocation,
+    CostCenterAncestor,
+    DataVersion,
+    FinancialStructureManager,
+    FinancialStructureTree,
+    ForecastAdjustment,
+    Fund,
+    FundCenter,
+    FundCenterAllocation,
+    LineForecast,
+    LineItemUpload,
+    ReferenceData,
+    Source,
+)
+
+
+@receiver(post_save, sender=BftStatus)
+@receiver(post_delete, sender=BftStatus)
+def invalidate_bft_status(sender, **kwargs):
+    """A new fiscal year, quarter or period must be seen by the next read of the status."""
+    BftStatusManager.invalidate()
+
+
+@receiver(post_save, sender=FundCenter)
+@receiver(post_save, sender=CostCenter)
+@receiver(post_delete, sender=FundCenter)
+@receiver(post_delete, sender=CostCenter)
+def invalidate_financial_structure_tree(sender, **kwargs):
+    """Any change to a fund center or a cost center makes the financial structure tree outdated."""
+    FinancialStructureTree.invalidate()
+
+
+@receiver(post_save, sender=Fund)
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=FundCenter)
+@receiver(post_save, sender=CostCenter)
+@receiver(post_delete, sender=Fund)
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=FundCenter)
+@receiver(post_delete, sender=CostCenter)
+def invalidate_reference_data(sender, **kwargs):
+    """Reference tables are reloaded by the identity maps once one of their rows changed."""
+    ReferenceData.invalidate(sender)
+
+
+@receiver(post_save, sender=FundCenter)
+@receiver(post_save, sender=CostCenter)
+def rebuild_costcenter_ancestors(sender, instance, raw=False, **kwargs):
+    """Keep the ancestor chain of the cost centers below a saved fund center, or of a saved cost center, in line
+    with the structure.  The chains are read from the sequence numbers in the database, the tree invalidated by
+    the save is not reloaded.  Deletions are handled by the database cascade."""
+    if raw:
+        return
+    if sender is CostCenter:
+        costcenters = CostCenter.objects.filter(pk=instance.pk)
+    else:
+        costcenters = CostCenter.objects.filter(FinancialStructureManager().descendants_filter(instance.sequence))
+    CostCenterAncestor.objects.rebuild_from_sequences(costcenters)
+
+
+@receiver(post_save, sender=LineItemUpload)
+@receiver(post_save, sender=LineForecast)
+@receiver(post_save, sender=ForecastAdjustment)
+@receiver(post_save, sender=CostCenterAllocation)
+@receiver(post_save, sender=FundCenterAllocation)
+@receiver(post_save, sender=Fund)
+@receiver(post_save, sender=FundCenter)
+@receiver(post_save, sender=CostCenter)
+@receiver(post_delete, sender=LineForecast)
+@receiver(post_delete, sender=ForecastAdjustment)
+@receiver(post_delete, sender=CostCenterAllocation)
+@receiver(post_delete, sender=FundCenterAllocation)
+@receiver(post_delete, sender=Fund)
+@receiver(post_delete, sender=FundCenter)
+@receiver(post_delete, sender=CostCenter)
+def bump_data_version(sender, raw=False, **kwargs):
+    """Reports computed before an upload, a forecast or allocation edit, or a change to the structure are outdated.
+    Line items are written in bulk by uploads, which are recorded by a LineItemUpload once complete."""
+    if raw:
+        return
+    DataVersion.objects.bump()
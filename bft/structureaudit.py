@@ -0,0 +1,279 @@
+import logging
+import re
+from collections import Counter, defaultdict, namedtuple
+
+from django.db import transaction
+
+from bft.models import (
+    CostCenter,
+    CostCenterAncestor,
+    DataVersion,
+    FinancialStructureTree,
+    FundCenter,
+    ReferenceData,
+)
+
+logger = logging.getLogger("uploadcsv")
+
+#: Fund center sequence, positive numbers separated by dots, e.g. 1.2.3
+FUNDCENTER_SEQUENCE = re.compile(r"[1-9]\d*(?:\.[1-9]\d*)*")
+#: Root fund center sequence, a positive number
+ROOT_SEQUENCE = re.compile(r"[1-9]\d*")
+#: Cost center sequence, the sequence of its parent followed by .0. and a positive number, e.g. 1.2.3.0.4
+COSTCENTER_SEQUENCE = re.compile(r"[1-9]\d*(?:\.[1-9]\d*)*\.0\.[1-9]\d*")
+
+#: One problem found in the financial structure.
+StructureProblem = namedtuple("StructureProblem", "check model id code sequence detail")
+
+#: Checks made by StructureAudit, in the order they are reported.
+CHECKS = (
+    "orphan",
+    "cycle",
+    "duplicate_sequence",
+    "costcenter_marker",
+    "malformed_sequence",
+    "parent_sequence",
+    "wrong_level",
+    "stale_ancestors",
+)
+
+
+class StructureAudit:
+    """
+    Validates the invariants of the financial structure and optionally repairs them.
+
+    Fund centers, cost centers and the cost center ancestor table are loaded with one query each.  Every invariant
+    is then checked in a single pass over the elements, with dictionary lookups only:
+
+    - orphan: the parent fund center does not exist.
+    - cycle: a fund center is its own ancestor.
+    - duplicate_sequence: more than one element uses the sequence.
+    - costcenter_marker: a fund center sequence contains the .0. reserved to cost centers, or a cost center
+      sequence does not end with it.
+    - malformed_sequence: any other sequence that is not made of positive numbers separated by dots.
+    - parent_sequence: the sequence does not continue the sequence of the parent, or a root is numbered as a child.
+    - wrong_level: the level of a fund center does not match the depth of its sequence.
+    - stale_ancestors: the ancestor chain of a cost center in CostCenterAncestor is out of date.
+
+    Usage:
+        audit = StructureAudit()
+        problems = audit.problems()
+        audit.repair()
+    """
+
+    def __init__(self):
+        self.fundcenters = {
+            row[0]: dict(zip(("code", "sequence", "level", "parent"), row[1:]))
+            for row in FundCenter.objects.order_by("id").values_list(
+                "id", "fundcenter", "sequence", "level", "fundcenter_parent_id"
+            )
+        }
+        self.costcenters = {
+            row[0]: dict(zip(("code", "sequence", "parent"), row[1:]))
+            for row in CostCenter.objects.order_by("id").values_list(
+                "id", "costcenter", "sequence", "costcenter_parent_id"
+            )
+        }
+        self.ancestors = defaultdict(set)
+        for costcenter, fundcenter, level in CostCenterAncestor.objects.values_list(
+            "costcenter_id", "fundcenter_id", "level"
+        ):
+            self.ancestors[costcenter].add((fundcenter, level))
+
+    def _cycles(self) -> list[list[int]]:
+        """Fund center ids of every cycle of the structure.  Each fund center is visited once."""
+        state = {}  # 1 while on the current path, 2 once done
+        cycles = []
+        for start in self.fundcenters:
+            path = []
+            fc = start
+            while fc in self.fundcenters and fc not in state:
+                state[fc] = 1
+                path.append(fc)
+                fc = self.fundcenters[fc]["parent"]
+            if state.get(fc) == 1:
+                cycles.append(path[path.index(fc) :])
+            for node in path:
+                state[node] = 2
+        return cycles
+
+    def _chains(self, cycles: set) -> dict:
+        """Ancestor chain of every fund center, as {fund center id: {(ancestor id, level), ...}}, itself included."""
+        chains = {}
+        for start in self.fundcenters:
+            path = []
+            fc = start
+            while fc in self.fundcenters and fc not in chains and fc not in cycles:
+                path.append(fc)
+                fc = self.fundcenters[fc]["parent"]
+            chain = chains.get(fc, frozenset())
+            for node in reversed(path):
+                sequence = self.fundcenters[node]["sequence"]
+                chain = chain | {(node, len(sequence.split(".")))}
+                chains[node] = chain
+        return chains
+
+    def problems(self) -> list[StructureProblem]:
+        """Check every invariant of the financial structure.
+
+        Returns:
+            list[StructureProblem]: The problems found, sorted by check, model and id.
+        """
+        problems = []
+
+        def add(check, model, pk, item, detail):
+            problems.append(StructureProblem(check, model, pk, item["code"], item["sequence"], detail))
+
+        cycles = {pk for cycle in self._cycles() for pk in cycle}
+        chains = self._chains(cycles)
+        used = Counter(item["sequence"] for item in self.fundcenters.values())
+        used.update(item["sequence"] for item in self.costcenters.values())
+
+        for pk, item in self.fundcenters.items():
+            sequence, parent = item["sequence"], self.fundcenters.get(item["parent"])
+            if item["parent"] is not None and parent is None:
+                add("orphan", "FundCenter", pk, item, f"Parent fund center {item['parent']} does not exist")
+            if pk in cycles:
+                add("cycle", "FundCenter", pk, item, "Fund center is its own ancestor")
+            if used[sequence] > 1:
+                add("duplicate_sequence", "FundCenter", pk, item, f"Sequence is used {used[sequence]} times")
+            if not FUNDCENTER_SEQUENCE.fullmatch(sequence):
+                if ".0." in f".{sequence}.":
+                    add("costcenter_marker", "FundCenter", pk, item, "Fund center sequence contains .0.")
+                else:
+                    add("malformed_sequence", "FundCenter", pk, item, "Sequence is not made of positive numbers")
+            elif item["parent"] is None and "." in sequence:
+                add("parent_sequence", "FundCenter", pk, item, "Root fund center has a child sequence")
+            elif parent and sequence.rpartition(".")[0] != parent["sequence"]:
+                add("parent_sequence", "FundCenter", pk, item, f"Parent sequence is {parent['sequence']}")
+            if item["level"] != len(sequence.split(".")):
+                add("wrong_level", "FundCenter", pk, item, f"Level should be {len(sequence.split('.'))}")
+
+        for pk, item in self.costcenters.items():
+            sequence, parent = item["sequence"], self.fundcenters.get(item["parent"])
+            if parent is None:
+                add("orphan", "CostCenter", pk, item, f"Parent fund center {item['parent']} does not exist")
+            if used[sequence] > 1:
+                add("duplicate_sequence", "CostCenter", pk, item, f"Sequence is used {used[sequence]} times")
+            if not COSTCENTER_SEQUENCE.fullmatch(sequence):
+                if sequence.count(".0.") != 1 or not sequence.rpartition(".0.")[2].isdigit():
+                    add("costcenter_marker", "CostCenter", pk, item, "Sequence must end with .0. and a number")
+                else:
+                    add("malformed_sequence", "CostCenter", pk, item, "Sequence is not made of positive numbers")
+            elif parent and sequence.rpartition(".0.")[0] != parent["sequence"]:
+                add("parent_sequence", "CostCenter", pk, item, f"Parent sequence is {parent['sequence']}")
+            if self.ancestors.get(pk, set()) != chains.get(item["parent"], set()):
+                add("stale_ancestors", "CostCenter", pk, item, "Ancestor chain is out of date")
+
+        problems.sort(key=lambda p: (CHECKS.index(p.check), p.model, p.id))
+        return problems
+
+    def _renumber(self) -> tuple[dict, dict]:
+        """Sequence numbers of every fund center and cost center reachable from a root, walking the tree top-down.
+        Elements keep their own number under their parent when it is valid and not taken by a sibling, the
+        others get the next free number."""
+
+        def own_number(sequence, separator):
+            head, marker, number = sequence.rpartition(separator)
+            if separator == ".0." and not marker:
+                return None
+            return int(number) if number.isdigit() and int(number) > 0 else None
+
+        def numbered(children, pattern, separator):
+            taken, result, pending = set(), {}, []
+            for pk, item in sorted(children, key=lambda c: c[0]):
+                number = own_number(item["sequence"], separator) if pattern.fullmatch(item["sequence"]) else None
+                if number is None or number in taken:
+                    pending.append(pk)
+                else:
+                    taken.add(number)
+                    result[pk] = number
+            last = max(taken, default=0)
+            for pk in pending:
+                last += 1
+                result[pk] = last
+            return result
+
+        fc_children, cc_children = defaultdict(list), defaultdict(list)
+        for pk, item in self.fundcenters.items():
+            fc_children[item["parent"]].append((pk, item))
+        for pk, item in self.costcenters.items():
+            cc_children[item["parent"]].append((pk, item))
+
+        fundcenters, costcenters = {}, {}
+        for pk, number in numbered(fc_children[None], ROOT_SEQUENCE, ".").items():
+            fundcenters[pk] = str(number)
+        pending = list(fundcenters)
+        while pending:
+            parent = pending.pop()
+            for pk, number in numbered(fc_children[parent], FUNDCENTER_SEQUENCE, ".").items():
+                fundcenters[pk] = f"{fundcenters[parent]}.{number}"
+                pending.append(pk)
+            for pk, number in numbered(cc_children[parent], COSTCENTER_SEQUENCE, ".0.").items():
+                costcenters[pk] = f"{fundcenters[parent]}.0.{number}"
+        return fundcenters, costcenters
+
+    @transaction.atomic
+    def repair(self) -> dict:
+        """Repair the financial structure in bulk.
+
+        Fund centers that are part of a cycle or whose parent does not exist become roots.  Sequence numbers and
+        levels are then recomputed top-down from the parent of every element, and the ancestor table is rebuilt.
+        Cost centers whose parent does not exist cannot be repaired and are left as they are.
+
+        Returns:
+            dict: Number of fund centers made roots, and of fund centers and cost centers updated.
+        """
+        detached = {min(cycle) for cycle in self._cycles()}  # Break each cycle at its oldest fund center
+        detached.update(
+            pk for pk, item in self.fundcenters.items() if item["parent"] and item["parent"] not in self.fundcenters
+        )
+        for pk in detached:
+            self.fundcenters[pk]["parent"] = None
+
+        fc_sequences, cc_sequences = self._renumber()
+        fundcenters = []
+        for pk, sequence in fc_sequences.items():
+            item = self.fundcenters[pk]
+            level = len(sequence.split("."))
+            if pk in detached or item["sequence"] != sequence or item["level"] != level:
+                item.update(sequence=sequence, level=level)
+                fundcenters.append(
+                    FundCenter(id=pk, sequence=sequence, level=level, fundcenter_parent_id=item["parent"])
+                )
+        costcenters = []
+        for pk, sequence in cc_sequences.items():
+            if self.costcenters[pk]["sequence"] != sequence:
+                self.costcenters[pk]["sequence"] = sequence
+                costcenters.append(CostCenter(id=pk, sequence=sequence))
+
+        FundCenter.objects.bulk_update(fundcenters, ["sequence", "level", "fundcenter_parent"], batch_size=1000)
+        # Cost center sequences are unique, move them out of the way before giving them their final value.
+        CostCenter.objects.bulk_update(
+            [CostCenter(id=cc.id, sequence=f"~{cc.id}") for cc in costcenters], ["sequence"], batch_size=1000
+        )
+        CostCenter.objects.bulk_update(costcenters, ["sequence"], batch_size=1000)
+        ancestors = CostCenterAncestor.objects.rebuild()
+        FinancialStructureTree.invalidate()
+        ReferenceData.invalidate(FundCenter, CostCenter)
+        DataVersion.objects.bump()
+        logger.info(
+            f"Financial structure repaired, {len(detached)} fund centers made roots, "
+            f"{len(fundcenters)} fund centers and {len(costcenters)} cost centers updated."
+        )
+        return {
+            "roots": len(detached),
+            "fundcenters": len(fundcenters),
+            "costcenters": len(costcenters),
+            "ancestors": ancestors,
+        }
+
+    def report(self, problems: list[StructureProblem], repaired: dict = None) -> dict:
+        """Machine-readable summary of an audit, ready to be serialized to JSON."""
+        return {
+            "fundcenters": len(self.fundcenters),
+            "costcenters": len(self.costcenters),
+            "counts": {check: n for check, n in Counter(p.check for p in problems).items()},
+            "problems": [p._asdict() for p in problems],
+            "repaired": repaired,
+        }
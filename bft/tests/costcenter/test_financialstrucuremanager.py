@@ -1,10 +1,15 @@
 import pytest
+from django.db import IntegrityError
+from django.db.models import Sum
 
 from bft.exceptions import ParentDoesNotExistError
 from bft.models import (
     CostCenter,
+    CostCenterAllocation,
+    CostCenterAncestor,
     CostCenterManager,
     FinancialStructureManager,
+    FinancialStructureTree,
     FundCenter,
     FundCenterManager,
     FundManager,
@@ -96,6 +101,9 @@ class TestFinancialStructureManager:
         assert False == fsm.is_sequence_child_of("1.1", "1.1")
         assert False == fsm.is_sequence_child_of("2.1", "2.1.1.1")
         assert True == fsm.is_sequence_child_of("2.1", "2.1.0.1")
+        assert True == fsm.is_sequence_child_of("1", "1.10")
+        assert True == fsm.is_sequence_child_of("1.10", "1.10.0.12")
+        assert False == fsm.is_sequence_child_of("1.1", "1.10")
 
     def test_is_sequence_descendant_of(self):
         fsm = FinancialStructureManager()
@@ -105,6 +113,8 @@ class TestFinancialStructureManager:
         assert False == fsm.is_sequence_descendant_of("1.1,1", "1.1")
         assert True == fsm.is_sequence_descendant_of("1.1.1", "1.1.1.0.1")
         assert True == fsm.is_sequence_descendant_of("1.10", "1.10.1.1")
+        assert False == fsm.is_sequence_descendant_of("1.1", "1.10")
+        assert False == fsm.is_sequence_descendant_of("1.1", "1.10.1")
         with pytest.raises(AttributeError):
             fsm.is_sequence_descendant_of("1.0.", "1.0.1.1")
         with pytest.raises(AttributeError):
@@ -137,6 +147,220 @@ class TestFinancialStructureManager:
         with pytest.raises(ParentDoesNotExistError):
             FinancialStructureManager().get_sequence_direct_descendants(parent)
 
+    def test_financial_structure_tree(self, populatedata, django_assert_num_queries):
+        FinancialStructureTree.invalidate()
+        with django_assert_num_queries(2):
+            tree = FinancialStructureTree.get()
+        with django_assert_num_queries(0):
+            assert tree is FinancialStructureTree.get()
+            assert "2184AA" == tree.fundcenter_parent("2184DA")
+            assert "2184A3" == tree.costcenter_parent("8484WA")
+            assert ["2184A3", "2184BE"] == tree.fundcenter_children("2184DA")
+            assert ["8484WA", "8484XA", "8484YA"] == tree.costcenter_children("2184A3")
+            assert {"1111AA", "2184AA", "2184DA", "2184A3", "2184BE"} == set(tree.fundcenter_descendants("0162ND"))
+            assert 3 == len(tree.costcenter_descendants("2184AA"))
+            assert [] == tree.costcenter_descendants("1111AA")
+            assert 3 == FinancialStructureManager().has_children("2184A3")
+
+    def test_financial_structure_tree_invalidated_on_save(self, populatedata):
+        tree = FinancialStructureTree.get()
+        FundCenter.objects.create(
+            fundcenter="2184ZZ", shortname="ZZ", fundcenter_parent=FundCenter.objects.get(fundcenter="1111AA")
+        )
+        assert tree is not FinancialStructureTree.get()
+        assert ["2184ZZ"] == FinancialStructureTree.get().fundcenter_children("1111AA")
+        FundCenter.objects.get(fundcenter="2184ZZ").delete()
+        assert [] == FinancialStructureTree.get().fundcenter_children("1111AA")
+
+    def test_save_keeps_sequence_when_tree_is_stale(self, populatedata):
+        FinancialStructureTree.get()
+        root = FundCenter.objects.get(fundcenter="0162ND")
+        # Created without signals, as another process would, the tree of this process does not know it.
+        FundCenter.objects.bulk_create(
+            [FundCenter(fundcenter="2184ZZ", shortname="ZZ", fundcenter_parent=root, sequence="1.9", level=2)]
+        )
+        assert "2184ZZ" not in FinancialStructureTree.get().fundcenters
+
+        fc = FundCenter.objects.get(fundcenter="2184ZZ")
+        fc.shortname = "YY"
+        fc.save()
+
+        assert "1.9" == FundCenter.objects.get(fundcenter="2184ZZ").sequence
+
+    def test_descendants_filter_does_not_match_siblings(self, populatedata):
+        fsm = FinancialStructureManager()
+        root = FundCenter.objects.get(fundcenter="0162ND")
+        for i in range(3, 11):
+            FundCenter.objects.create(fundcenter=f"3000{i:02}", shortname="X", fundcenter_parent=root)
+        assert "1.10" == FundCenter.objects.get(fundcenter="300010").sequence
+
+        first = FundCenter.objects.get(sequence="1.1")
+        family = FundCenter.objects.filter(fsm.descendants_filter("1.1"))
+        assert [first.fundcenter] == list(family.values_list("fundcenter", flat=True))
+        assert 1 == fsm.get_fundcenter_descendants(first).count()
+        assert 0 == fsm.CostCenters(first).count()
+        assert 3 == fsm.CostCenters("2184DA").count()
+
+    def test_financial_structure_rows_in_sequence_order(self, populatedata, django_assert_max_num_queries):
+        root = FundCenter.objects.get(fundcenter="0162ND")
+        for i in range(3, 11):
+            FundCenter.objects.create(fundcenter=f"3000{i:02}", shortname="X", fundcenter_parent=root)
+        with django_assert_max_num_queries(4):
+            rows = list(FinancialStructureManager().financial_structure_rows())
+        paths = [row["FC Path"] for row in rows]
+        assert ["1", "1.1", "1.2", "1.2.1", "1.2.1.1", "1.2.1.1", "1.2.1.1", "1.2.1.2", "1.3"] == paths[:9]
+        assert "1.10" == paths[-1]
+        assert FinancialStructureManager.FINANCIAL_STRUCTURE_COLUMNS == list(rows[4])
+        assert ["2184DA", "2184A3", "2184A3", "2184A3", "2184BE"] == [
+            row["Fund Center"] for row in FinancialStructureManager().financial_structure_rows("2184da")
+        ]
+
+    def test_move_subtree(self, populatedata):
+        fsm = FinancialStructureManager()
+        assert 6 == fsm.move_subtree("2184DA", "1111AA")
+
+        sequences = dict(FundCenter.objects.values_list("fundcenter", "sequence"))
+        assert "1.1.1" == sequences["2184DA"]
+        assert "1.1.1.1" == sequences["2184A3"]
+        assert "1.1.1.2" == sequences["2184BE"]
+        assert 4 == FundCenter.objects.get(fundcenter="2184A3").level
+        assert "1.1.1.1.0.3" == CostCenter.objects.get(costcenter="8484YA").sequence
+        assert "1111AA" == FundCenter.objects.get(fundcenter="2184DA").fundcenter_parent.fundcenter
+        assert ["2184DA"] == FinancialStructureTree.get().fundcenter_children("1111AA")
+        assert [] == FinancialStructureTree.get().fundcenter_children("2184AA")
+
+        assert 7 == fsm.move_subtree("1111AA", None)
+        assert "2" == FundCenter.objects.get(fundcenter="1111AA").sequence
+        assert "2.1.1.0.1" == CostCenter.objects.get(costcenter="8484WA").sequence
+
+    def test_move_subtree_when_tree_is_stale(self, populatedata):
+        FinancialStructureTree.get()
+        parent = FundCenter.objects.get(fundcenter="1111AA")
+        # Created without signals, as another process would, the tree of this process does not know it.
+        FundCenter.objects.bulk_create(
+            [FundCenter(fundcenter="2184XX", shortname="XX", fundcenter_parent=parent, sequence="1.1.1", level=3)]
+        )
+
+        FinancialStructureManager().move_subtree("2184DA", "1111AA")
+
+        assert "1.1.2" == FundCenter.objects.get(fundcenter="2184DA").sequence
+
+    def test_move_subtree_under_descendant(self, populatedata):
+        with pytest.raises(IntegrityError):
+            FinancialStructureManager().move_subtree("2184AA", "2184A3")
+        assert "1.2" == FundCenter.objects.get(fundcenter="2184AA").sequence
+
+    def test_costcenter_ancestors(self, populatedata):
+        def chain(costcenter):
+            return list(
+                CostCenterAncestor.objects.filter(costcenter__costcenter=costcenter)
+                .order_by("level")
+                .values_list("fundcenter__fundcenter", "level")
+            )
+
+        assert [("0162ND", 1), ("2184AA", 2), ("2184DA", 3), ("2184A3", 4)] == chain("8484WA")
+
+        FinancialStructureManager().move_subtree("2184DA", "1111AA")
+        assert [("0162ND", 1), ("1111AA", 2), ("2184DA", 3), ("2184A3", 4)] == chain("8484WA")
+
+        cc = CostCenter.objects.get(costcenter="8484XA")
+        cc.costcenter_parent = FundCenter.objects.get(fundcenter="2184AA")
+        cc.save()
+        assert [("0162ND", 1), ("2184AA", 2)] == chain("8484XA")
+
+        cc.delete()
+        assert [] == chain("8484XA")
+        assert 8 == CostCenterAncestor.objects.count()
+        CostCenterAncestor.objects.all().delete()
+        assert 8 == CostCenterAncestor.objects.rebuild()
+
+    def test_save_does_not_reload_tree(self, populatedata):
+        FinancialStructureTree.get()
+        cc = CostCenter.objects.get(costcenter="8484XA")
+        cc.shortname = "XA"
+        cc.save()
+        fc = FundCenter.objects.get(fundcenter="2184DA")
+        fc.shortname = "DA"
+        fc.save()
+
+        assert FinancialStructureTree._tree is None
+        chains = sorted(CostCenterAncestor.objects.values_list("costcenter_id", "fundcenter_id", "level"))
+        assert 12 == len(chains)
+        CostCenterAncestor.objects.rebuild()
+        assert chains == sorted(CostCenterAncestor.objects.values_list("costcenter_id", "fundcenter_id", "level"))
+
+    def test_totals_by_level(self, populatedata):
+        fund = Fund.objects.get(fund="C113")
+        for costcenter, amount in [("8484WA", 100), ("8484XA", 20), ("8484YA", 3)]:
+            CostCenterAllocation.objects.create(
+                costcenter=CostCenter.objects.get(costcenter=costcenter), fund=fund, amount=amount, fy=2025
+            )
+        FinancialStructureManager().move_subtree("2184A3", "1111AA")
+        CostCenter.objects.filter(costcenter="8484YA").update(
+            costcenter_parent=FundCenter.objects.get(fundcenter="2184BE")
+        )
+        CostCenterAncestor.objects.rebuild()
+
+        totals = CostCenterAncestor.objects.totals_by_level(
+            CostCenterAllocation.objects.filter(fund__fund="C113"), 2, amount=Sum("amount")
+        )
+        assert [("1111AA", 120), ("2184AA", 3)] == [(row["ancestor"], row["amount"]) for row in totals]
+        totals = CostCenterAncestor.objects.totals_by_level(
+            CostCenterAllocation.objects.all(), 4, amount=Sum("amount")
+        )
+        assert [("2184BE", 3)] == [(row["ancestor"], row["amount"]) for row in totals]
+
+    def test_bulk_create_fundcenters(self, populatedata):
+        rows = [
+            {"fundcenter_parent": "2184xx", "fundcenter": "2184x1", "shortname": "x1"},
+            {"fundcenter_parent": "1111AA", "fundcenter": "2184XX", "shortname": "xx"},
+            {"fundcenter_parent": "2184XX", "fundcenter": "2184X2", "shortname": "x2"},
+            {"fundcenter_parent": "None", "fundcenter": "0163ND", "shortname": ""},
+            {"fundcenter_parent": "9999ZZ", "fundcenter": "2184X3", "shortname": "x3"},
+            {"fundcenter_parent": "0162ND", "fundcenter": "1111AA", "shortname": "aa"},
+        ]
+        errors = []
+        created = FinancialStructureManager().bulk_create_fundcenters(rows, errors)
+        assert ["0163ND", "2184XX", "2184X1", "2184X2"] == [fc.fundcenter for fc in created]
+        assert 2 == len(errors)
+        assert "Fund center 1111AA already exists, it has not been uploaded." in errors
+        sequences = dict(FundCenter.objects.values_list("fundcenter", "sequence"))
+        assert "2" == sequences["0163ND"]
+        assert "1.1.1" == sequences["2184XX"]
+        assert "1.1.1.1" == sequences["2184X1"]
+        assert "1.1.1.2" == sequences["2184X2"]
+        assert 4 == FundCenter.objects.get(fundcenter="2184X2").level
+        assert "2184XX" == FundCenter.objects.get(fundcenter="2184X1").fundcenter_parent.fundcenter
+        assert "X1" == FundCenter.objects.get(fundcenter="2184X1").shortname
+        assert ["2184X1", "2184X2"] == FinancialStructureTree.get().fundcenter_children("2184XX")
+
+    def test_bulk_create_fundcenters_when_tree_is_stale(self, populatedata):
+        FinancialStructureTree.get()
+        parent = FundCenter.objects.get(fundcenter="1111AA")
+        # Created without signals, as another process would, the tree of this process does not know it.
+        FundCenter.objects.bulk_create(
+            [FundCenter(fundcenter="2184XX", shortname="XX", fundcenter_parent=parent, sequence="1.1.1", level=3)]
+        )
+        rows = [{"fundcenter_parent": "1111AA", "fundcenter": "2184XY", "shortname": "xy"}]
+
+        FinancialStructureManager().bulk_create_fundcenters(rows)
+
+        assert "1.1.2" == FundCenter.objects.get(fundcenter="2184XY").sequence
+
+    def test_bulk_create_costcenters(self, populatedata):
+        parent = FundCenter.objects.get(fundcenter="2184A3")
+        fund = Fund.objects.get(fund="C113")
+        source = Source.objects.get(source="Basement")
+        rows = [
+            {"costcenter": cc, "shortname": "new", "costcenter_parent": parent, "fund": fund, "source": source}
+            for cc in ("8484wa", "8484za", "8484zb")
+        ]
+        errors = []
+        created = FinancialStructureManager().bulk_create_costcenters(rows, errors)
+        assert ["8484ZA", "8484ZB"] == [cc.costcenter for cc in created]
+        assert ["Cost center 8484WA already exists under 2184A3, it has not been uploaded."] == errors
+        assert "1.2.1.1.0.5" == CostCenter.objects.get(costcenter="8484ZB").sequence
+
     def test_create_root_sequence(self):
         sequence = FinancialStructureManager().set_parent()
         assert "1" == sequence
@@ -156,9 +380,7 @@ class TestFinancialStructureManager:
 
         # create a fundcenter and assign it to 2184DA
         parent = FundCenter.objects.get(fundcenter="2184A3")
-        new_fc = FundCenter.objects.create(
-            fundcenter="0000AA", shortname="AA", fundcenter_parent=parent
-        )
+        new_fc = FundCenter.objects.create(fundcenter="0000AA", shortname="AA", fundcenter_parent=parent)
         family = list(FinancialStructureManager().FundCenters().values_list("sequence", flat=True))
         assert new_fc.sequence in family
 
@@ -1,6 +1,17 @@
 import pytest
 
-from bft.models import CostCenter, Fund, FundCenter, Source
+from bft.models import (
+    CostCenter,
+    CostCenterAllocation,
+    CostCenterManager,
+    Fund,
+    FundCenter,
+    FundCenterManager,
+    FundManager,
+    ReferenceData,
+    Source,
+    SourceManager,
+)
 
 
 @pytest.mark.django_db
@@ -57,3 +68,41 @@ class TestSourceManager:
         s = Source.objects.pk(self.pk)
 
         assert s.pk == self.pk
+
+
+@pytest.mark.django_db
+class TestReferenceData:
+    @pytest.fixture
+    def setup(self):
+        fc = FundCenter.objects.create(fundcenter="2184QQ", fundcenter_parent=None)
+        fund = Fund.objects.create(fund="C111", name="Big fund", vote=1, download=True)
+        s = Source.objects.create(source="La source")
+        CostCenter.objects.create(costcenter="8486AA", fund=fund, costcenter_parent=fc, source=s)
+
+    def test_lookups_are_dictionary_hits(self, setup, django_assert_num_queries):
+        with ReferenceData.scope():
+            with django_assert_num_queries(4):
+                for _ in range(3):
+                    assert "C111" == FundManager().fund("c111").fund
+                    assert "La source" == SourceManager().source("LA SOURCE").source
+                    assert "2184QQ" == FundCenterManager().fundcenter("2184qq").fundcenter
+                    cc = CostCenterManager().cost_center("8486aa")
+                    assert "2184QQ" == cc.costcenter_parent.fundcenter
+                assert None is FundManager().fund("C999")
+            with django_assert_num_queries(1):
+                assert [] == list(CostCenterAllocation.objects.costcenter("8486AA"))
+        assert None is ReferenceData.current()
+
+    def test_tables_reload_after_change(self, setup):
+        with ReferenceData.scope() as references:
+            assert None is references.fund("C222")
+            Fund.objects.create(fund="C222", name="Other fund", vote=1)
+            assert "C222" == references.fund("C222").fund
+            with ReferenceData.scope() as nested:
+                assert nested is references
+            assert "8486AA" == references.costcenter("8486AA").costcenter
+            CostCenter.objects.filter(costcenter="8486AA").update(costcenter="8486BB")  # No signal sent
+            assert "8486AA" == references.costcenter("8486AA").costcenter
+            ReferenceData.invalidate(CostCenter)
+            assert None is references.costcenter("8486AA")
+            assert "8486BB" == references.costcenter("8486BB").costcenter
@@ -1,7 +1,7 @@
 import pytest
 from django.contrib.auth import get_user_model
 
-from bft.models import CostCenter, LineForecast, LineForecastManager, LineItem
+from bft.models import CostCenter, DataVersion, LineForecast, LineForecastManager, LineItem
 
 
 @pytest.mark.django_db
@@ -26,7 +26,39 @@ class TestLineForecastManager:
 
         user = get_user_model()
         new_owner = user.objects.create_user(email="luigi@forces.gc.ca", password="foo")
+        version = DataVersion.objects.current()
         mgr.update_owner(costcenter, new_owner)
         li = LineForecast.objects.filter(owner=new_owner).first()
 
         assert li.owner.username == "luigi"
+        assert version < DataVersion.objects.current()
+
+    def test_set_encumbrance_history_record_in_batches(self, populatedata, upload):
+        LineForecast.objects.all().delete()
+        LineItem.objects.update(status="New")
+
+        assert 7 == LineForecastManager().set_encumbrance_history_record(batch_size=3)
+        assert 7 == LineForecast.objects.count()
+        for fcst in LineForecast.objects.select_related("lineitem"):
+            li = fcst.lineitem
+            assert li.spent == fcst.spent_initial
+            assert li.workingplan == fcst.workingplan_initial
+            assert max(min(0, li.workingplan), li.spent) == fcst.forecastamount
+        assert 0 == LineForecastManager().set_encumbrance_history_record()
+
+    def test_set_under_and_overforecasted(self, populatedata, upload):
+        mgr = LineForecastManager()
+        LineForecast.objects.update(forecastamount=-1)
+        version = DataVersion.objects.current()
+        assert 0 == mgr.set_underforecasted(["1234XX"])
+        assert version == DataVersion.objects.current()
+        assert 7 == mgr.set_underforecasted(["8484wa"])
+        assert version < DataVersion.objects.current()
+        for fcst in LineForecast.objects.select_related("lineitem"):
+            assert fcst.lineitem.spent == fcst.forecastamount
+
+        LineForecast.objects.update(forecastamount=10**7)
+        costcenter = CostCenter.objects.get(costcenter="8484WA")
+        assert 7 == mgr.set_overforecasted(costcenter)
+        for fcst in LineForecast.objects.select_related("lineitem"):
+            assert fcst.lineitem.workingplan == fcst.forecastamount
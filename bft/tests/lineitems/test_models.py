@@ -32,7 +32,7 @@ class TestLineItemModel:
     def test_number_of_fields(self):
         obj = LineItem()
         c = obj._meta.get_fields()
-        assert 23 == len(c)
+        assert 24 == len(c)
 
 
 @pytest.mark.django_db
@@ -70,6 +70,44 @@ class TestLineItemImport:
 
         assert updated is None
 
+    def test_import_lines_counts(self, populatedata, upload):
+        LineItem.objects.all().delete()
+        counts = LineItem().import_lines()
+        assert 7 == counts["inserted"]
+        assert 0 == counts["updated"]
+        assert 7 == LineItem.objects.filter(status="New").count()
+
+        counts = LineItem().import_lines()
+        assert 0 == counts["inserted"]
+        assert 7 == counts["updated"]
+        assert 7 == LineItem.objects.filter(status="Updated").count()
+
+    def test_import_lines_delta_skips_unchanged(self, populatedata, upload):
+        counts = LineItem().import_lines(delta=True)
+        assert 7 == counts["unchanged"]
+        assert 0 == counts["updated"]
+
+        enc = LineItemImport.objects.first()
+        enc.spent = enc.spent + 1
+        enc.save()
+        counts = LineItem().import_lines(delta=True)
+        assert 6 == counts["unchanged"]
+        assert 1 == counts["updated"]
+        assert "Updated" == LineItem.objects.get(docno=enc.docno, lineno=enc.lineno).status
+
+    def test_import_lines_delta_restores_orphan(self, populatedata, upload):
+        enc = LineItemImport.objects.first()
+        LineItem().mark_orphan_lines({(enc.docno, enc.lineno)})
+
+        counts = LineItem().import_lines(delta=True)
+
+        assert 1 == counts["updated"]
+        li = LineItem.objects.get(docno=enc.docno, lineno=enc.lineno)
+        assert "Updated" == li.status
+        assert enc.spent == li.spent
+        assert enc.balance == li.balance
+        assert enc.workingplan == li.workingplan
+
     def test_line_items_have_orphans(self, populatedata, upload):
         # bring lines in
         li = LineItem()
@@ -107,13 +145,28 @@ class TestLineItemImport:
         li.save()
 
         orphan = li.get_orphan_lines()
-        li.mark_orphan_lines(orphan)
+        counts = li.mark_orphan_lines(orphan)
+        assert 1 == counts["lines"]
+        assert 1 == counts["forecasts"]
         li = LineItem.objects.get(docno="999999", lineno="123")
+        assert 0 == li.fcst.forecastamount
         assert 0 == li.workingplan
         assert 0 == li.spent
         assert 0 == li.balance
         assert "orphan" == li.status
 
+    def test_mark_orphan_lines_in_batches(self, populatedata, upload, django_assert_num_queries):
+        LineItem().import_lines()
+        lines = list(LineItem.objects.order_by("id")[:3])
+        orphans = {(lines[0].docno, lines[0].lineno), (lines[2].docno, lines[2].lineno), ("999999", "1")}
+        docnos = {docno for docno, _ in orphans}
+
+        with django_assert_num_queries(len(docnos) + 2 * 2 + 2):  # Lookups, updates, savepoint
+            counts = LineItem().mark_orphan_lines(orphans, batch_size=1)
+
+        assert 2 == counts["lines"]
+        assert {lines[0].pk, lines[2].pk} == set(LineItem.objects.filter(status="orphan").values_list("id", flat=True))
+
 
 @pytest.mark.django_db
 class TestLineItemManagementTest:
@@ -129,6 +182,14 @@ class TestLineItemManagementTest:
         li.set_fund_center_integrity()
         assert 1 == LineItem.objects.filter(fcintegrity=False).count()
 
+    def test_line_item_fund_center_integrity_changes(self, populatedata, upload):
+        li = LineItem()
+        assert 0 == li.set_fund_center_integrity()
+
+        LineItem.objects.filter(pk=LineItem.objects.first().pk).update(fundcenter="xxxx11")
+        assert 1 == li.set_fund_center_integrity()
+        assert 1 == LineItem.objects.filter(fcintegrity=False).count()
+
 
 @pytest.mark.django_db
 class TestLineForecastModel:
@@ -267,14 +328,16 @@ class TestLineItemImportStructure:
 
     def test_is_dnd_cost_center_report(self):
         er = LineItemProcessor(self.GOODFILE, None)
-        ok = er.is_dnd_cost_center_report()
-        assert ok
+        er.read_header()
+        assert er.data["report"]
+        assert er._validate_header()
 
     def test_is_not_dnd_cost_center_report(self):
         fname = os.path.join(self.TESTDATA, "encumbrance_errors.txt")
         er = LineItemProcessor(fname, None)
-        ok = er.is_dnd_cost_center_report()
-        assert not ok
+        er.read_header()
+        assert not er.data["report"]
+        assert not er._validate_header()
 
     def test_clean_header(self):
         header = "|Document N|Line Numbe|AcctAssNo.| Cur Year s|    Cur YR Bal|    Total Cur.|Funds Cent|Fund|Cost Cente|Order       |Document T|Encumbrance Type     |Line Text                                         |Prd.doc.no|Pred doc.i|Reference       |G/L Accoun|Due date  |Vendor nam                         |Created by  |"
@@ -283,15 +346,17 @@ class TestLineItemImportStructure:
         er.clean_header(header)
         assert len(er.data["header"]) == er.COLUMNS - 2
 
-    def test_find_header_line_returns_zero_on_failure(self):
+    def test_read_header_without_header_line(self):
         er = LineItemProcessor(os.path.join(self.TESTDATA, "encumbrance_no_line_header.txt"), None)
-        lineno = er.find_header_line()
-        assert lineno == 0
+        er.read_header()
+        assert er.data["lineno"] == 0
+        assert not er._validate_header()
 
-    def test_find_header_line_returns_non_zero_on_success(self):
+    def test_read_header_finds_header_line(self):
         er = LineItemProcessor(self.GOODFILE, None)
-        lineno = er.find_header_line()
-        assert lineno > 0
+        er.read_header()
+        assert er.data["lineno"] > 0
+        assert len(er.data["header"]) == er.COLUMNS - 2
 
     def test_is_data_line(self):
         er = LineItemProcessor(self.GOODFILE, None)
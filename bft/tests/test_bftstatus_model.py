@@ -1,6 +1,6 @@
 import pytest
 
-from bft.models import BftStatus
+from bft.models import BftStatus, BftStatusManager
 
 
 @pytest.mark.django_db
@@ -35,6 +35,42 @@ class TestModelBftStatus:
         assert 3 == BftStatus.objects.all().count()
         assert "2023" == BftStatus.current.fy()
 
+    def test_status_is_cached_until_saved(self, django_assert_num_queries):
+        BftStatus.objects.create(status="FY", value="2023")
+        BftStatus.current.fy()
+        with django_assert_num_queries(0):
+            assert "2023" == BftStatus.current.fy()
+            assert None is BftStatus.current.period()
+
+        BftStatus.objects.filter(status="FY").update(value="2024")  # No signal sent
+        assert "2023" == BftStatus.current.fy()
+        fy = BftStatus.objects.get(status="FY")
+        fy.value = "2025"
+        fy.save()
+        assert "2025" == BftStatus.current.fy()
+
+    def test_status_read_once_per_scope(self, django_assert_num_queries):
+        BftStatus.objects.create(status="FY", value="2023")
+        assert "2023" == BftStatus.current.fy()
+        BftStatus.objects.filter(status="FY").update(value="2024")  # Saved by another process
+
+        with BftStatusManager.scope():
+            with django_assert_num_queries(1):
+                assert "2024" == BftStatus.current.fy()
+                assert None is BftStatus.current.quarter()
+                assert None is BftStatus.current.period()
+            BftStatus.objects.filter(status="FY").update(value="2025")
+            assert "2024" == BftStatus.current.fy()
+        with BftStatusManager.scope():
+            assert "2025" == BftStatus.current.fy()
+
+    def test_context_processor(self, client):
+        BftStatus.objects.create(status="FY", value="2023")
+        BftStatus.objects.create(status="PERIOD", value="3")
+        response = client.get("/")
+        status = response.context["bft_status"]
+        assert ("2023", None, "3") == (status.fy(), status.quarter(), status.period())
+
     def test_save_quarter_with_invalid_value(self):
         bs = BftStatus()
         bs.status = "QUARTER"
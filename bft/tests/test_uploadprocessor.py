@@ -1,11 +1,28 @@
+import pandas as pd
 import pytest
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client
 from django.urls import reverse
 
-from bft.models import CostCenter, FundCenter, FundManager, SourceManager
-from bft.uploadprocessor import CostCenterLineItemProcessor, LineItemProcessor
+from bft.models import (
+    BftUser,
+    CostCenter,
+    DataVersion,
+    FundCenter,
+    FundManager,
+    LineItem,
+    LineItemImport,
+    SourceManager,
+)
+from bft.uploadprocessor import (
+    CostCenterLineItemProcessor,
+    CostCenterProcessor,
+    LineItemProcessor,
+    decode_amount,
+    decode_amounts,
+    decode_dates,
+)
 
 
 @pytest.mark.django_db
@@ -48,6 +65,99 @@ Base Fiscal Year : 2024
         p = LineItemProcessor(self.source_file)
         assert "2020" == p.find_base_fy("Base Fiscal Year : 2020")
 
+    def test_read_report_single_pass(self):
+        p = LineItemProcessor(f"{settings.BASE_DIR}/test-data/encumbrance_2184A3.txt")
+        records = list(p.read_report())
+        assert 7 == len(records)
+        assert "11111110" == records[0].docno
+        assert "2023" == p.data["fy"]
+        assert "2184A3" == p.data["fc"]
+        assert p.data["report"]
+        assert p.data["lineno"] > 0
+        assert {"C113", "C523"} == p.data["funds"]
+        assert {"8484WA"} == p.data["costcenters"]
+        assert not p.spent_in_fr_pc()
+
+    def test_csv2table_in_batches(self):
+        p = LineItemProcessor(f"{settings.BASE_DIR}/test-data/encumbrance_2184A3.txt", batch_size=3)
+        p.write_encumbrance_file_as_csv()
+        assert 7 == p.csv2table()
+        assert 7 == LineItemImport.objects.count()
+        p.discard_csv()
+        assert p.csvfile is None
+
+    def test_decode_amounts(self):
+        values = pd.Series(["1,234.56", "1,234.56-", "-12", "0.00", "-.50", "12,34", "", "abc", "-1-", "."])
+        decoded = decode_amounts(values)
+        assert [1234.56, -1234.56, -12.0, 0.0, -0.5] == decoded[:5].tolist()
+        assert decoded[5:].isna().all()
+        assert -1234.56 == decode_amount(" 1,234.56- ")
+        assert 0.5 == decode_amount(".50")
+        assert -0.5 == decode_amount("-.50")
+        assert -0.5 == decode_amount(".50-")
+        with pytest.raises(ValueError):
+            decode_amount("1.234,56")
+        with pytest.raises(ValueError):
+            decode_amount(".")
+
+    def test_decode_dates(self):
+        decoded = decode_dates(pd.Series(["2024.03.31", "", "2024.02.30", "31/03/2024"]))
+        assert "2024-03-31" == str(decoded[0].date())
+        assert decoded[1:].isna().all()
+
+    def test_csv2table_reports_invalid_cells(self, tmp_path):
+        with open(f"{settings.BASE_DIR}/test-data/encumbrance_2184A3.txt", encoding="windows-1252") as f:
+            content = f.read().replace("|2022.04.01|", "|2022.13.01|").replace("|      0.00 |", "|      0.0x |")
+        report = tmp_path / "encumbrance.txt"
+        report.write_text(content, encoding="windows-1252")
+        p = LineItemProcessor(str(report))
+        p.write_encumbrance_file_as_csv()
+        assert 0 == p.csv2table()
+        p.discard_csv()
+        invalid = {(cell["row"], cell["column"], cell["value"]) for cell in p.data["invalid_cells"]}
+        assert (1, "duedate", "2022.13.01") in invalid
+        assert (3, "spent", "0.0x") in invalid
+        assert 0 == LineItemImport.objects.count()
+
+    def test_invalid_header_skips_conversion(self, tmp_path, monkeypatch):
+        report = tmp_path / "encumbrance.txt"
+        report.write_text("DND Some Other Report\n\nFunds Center :     2184A3\nBase Fiscal Year : 2023\n")
+        p = LineItemProcessor(str(report))
+
+        def convert():
+            raise AssertionError("The report must not be converted")
+
+        monkeypatch.setattr(p, "write_encumbrance_file_as_csv", convert)
+        assert p.main() is False
+        assert p.csvfile is None
+
+    def test_csv_discarded_when_conversion_fails(self, tmp_path, monkeypatch):
+        with open(f"{settings.BASE_DIR}/test-data/encumbrance_2184A3.txt", encoding="windows-1252") as f:
+            content = f.read().replace("|J4POTVIN    |\n", "|J4POTVIN    |extra|\n", 1)
+        report = tmp_path / "encumbrance.txt"
+        report.write_text(content, encoding="windows-1252")
+        drmis_dir = tmp_path / "drmis_data"
+        drmis_dir.mkdir()
+        monkeypatch.setattr(LineItemProcessor, "DRMIS_DIR", str(drmis_dir))
+        p = LineItemProcessor(str(report))
+
+        with pytest.raises(AttributeError):
+            p.write_encumbrance_file_as_csv()
+        assert p.csvfile is None
+        assert [] == list(drmis_dir.iterdir())
+
+    def test_failed_reconcile_bumps_data_version(self, populatedata, monkeypatch):
+        def fail(*args):
+            raise RuntimeError("Fund center integrity failed")
+
+        monkeypatch.setattr(LineItem, "set_fund_center_integrity", fail)
+        version = DataVersion.objects.current()
+        p = LineItemProcessor(f"{settings.BASE_DIR}/test-data/encumbrance_2184A3.txt")
+
+        with pytest.raises(RuntimeError):
+            p.main()
+        assert version < DataVersion.objects.current()
+
     def test_report_does_not_match_post_request(self, setup, populatedata):
         c = Client()
         source_file = SimpleUploadedFile("file.txt", self.file_content, content_type="text/plain")
@@ -104,3 +214,32 @@ class TestCostCenterLineItemProcessor:
     def test_init(self, setup, populatedata, create_costcenter):
         c = CostCenterLineItemProcessor(self.source_file, "8486JM", "2184JZ")
         c.main()
+
+    def test_spent_in_fr_pc_is_uploaded(self, setup, populatedata, create_costcenter, tmp_path):
+        with open(self.source_file, encoding="windows-1252") as f:
+            lines = f.readlines()
+        lines[17] = lines[17].replace("        0.00 |", "      100.00 |", 1)
+        lines[18] = lines[18].replace("        0.00 |", "      100.00 |", 1).replace("|FR        |", "|PC        |")
+        source_file = tmp_path / "8486jm-spent.txt"
+        source_file.write_text("".join(lines), encoding="windows-1252")
+
+        c = CostCenterLineItemProcessor(str(source_file), "8486JM", "2184JZ")
+        c.main()
+
+        assert c.spent_in_fr_pc()
+        assert 11 == LineItem.objects.filter(costcenter__costcenter="8486JM").count()
+
+
+@pytest.mark.django_db
+class TestCostCenterProcessor:
+    def test_references_resolved_once(self, populatedata, tmp_path, django_assert_max_num_queries):
+        rows = [f"2184A3,8485{chr(65 + i)}A,New,True,True,Basement,C113" for i in range(20)]
+        upload = tmp_path / "costcenters.csv"
+        header = "costcenter_parent,costcenter,shortname,isforecastable,isupdatable,source,fund\n"
+        upload.write_text(header + "\n".join(rows))
+        user = BftUser.objects.create_user(email="luigi@forces.gc.ca", password="foo")
+
+        with django_assert_max_num_queries(20):  # Not one lookup per row and reference
+            CostCenterProcessor(str(upload), user).main()
+
+        assert 20 == CostCenter.objects.filter(costcenter__startswith="8485").count()
@@ -1,29 +1,90 @@
 import csv
-import locale
 import logging
 import os
 import re
-import sys
+import tempfile
 from abc import ABC, abstractmethod
-from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import django
 import numpy as np
 import pandas as pd
 from django.contrib import messages
-from django.db import IntegrityError
-from django.core.exceptions import MultipleObjectsReturned
+from django.db import IntegrityError, transaction
 
 from bft.conf import QUARTERKEYS
 from bft.models import (BftUser, CapitalInYear, CapitalNewYear, CapitalProject,
                         CapitalProjectManager, CapitalYearEnd, CostCenter,
-                        CostCenterAllocation, CostCenterManager, Fund,
-                        FundCenter, FundCenterAllocation, FundCenterManager,
+                        CostCenterAllocation, CostCenterManager, DataVersion,
+                        FinancialStructureManager, Fund, FundCenter,
+                        FundCenterAllocation, FundCenterManager,
                         FundManager, LineForecastManager, LineItem,
-                        LineItemImport, Source, SourceManager)
+                        LineItemImport, LineItemUpload, ReferenceData,
+                        Source, SourceManager)
 from main.settings import BASE_DIR
 
 logger = logging.getLogger("uploadcsv")
 
+#: One data line of the DND Cost Center Encumbrance Report, fields named as in LineItemProcessor.CSVFIELDS.
+EncumbranceRecord = namedtuple(
+    "EncumbranceRecord",
+    "docno lineno acctassno spent balance workingplan fundcenter fund costcenter internalorder doctype enctype "
+    "linetext predecessordocno predecessorlineno reference gl duedate vendor createdby",
+)
+
+#: DRMIS amount, with optional thousands separators and a leading or trailing minus sign, e.g. 1,234.56-
+AMOUNT_PATTERN = r"-?(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)-?"
+#: DRMIS date format, e.g. 2024.03.31
+DATE_FORMAT = "%Y.%m.%d"
+
+
+def decode_amount(value: str) -> float:
+    """Converts one DRMIS amount to float without relying on the process locale.
+
+    Args:
+        value (str): The amount as found in the encumbrance report.
+
+    Raises:
+        ValueError: The value is not a DRMIS amount.
+
+    Returns:
+        float: The amount, negative if it carries a minus sign.
+    """
+    amount = value.strip()
+    if not re.fullmatch(AMOUNT_PATTERN, amount) or amount.startswith("-") and amount.endswith("-"):
+        raise ValueError(f"Invalid amount '{value}'")
+    sign = -1 if "-" in amount else 1
+    return sign * float(amount.strip("-").replace(",", ""))
+
+
+def decode_amounts(values: pd.Series) -> pd.Series:
+    """Vectorized version of decode_amount.
+
+    Args:
+        values (pd.Series): Amounts as found in the encumbrance report.
+
+    Returns:
+        pd.Series: Float amounts, NaN where the value is not a DRMIS amount.
+    """
+    amounts = values.str.strip()
+    valid = amounts.str.fullmatch(AMOUNT_PATTERN) & ~(amounts.str.startswith("-") & amounts.str.endswith("-"))
+    sign = np.where(amounts.str.contains("-", regex=False), -1.0, 1.0)
+    decoded = pd.to_numeric(amounts.str.strip("-").str.replace(",", "", regex=False), errors="coerce") * sign
+    return decoded.where(valid)
+
+
+def decode_dates(values: pd.Series) -> pd.Series:
+    """Converts DRMIS dates, as found in the encumbrance report, to datetime.
+
+    Args:
+        values (pd.Series): Dates formatted as DATE_FORMAT, blank when there is no date.
+
+    Returns:
+        pd.Series: Datetime values, NaT where the value is blank or not a valid date.
+    """
+    return pd.to_datetime(values.str.strip(), format=DATE_FORMAT, errors="coerce")
+
 
 class UploadProcessor(ABC):
     """
@@ -406,20 +467,21 @@ class FundCenterAllocationProcessor(AllocationProcessor):
                 return
         _dict = self.as_dict(df)
         counter = 0
-        for item in _dict:
-            item["fund"] = FundManager().fund(item["fund"])
-            item["fundcenter"] = FundCenterManager().fundcenter(item["fundcenter"])
-            item["owner"] = self.user
-            alloc = FundCenterAllocation(**item)
-            try:
-                alloc.save()
-                counter += 1
-                logger.info(f"Uploaded fund center allocation {alloc.fundcenter} - ${alloc.amount}.")
-            except IntegrityError as err:
-                msg = f"Saving fund center allocation {alloc} generates {err}"
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
+        with ReferenceData.scope():
+            for item in _dict:
+                item["fund"] = FundManager().fund(item["fund"])
+                item["fundcenter"] = FundCenterManager().fundcenter(item["fundcenter"])
+                item["owner"] = self.user
+                alloc = FundCenterAllocation(**item)
+                try:
+                    alloc.save()
+                    counter += 1
+                    logger.info(f"Uploaded fund center allocation {alloc.fundcenter} - ${alloc.amount}.")
+                except IntegrityError as err:
+                    msg = f"Saving fund center allocation {alloc} generates {err}"
+                    logger.warning(msg)
+                    if request:
+                        messages.error(request, msg)
         if counter:
             msg = f"{counter} fund center allocation(s) have been uploaded."
             if request:
@@ -534,20 +596,21 @@ class CostCenterAllocationProcessor(AllocationProcessor):
                 return
         _dict = self.as_dict(df)
         counter = 0
-        for item in _dict:
-            item["fund"] = FundManager().fund(item["fund"])
-            item["costcenter"] = CostCenterManager().cost_center(item["costcenter"])
-            item["owner"] = self.user
-            alloc = CostCenterAllocation(**item)
-            try:
-                alloc.save()
-                counter += 1
-                logger.info(f"Uploaded cost center allocation {alloc.costcenter} - ${alloc.amount}.")
-            except IntegrityError as err:
-                msg = f"Saving cost center allocation {alloc} generates {err}."
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
+        with ReferenceData.scope():
+            for item in _dict:
+                item["fund"] = FundManager().fund(item["fund"])
+                item["costcenter"] = CostCenterManager().cost_center(item["costcenter"])
+                item["owner"] = self.user
+                alloc = CostCenterAllocation(**item)
+                try:
+                    alloc.save()
+                    counter += 1
+                    logger.info(f"Uploaded cost center allocation {alloc.costcenter} - ${alloc.amount}.")
+                except IntegrityError as err:
+                    msg = f"Saving cost center allocation {alloc} generates {err}."
+                    logger.warning(msg)
+                    if request:
+                        messages.error(request, msg)
         if counter:
             msg = f"{counter} cost center allocation(s) have been uploaded."
             if request:
@@ -787,28 +850,18 @@ class FundCenterProcessor(UploadProcessor):
             messages.error(request, f"Duplicate fund centers have been detected: {duplicates.to_html()}")
             return
 
-        _dict = self.as_dict(df)
-        counter = 0
-        for item in _dict:
-            if item["fundcenter_parent"] == "":
-                item["fundcenter_parent"] = None
-            else:
-                item["fundcenter_parent"] = FundCenterManager().fundcenter(item["fundcenter_parent"])
-            item_obj = FundCenter(**item)
-            try:
-                item_obj.save()
-                counter += 1
-                logger.info(f"Uploaded fund center {item_obj.fundcenter}.")
-            except MultipleObjectsReturned as err:
-                msg = f"Saving fund center {item} generates {err}."
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
-            except IntegrityError as err:
-                msg = f"Saving fund center {item}  generates {err}."
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
+        errors = []
+        try:
+            created = FinancialStructureManager().bulk_create_fundcenters(self.as_dict(df), errors)
+        except IntegrityError as err:
+            errors.append(f"Saving fund centers generates {err}, none have been uploaded.")
+            logger.warning(errors[-1])
+            created = []
+        if request:
+            for msg in errors:
+                messages.error(request, msg)
+        counter = len(created)
+        logger.info(f"Uploaded fund centers {', '.join(fc.fundcenter for fc in created)}.")
         if counter:
             msg = f"{counter} fund center(s) have been uploaded."
             if request:
@@ -831,15 +884,16 @@ class CapitalProjectProcessor(UploadProcessor):
             return duplicates
 
     def _assign_fundcenter(self, projects: dict, request=None) -> dict | None:
-        for item in projects:  # assign parent, fund and source to everyone before saving
-            parent = FundCenterManager().fundcenter(item["fundcenter"])
-            if not parent:
-                msg = f"Capaital Project {item['project_no']} parent ({item['fundcenter']}) does not exist, no capital projects have been recorded."
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
-                return
-            item["fundcenter"] = parent
+        with ReferenceData.scope():
+            for item in projects:  # assign parent, fund and source to everyone before saving
+                parent = FundCenterManager().fundcenter(item["fundcenter"])
+                if not parent:
+                    msg = f"Capaital Project {item['project_no']} parent ({item['fundcenter']}) does not exist, no capital projects have been recorded."
+                    logger.warning(msg)
+                    if request:
+                        messages.error(request, msg)
+                    return
+                item["fundcenter"] = parent
         return projects
 
     def main(self, request=None):
@@ -919,15 +973,16 @@ class CapitalProjectForecastProcessor(UploadProcessor):
         return capital_forecasts
 
     def _assign_fund(self, capital_forecasts: dict, request=None) -> dict | None:
-        for item in capital_forecasts:  # assign fund to everyone before saving
-            fund = FundManager().fund(item["fund"])
-            if not fund:
-                msg = f"Project {item['capital_project']} fund ({item['fund']}) does not exist, no capital Forecasts have been recorded."
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
-                return
-            item["fund"] = fund
+        with ReferenceData.scope():
+            for item in capital_forecasts:  # assign fund to everyone before saving
+                fund = FundManager().fund(item["fund"])
+                if not fund:
+                    msg = f"Project {item['capital_project']} fund ({item['fund']}) does not exist, no capital Forecasts have been recorded."
+                    logger.warning(msg)
+                    if request:
+                        messages.error(request, msg)
+                    return
+                item["fund"] = fund
         return capital_forecasts
 
 
@@ -1082,7 +1137,7 @@ class CostCenterProcessor(UploadProcessor):
 
     def _assign_fundcenter(self, costcenters: dict, request=None) -> dict | None:
         for item in costcenters:  # assign parent, fund and source to everyone before saving
-            parent = FundCenterManager().fundcenter(item["costcenter_parent"])
+            parent = FundCenterManager().fundcenter(str(item["costcenter_parent"]))
             if not parent:
                 msg = f"Cost center {item['costcenter']} parent ({item['costcenter_parent']}) does not exist, no cost centers have been recorded."
                 logger.warning(msg)
@@ -1094,7 +1149,7 @@ class CostCenterProcessor(UploadProcessor):
 
     def _assign_fund(self, costcenters: dict, request=None) -> dict | None:
         for item in costcenters:  # assign parent, fund and source to everyone before saving
-            fund = FundManager().fund(item["fund"])
+            fund = FundManager().fund(str(item["fund"]))
             if not fund:
                 msg = f"Cost center {item['costcenter']} fund ({item['fund']}) does not exist, no cost centers have been recorded."
                 logger.warning(msg)
@@ -1106,7 +1161,7 @@ class CostCenterProcessor(UploadProcessor):
 
     def _assign_source(self, costcenters: dict, request=None) -> dict | None:
         for item in costcenters:  # assign parent, fund and source to everyone before saving
-            source = SourceManager().source(item["source"])
+            source = SourceManager().source(str(item["source"]))
             if not source:
                 msg = f"Cost center {item['costcenter']} source ({item['source']}) does not exist, no cost centers have been recorded."
                 logger.warning(msg)
@@ -1131,25 +1186,25 @@ class CostCenterProcessor(UploadProcessor):
             return
 
         _dict = self.as_dict(df)
-        if not self._assign_fundcenter(_dict, request):
-            return
-        if not self._assign_fund(_dict, request):
-            return
-        if not self._assign_source(_dict, request):
-            return
-
-        counter = 0
-        for item in _dict:
-            item_obj = CostCenter(**item)
+        errors = []
+        with ReferenceData.scope():
+            if not self._assign_fundcenter(_dict, request):
+                return
+            if not self._assign_fund(_dict, request):
+                return
+            if not self._assign_source(_dict, request):
+                return
             try:
-                item_obj.save()
-                counter += 1
-                logger.info(f"Uploaded cost center {item_obj.costcenter}.")
+                created = FinancialStructureManager().bulk_create_costcenters(_dict, errors)
             except IntegrityError as err:
-                msg = f"Saving cost center {item} generates {err}"
-                logger.warning(msg)
-                if request:
-                    messages.error(request, msg)
+                errors.append(f"Saving cost centers generates {err}, none have been uploaded.")
+                logger.warning(errors[-1])
+                created = []
+        if request:
+            for msg in errors:
+                messages.error(request, msg)
+        counter = len(created)
+        logger.info(f"Uploaded cost centers {', '.join(cc.costcenter for cc in created)}.")
         if counter:
             msg = f"{counter} cost center(s) have been uploaded."
             if request:
@@ -1170,20 +1225,23 @@ class LineItemProcessor(UploadProcessor):
 
     #: Number of columns expected in the DND Cost Center Encumbrance Report
     COLUMNS = 22  # Includes empty columns at beginning and end of row
-    #: Location where the csv version of the DND Cost Center Encumbrance Report is saved.
-    CSVFILE = os.path.join(BASE_DIR, "drmis_data/encumbrance.csv")
-    #: Location where DRMIS reports are saved.
+    #: Location where DRMIS reports and their csv version are saved.
     DRMIS_DIR = os.path.join(BASE_DIR, "drmis_data")
     #: Columnc names and order as found in the DND Cost Center Encumbrance report and used to create the CSV file.
     CSVFIELDS = "|docno|lineno|acctassno|spent|balance|workingplan|fundcenter|fund|costcenter|internalorder|doctype|enctype|linetext|predecessordocno|predecessorlineno|reference|gl|duedate|vendor|createdby|"
+    #: Number of rows written per INSERT when loading the LineItemImport table.
+    BATCH_SIZE = 5000
 
-    def __init__(self, filepath=None, request=None):
-        locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
+    def __init__(self, filepath=None, request=None, batch_size: int = None, delta: bool = False):
         if filepath is None:
             raise ValueError("No file name provided")
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"{filepath} was not found")
         self.filepath = filepath
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.delta = delta  # Only touch line items whose content changed
+        self.costcenter = ""
+        self.csvfile = None  # csv version of the report, one file per upload
 
         if request:
             self.user = request.user
@@ -1206,6 +1264,12 @@ class LineItemProcessor(UploadProcessor):
             "lineno": 0,  # Linenumber where first column header was found
             "csv": 0,  # csv line count data resulting from parsing the report
             "column_count": 22,  # Expected number of columns un the DRMIS report
+            "report": False,  # DND Cost Center Encumbrance Report banner found
+            "funds": set(),  # Unique funds found in data lines
+            "costcenters": set(),  # Unique cost centers found in data lines
+            "fr_spent": False,  # At least one FR line has spent
+            "pc_spent": False,  # At least one PC line has spent
+            "invalid_cells": [],  # Amounts and dates that could not be decoded, see csv2table
         }
 
     def find_fund_center(self, line: str) -> str | None:
@@ -1256,23 +1320,7 @@ class LineItemProcessor(UploadProcessor):
             e = e.strip()
             self.data["header"] += [e]
 
-    def find_header_line(self) -> int:
-        """Attemps to find the row that contains the column header based on self.hint['header']
-
-        Returns:
-            int: 0 if nothing found, line number otherwise.
-        """
-
-        lineno = 0
-        with open(self.filepath, encoding="windows-1252") as lines:
-            for line in lines:
-                lineno += 1
-                if line.startswith(self.hint["header"]):
-                    parts = line.split("|")
-                    if len(parts) == self.COLUMNS:
-                        self.clean_header(parts)
-                        self.data["lineno"] = lineno
-                        break
+    def _header_found(self) -> int:
         if not self.data["lineno"]:
             msg = f"Line Items upload by {self.user}, Failed to find header line."
             logger.error(msg)
@@ -1280,34 +1328,6 @@ class LineItemProcessor(UploadProcessor):
                 messages.error(self.request, msg)
         return self.data["lineno"]
 
-    def is_dnd_cost_center_report(self) -> bool:
-        """Attempts to find the string that identifies a DND Cost Center Report
-
-        Returns:
-            bool: True if fount, False otherwise.
-        """
-        try:
-            with open(self.filepath, encoding="windows-1252") as lines:
-                for line in lines:
-                    if line.startswith(self.hint["report"]):
-                        logger.info("Found DND Cost Center report")
-                        return True
-                    if line == "\n":
-                        logger.error("DID not find DND Cost center report.")
-                        return False
-        except TypeError:
-            msg = "File name is not of expected type"
-            logger.error(msg)
-            if self.request:
-                messages.error(self.request, msg)
-        except FileNotFoundError:
-            msg = "File name was not found"
-            logger.error(msg)
-            if self.request:
-                messages.error(self.request, msg)
-        logger.error("DID not find DND Cost center report.")
-        return False
-
     def line_to_csv(self, line: str) -> list:
         """
         Split a line from the encumbrance report in a list
@@ -1350,27 +1370,91 @@ class LineItemProcessor(UploadProcessor):
 
         return False
 
+    def read_report(self):
+        """Read the encumbrance report in a single pass.
+
+        Lines before the column header are used to find the report banner, the base fiscal year, the fund
+        center and the column header itself.  Every data line that follows is yielded as an
+        EncumbranceRecord.  Unique funds, unique cost centers and whether FR or PC lines carry spent amounts
+        are collected in self.data as records go by.
+
+        Yields:
+            EncumbranceRecord: One record per data line of the report.
+        """
+        self.data.update(
+            {
+                "fy": None,
+                "fc": None,
+                "header": [],
+                "lineno": 0,
+                "report": False,
+                "funds": set(),
+                "costcenters": set(),
+                "fr_spent": False,
+                "pc_spent": False,
+            }
+        )
+        banner_zone = True  # The report banner must show up before the first empty line
+        with open(self.filepath, encoding="windows-1252") as lines:
+            for lineno, line in enumerate(lines, start=1):
+                if self.data["lineno"]:
+                    if self.is_data_line(line):
+                        record = EncumbranceRecord(*self.line_to_csv(line))
+                        self._collect(record)
+                        yield record
+                    continue
+                if banner_zone and not self.data["report"]:
+                    if line.startswith(self.hint["report"]):
+                        self.data["report"] = True
+                    elif line == "\n":
+                        banner_zone = False
+                if self.data["fy"] is None:
+                    self.find_base_fy(line)
+                if self.data["fc"] is None:
+                    self.find_fund_center(line)
+                if line.startswith(self.hint["header"]):
+                    parts = line.split("|")
+                    if len(parts) == self.COLUMNS:
+                        self.clean_header(parts)
+                        self.data["lineno"] = lineno
+
+    def read_header(self) -> None:
+        """Read the report up to its first data line only, setting the banner, base fiscal year, fund center and
+        column header in self.data.  Lets the header be validated before the whole report is converted."""
+        records = self.read_report()
+        try:
+            next(records, None)
+        finally:
+            records.close()
+
+    def _collect(self, record: EncumbranceRecord) -> None:
+        self.data["funds"].add(record.fund)
+        self.data["costcenters"].add(record.costcenter)
+        if record.doctype in ("FR", "PC") and not self.data[f"{record.doctype.lower()}_spent"]:
+            try:
+                self.data[f"{record.doctype.lower()}_spent"] = decode_amount(record.spent) > 0
+            except ValueError:
+                pass  # assume that if exception occurs, there are no spent.
+
     def write_encumbrance_file_as_csv(self) -> int:
         """
-        Transform the encumbrance report raw file into a more useful CSV file.
+        Transform the encumbrance report raw file into a more useful CSV file.  The raw file is read once
+        through read_report, which also sets FY, fund center, header and the unique funds and cost centers.
         """
-        lineno = 0
         lines_written = 0
-        with open(self.filepath, encoding="windows-1252") as lines, open(self.CSVFILE, "w") as recorder:
-            writer = csv.writer(recorder, quoting=csv.QUOTE_ALL)
-            header = self.line_to_csv(self.CSVFIELDS)
-            writer.writerow(header)
-            for line in lines:
-                lineno += 1
-                if lineno < self.data["lineno"]:
-                    continue
-                if self.is_data_line(line):
-                    data = self.line_to_csv(line)
-                    if data:
-                        writer.writerow(data)
-
-        with open(self.CSVFILE, "rb") as f:
-            lines_written = sum(1 for _ in f)
+        self.discard_csv()
+        fd, self.csvfile = tempfile.mkstemp(prefix="encumbrance-", suffix=".csv", dir=self.DRMIS_DIR)
+        try:
+            with os.fdopen(fd, "w") as recorder:
+                writer = csv.writer(recorder, quoting=csv.QUOTE_ALL)
+                writer.writerow(self.line_to_csv(self.CSVFIELDS))
+                lines_written += 1
+                for record in self.read_report():
+                    writer.writerow(record)
+                    lines_written += 1
+        except BaseException:
+            self.discard_csv()
+            raise
 
         if lines_written > 0:
             self.data["csv"] = lines_written
@@ -1378,64 +1462,69 @@ class LineItemProcessor(UploadProcessor):
         else:
             raise RuntimeError("CSV file has not been written.")
 
-    def csv_get_unique_funds(self):
-        df = pd.read_csv(self.CSVFILE, usecols=["fund"])
-        return df["fund"].unique()
+    def csv2table(self, append: bool = False) -> int:
+        """Import CSV Encumbrance file in the LineItemImport Table.
 
-    def csv_get_unique_costcenters(self):
-        df = pd.read_csv(self.CSVFILE, usecols=["costcenter"])
-        return df["costcenter"].unique()
+        Rows are written with bulk_create, self.batch_size rows at a time, and the whole load runs in one
+        transaction so a failed upload leaves the previous import table untouched.  Amounts and dates are decoded
+        one column at a time.  Cells that cannot be decoded are collected in self.data["invalid_cells"] and, if
+        there are any, nothing is written.
 
-    def csv2table(self):
-        """Import CSV Encumbrance file in the LineItemImport Table"""
-
-        def str2float(n):
-            try:
-                return locale.atof(n)
-            except ValueError:
-                logger.fatal(f"Failed to convert '{n}' to float")
-                sys.exit()
+        Args:
+            append (bool, optional): Keep lines already in the LineItemImport table. Defaults to False.
 
-        def str2date(s):
-            if s == "":
-                return None
-            try:
-                d = datetime.strptime(s, "%Y.%m.%d")
-                return d
-            except ValueError:
-                logger.fatal(f"Failed to convert {s} as date")
-                sys.exit()
-
-        LineItemImport.objects.all().delete()
-        with open(self.CSVFILE) as file:
-            next(file)  # skip the header row
-            reader = csv.reader(file)
-            for row in reader:
-                lineitem = LineItemImport(
-                    docno=row[0],
-                    lineno=f"{row[1]}:{row[2] or 0}",
-                    spent=str2float(row[3]),
-                    balance=str2float(row[4]),
-                    workingplan=str2float(row[5]),
-                    fundcenter=row[6],
-                    fund=row[7],
-                    costcenter=row[8],
-                    internalorder=row[9],
-                    doctype=row[10],
-                    enctype=row[11],
-                    linetext=row[12],
-                    predecessordocno=row[13],
-                    predecessorlineno=row[14],
-                    reference=row[15],
-                    gl=row[16],
-                    duedate=str2date(row[17]),
-                    vendor=row[18],
-                    createdby=row[19],
-                )
-                lineitem.save()
+        Returns:
+            int: Number of lines written to the LineItemImport table.
+        """
+        self.data["invalid_cells"] = []
+        written = 0
+        chunks = pd.read_csv(self.csvfile, dtype=str, keep_default_na=False, chunksize=self.batch_size)
+        with transaction.atomic():
+            if not append:
+                LineItemImport.objects.all().delete()
+            for chunk in chunks:
+                batch = self._decode_chunk(chunk)
+                if self.data["invalid_cells"]:
+                    continue  # keep decoding to report every invalid cell, but stop writing
+                LineItemImport.objects.bulk_create(batch)
+                written += len(batch)
+                logger.info(f"{written} lines written to Encumbrance import table so far")
+            if self.data["invalid_cells"]:
+                transaction.set_rollback(True)
+        if self.data["invalid_cells"]:
+            self._report_invalid_cells()
+            return 0
+        return written
+
+    def _decode_chunk(self, chunk: pd.DataFrame) -> list[LineItemImport]:
+        amounts = {column: decode_amounts(chunk[column]) for column in ("spent", "balance", "workingplan")}
+        duedates = decode_dates(chunk["duedate"])
+        invalid = {column: amounts[column].isna() for column in amounts}
+        invalid["duedate"] = duedates.isna() & (chunk["duedate"].str.strip() != "")
+        for column, mask in invalid.items():
+            for index, value in chunk.loc[mask, column].items():
+                self.data["invalid_cells"].append({"row": index + 1, "column": column, "value": value})
+        if self.data["invalid_cells"]:
+            return []
+
+        chunk = chunk.assign(
+            lineno=chunk["lineno"] + ":" + chunk["acctassno"].replace("", "0"),
+            duedate=duedates.dt.date.astype(object).where(duedates.notna(), None),
+            **amounts,
+        ).drop(columns="acctassno")
+        return [LineItemImport(**row) for row in chunk.to_dict("records")]
+
+    def _report_invalid_cells(self) -> None:
+        invalid_cells = self.data["invalid_cells"]
+        for cell in invalid_cells:
+            logger.error(f"{self.filepath} data row {cell['row']}, {cell['column']}: cannot decode '{cell['value']}'")
+        msg = f"Encumbrance report not imported, {len(invalid_cells)} amounts or dates could not be decoded."
+        logger.error(msg)
+        if self.request:
+            messages.error(self.request, msg)
 
     def missing_fund(self):
-        fund_import = set(self.csv_get_unique_funds())
+        fund_import = self.data["funds"]
         fund = set(Fund.objects.all().values_list("fund", flat=True))
         missing_funds = fund_import.difference(fund)
         if missing_funds:
@@ -1446,7 +1535,7 @@ class LineItemProcessor(UploadProcessor):
             return True
 
     def missing_costcenters(self):
-        cc_import = set(self.csv_get_unique_costcenters())
+        cc_import = self.data["costcenters"]
         cc = set(CostCenter.objects.all().values_list("costcenter", flat=True))
         missing_cc = cc_import.difference(cc)
         if missing_cc:
@@ -1458,37 +1547,25 @@ class LineItemProcessor(UploadProcessor):
 
     def spent_in_fr_pc(self) -> bool:
         # Must return false for clean result
-        fr_has_spent = pc_has_spent = False
-        df = pd.read_csv(self.CSVFILE, usecols=["spent", "doctype", "enctype"])
-        try:  # assume that if exception occurs, there are no spent.
-            fr_has_spent = not df.query("doctype == 'FR' & spent > 0 ").empty
-            pc_has_spent = not df.query("doctype == 'PC' & spent > 0 ").empty
-        except BaseException:
-            pass
-        return all([fr_has_spent, pc_has_spent])
-
-    def _set_data(self) -> bool:
-        if not self.filepath:
-            raise ValueError("Encumbrance report not defined.")
+        return all([self.data["fr_spent"], self.data["pc_spent"]])
+
+    def _fy_fc_found(self) -> bool:
+        logger.info(f"Fiscal Year : {self.data['fy']}")
+        logger.info(f"Fund Center : {self.data['fc']}")
+        found = self.data["fy"] is not None and self.data["fc"] is not None
+        if not found:
+            msg = f"Line Items upload by {self.user}.  Could not find FY, FC or report in report header."
+            logger.error(msg)
+            if self.request:
+                messages.error(self.request, msg)
+        return found
 
-        with open(self.filepath, encoding="windows-1252") as lines:
-            is_set = [False, False]
-            for line in lines:
-                if self.data["fy"] is None:
-                    is_set[0] = self.find_base_fy(line)
-                if self.data["fc"] is None:
-                    is_set[1] = self.find_fund_center(line)
-                if all(is_set):
-                    break
-
-            logger.info(f"Fiscal Year : {self.data['fy']}")
-            logger.info(f"Fund Center : {self.data['fc']}")
-            if not all(is_set):
-                msg = f"Line Items upload by {self.user}.  Could not find FY, FC or report in report header."
-                logger.error(msg)
-                if self.request:
-                    messages.error(self.request, msg)
-        return all(is_set)
+    def _report_found(self) -> bool:
+        if self.data["report"]:
+            logger.info("Found DND Cost Center report")
+        else:
+            logger.error("DID not find DND Cost center report.")
+        return self.data["report"]
 
     def _fundcenter_matches_report(self):
         if not self.request:
@@ -1501,24 +1578,59 @@ class LineItemProcessor(UploadProcessor):
             return False
         return True
 
-    def _do_preliminary_checks(self) -> bool:
-        logger.info(f"Begin Upload processing by {self.user}")
-        if not self._set_data():
+    def _upload_summary(self, imported: dict, orphaned: dict) -> str:
+        return (
+            f"{imported['inserted']} new lines, {imported['updated']} updated lines, "
+            f"{imported['unchanged']} unchanged lines, "
+            f"{orphaned['lines']} orphan lines ({orphaned['forecasts']} forecasts set to 0)."
+        )
+
+    def _record_upload(self, imported: dict, orphaned: dict, fundcenter: str = None) -> LineItemUpload:
+        return LineItemUpload.objects.create(
+            fundcenter=self.data["fc"] if fundcenter is None else fundcenter,
+            fy=self.data["fy"],
+            costcenter=self.costcenter,
+            user=str(self.user),
+            delta=self.delta,
+            inserted=imported["inserted"],
+            updated=imported["updated"],
+            orphaned=orphaned["lines"],
+            unchanged=imported["unchanged"],
+        )
+
+    def _report_is_consistent(self) -> bool:
+        return True
+
+    def _check_spent_in_fr_pc(self) -> None:
+        if self.spent_in_fr_pc():
+            raise ValueError("Encumbrance Report contains spent amount in either FR or PC elements")
+
+    def _validate_header(self) -> bool:
+        """Checks the report banner, base fiscal year, fund center and column header collected by read_header or
+        write_encumbrance_file_as_csv.  Does not read the report."""
+        if not self._fy_fc_found():
             logger.warning("Failed to set data.  Something is wrong with the encubrance report.")
             return False
 
         if not self._fundcenter_matches_report():
             return False
 
-        if not self.is_dnd_cost_center_report():
+        if not self._report_found():
             return False
 
         logger.info("We have a DND Cost center encumbrance report.")
 
-        if self.find_header_line() == 0:
+        if self._header_found() == 0:
             return False
+        return True
+
+    def _validate_report(self) -> bool:
+        """Checks the report data collected by write_encumbrance_file_as_csv.  Does not read the report."""
+        return self._validate_header() and self._validate_lines()
 
-        if self.write_encumbrance_file_as_csv() == 0:
+    def _validate_lines(self) -> bool:
+        """Checks the funds and cost centers collected from the data lines by write_encumbrance_file_as_csv."""
+        if not self._report_is_consistent():
             return False
 
         if self.missing_fund():
@@ -1529,57 +1641,98 @@ class LineItemProcessor(UploadProcessor):
 
         return True
 
-    def main(self) -> bool:
-        if not self._do_preliminary_checks():
+    def _do_preliminary_checks(self) -> bool:
+        logger.info(f"Begin Upload processing by {self.user}")
+        self.read_header()
+        if not self._validate_header():
             return False
-        if self.spent_in_fr_pc():
-            raise ValueError("Encumbrance Report contains spent amount in either FR or PC elements")
-        self.csv2table()
-        linecount = LineItemImport.objects.count()
-        logger.info(f"{linecount} lines have been written to Encumbrance import table")
+        self.write_encumbrance_file_as_csv()
+        return self._validate_lines()
+
+    def discard_csv(self) -> None:
+        """Removes the CSV file written for this upload, if any."""
+        if self.csvfile and os.path.exists(self.csvfile):
+            os.remove(self.csvfile)
+        self.csvfile = None
 
+    def reconcile(self, costcenter: CostCenter = None, fundcenters: list[str] = None) -> tuple[dict, dict]:
+        """Brings the LineItemImport table into the line items and their forecasts.
+
+        Args:
+            costcenter (CostCenter, optional): Limit orphan detection and forecast history to this cost center.
+            fundcenters (list[str], optional): Limit orphan detection to the cost centers under these fund centers.
+
+        Returns:
+            tuple[dict, dict]: Counts returned by LineItem.import_lines and LineItem.mark_orphan_lines.
+        """
         li = LineItem()
 
-        orphan = li.get_orphan_lines()
-        li.mark_orphan_lines(orphan)
+        orphan = li.get_orphan_lines(costcenter=costcenter, exclude_marked=self.delta, fundcenters=fundcenters)
+        orphaned = li.mark_orphan_lines(orphan)
 
-        li.import_lines()
+        imported = li.import_lines(delta=self.delta)
         li.set_fund_center_integrity()
         li.set_doctype()
-        LineForecastManager().set_encumbrance_history_record()
+        LineForecastManager().set_encumbrance_history_record(costcenter)
         # LineForecastManager().set_unforecasted_to_spent()
-        LineForecastManager().set_underforecasted()
-        LineForecastManager().set_overforecasted()
-        msg = "BFT dowload complete"
+        LineForecastManager().set_underforecasted(costcenter)
+        LineForecastManager().set_overforecasted(costcenter)
+        return imported, orphaned
+
+    def main(self, costcenter: CostCenter = None) -> bool:
+        try:
+            if not self._do_preliminary_checks():
+                return False
+            self._check_spent_in_fr_pc()
+            linecount = self.csv2table()
+        finally:
+            self.discard_csv()
+        if self.data["invalid_cells"]:
+            return False
+        logger.info(f"{linecount} lines have been written to Encumbrance import table")
+
+        try:
+            imported, orphaned = self.reconcile(costcenter)
+            self._record_upload(imported, orphaned)
+        except BaseException:
+            DataVersion.objects.bump()  # Lines changed before the failure, and no upload is recorded to say so
+            raise
+        msg = f"BFT dowload complete. {self._upload_summary(imported, orphaned)}"
         logger.info(msg)
         if self.request:
             messages.info(self.request, msg)
 
 
 class CostCenterLineItemProcessor(LineItemProcessor):
-    def __init__(self, filepath, costcenter: str, fundcenter: str, request=None):
-        super().__init__(filepath, request)
+    def __init__(
+        self, filepath, costcenter: str, fundcenter: str, request=None, batch_size: int = None, delta: bool = False
+    ):
+        super().__init__(filepath, request, batch_size, delta)
         self.costcenter = costcenter.upper()
         self.fundcenter = fundcenter.upper()
         self.costcenter_obj = CostCenter.objects.get(costcenter=self.costcenter)
 
     def all_costcenter_are_equals(self) -> bool:
-        """Ensures the the encumbrance report lines are related to one single cost center.  Verification is done from the csv file."""
-        df = pd.read_csv(BASE_DIR / "drmis_data/encumbrance.csv")
-        cc = df["costcenter"]
-        cc_set = set(cc.to_list())
+        """Ensures the the encumbrance report lines are related to one single cost center.  Verification is done from the cost centers collected while reading the report."""
+        cc_set = self.data["costcenters"]
         set_size = len(cc_set)
         msg = None
         if set_size > 10:
             msg = "There are more that 10 different cost centers in the report."
         elif set_size > 1:
-            msg = f"There are more that one cost center in the report. Found {', '.join(cc_set)}"
+            msg = f"There are more that one cost center in the report. Found {', '.join(sorted(cc_set))}"
         if msg:
             logger.error(msg)
             if self.request:
                 messages.error(self.request, msg)
         return set_size == 1
 
+    def _report_is_consistent(self) -> bool:
+        return self.all_costcenter_are_equals()
+
+    def _check_spent_in_fr_pc(self) -> None:
+        pass  # Cost center uploads never rejected spent amounts in FR or PC elements
+
     def main(self) -> bool:
         logger.info(f"Begin Cost Center Upload processing by {self.user}")
         if not self.costcenter_obj.isupdatable:
@@ -1588,54 +1741,127 @@ class CostCenterLineItemProcessor(LineItemProcessor):
                 f"{self.costcenter} is not updatable.  You must change the Updatable status first to proceed.",
             )
             return False
-        if not self._set_data():
-            logger.warning("Failed to set data")
-            return False
+        return super().main(self.costcenter_obj)
 
-        if not self._fundcenter_matches_report():
-            logger.error("Fund center report does not match")
-            return False
 
-        if not self.is_dnd_cost_center_report():
-            logger.error("We do not have a DND Cost center encumbrance report")
-            return False
+def parse_encumbrance_report(filepath: str) -> LineItemProcessor:
+    """Reads one encumbrance report into its own CSV file.  No database access, safe to run in a worker process.
 
-        logger.info("We have a DND Cost center encumbrance report.")
+    Args:
+        filepath (str): Encumbrance report full path
 
-        if self.find_header_line() == 0:
-            return False
+    Returns:
+        LineItemProcessor: The processor, with report data collected and its CSV file written.  The CSV file is
+        not written when the report header is not valid.
+    """
+    processor = LineItemProcessor(filepath)
+    processor.read_header()
+    if processor._validate_header():
+        processor.write_encumbrance_file_as_csv()
+    return processor
 
-        if self.write_encumbrance_file_as_csv() == 0:
-            return False
-        if not self.all_costcenter_are_equals():
-            return False
 
-        if self.missing_fund():
-            return False
+class LineItemBatchProcessor:
+    """
+    LineItemBatchProcessor imports many DND Cost Center encumbrance reports at once, typically one per fund
+    center.
 
-        if not self.all_costcenter_are_equals():
-            return False
+    Reports are parsed in a pool of worker processes, each one into its own CSV file.  Once all reports are
+    parsed and validated, their lines are loaded together in the LineItemImport table and reconciled with the
+    line items once, so the database is only written by one process.  Only line items of the cost centers under
+    the fund centers of the reports can become orphans, so a batch that covers some fund centers leaves the line
+    items of the others untouched.
 
-        if self.missing_costcenters():
-            return False
+    Args:
+        filepaths (list): Encumbrance reports full path
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        batch_size (int, optional): Number of rows per insert in the LineItemImport table.
+        delta (bool, optional): Only touch line items whose content changed.
+    """
 
-        self.csv2table()
-        linecount = LineItemImport.objects.count()
-        logger.info(f"{linecount} lines have been written to Encumbrance import table")
+    def __init__(self, filepaths: list, workers: int = None, batch_size: int = None, delta: bool = False):
+        if not filepaths:
+            raise ValueError("No file name provided")
+        for filepath in filepaths:
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"{filepath} was not found")
+        self.filepaths = filepaths
+        self.workers = workers
+        self.batch_size = batch_size
+        self.delta = delta
+        self.processors = []
+
+    def parse(self) -> bool:
+        """Parses all reports in worker processes.
 
-        li = LineItem()
+        Returns:
+            bool: True if every report could be parsed.
+        """
+        parsed = True
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup) as executor:
+            jobs = {executor.submit(parse_encumbrance_report, filepath): filepath for filepath in self.filepaths}
+            for job in as_completed(jobs):
+                try:
+                    processor = job.result()
+                except Exception as err:
+                    logger.error(f"Failed to parse {jobs[job]}: {err}")
+                    parsed = False
+                    continue
+                processor.batch_size = self.batch_size or processor.BATCH_SIZE
+                processor.delta = self.delta
+                self.processors.append(processor)
+                logger.info(f"Parsed {processor.filepath}, {max(processor.data['csv'] - 1, 0)} lines.")
+        self.processors.sort(key=lambda p: self.filepaths.index(p.filepath))
+        return parsed
 
-        orphan = li.get_orphan_lines(costcenter=self.costcenter_obj)
-        li.mark_orphan_lines(orphan)
+    def validate(self) -> bool:
+        """Validates every parsed report.  All reports are checked so that all problems get logged.
 
-        li.import_lines()
-        li.set_fund_center_integrity()
-        li.set_doctype()
-        LineForecastManager().set_encumbrance_history_record(self.costcenter_obj)
-        # LineForecastManager().set_unforecasted_to_spent()
-        LineForecastManager().set_underforecasted(self.costcenter_obj)
-        LineForecastManager().set_overforecasted(self.costcenter_obj)
-        msg = "BFT dowload complete"
-        logger.info(msg)
-        if self.request:
-            messages.info(self.request, msg)
+        Returns:
+            bool: True if all reports are valid and share the same base fiscal year.
+        """
+        if not all([p._validate_report() for p in self.processors]):
+            return False
+        fys = {p.data["fy"] for p in self.processors}
+        if len(fys) > 1:
+            logger.error(f"Encumbrance reports do not share the same fiscal year. Found {', '.join(sorted(fys))}")
+            return False
+        if any(p.spent_in_fr_pc() for p in self.processors):
+            logger.error("Encumbrance Report contains spent amount in either FR or PC elements")
+            return False
+        return True
+
+    def main(self) -> dict | None:
+        """Parses, validates and imports all reports.  Nothing is written to the database unless all reports are
+        valid.
+
+        Returns:
+            dict | None: Upload counts, None if any report failed parsing or validation.
+        """
+        logger.info(f"Begin batch upload of {len(self.filepaths)} encumbrance reports")
+        try:
+            if not self.parse() or not self.validate():
+                logger.error("Batch upload cancelled, no line items have been updated.")
+                return None
+            linecount = 0
+            with transaction.atomic():
+                for i, processor in enumerate(self.processors):
+                    linecount += processor.csv2table(append=i > 0)
+                    if processor.data["invalid_cells"]:
+                        transaction.set_rollback(True)
+                        logger.error("Batch upload cancelled, no line items have been updated.")
+                        return None
+        finally:
+            for processor in self.processors:
+                processor.discard_csv()
+        logger.info(f"{linecount} lines have been written to Encumbrance import table")
+
+        processor = self.processors[0]
+        try:
+            imported, orphaned = processor.reconcile(fundcenters=[p.data["fc"] for p in self.processors])
+            processor._record_upload(imported, orphaned, fundcenter="")
+        except BaseException:
+            DataVersion.objects.bump()  # Lines changed before the failure, and no upload is recorded to say so
+            raise
+        logger.info(f"BFT batch download complete. {processor._upload_summary(imported, orphaned)}")
+        return {**imported, "orphaned": orphaned["lines"]}
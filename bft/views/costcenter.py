@@ -1,6 +1,6 @@
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import RestrictedError
 from django.shortcuts import redirect, render
 
@@ -441,26 +441,21 @@ def fundcenter_update(request, pk):
             if obj.shortname:
                 obj.shortname = obj.shortname.upper()
 
-            # Check if parent changed and update sequence if needed
+            # A new parent moves the whole subtree, once the other fields are saved
             current = FundCenterManager().pk(obj.pk)
-            if obj.fundcenter_parent != current.fundcenter_parent:
-                fsm = FinancialStructureManager()
-                try:
-                    obj.sequence = fsm.set_parent(fundcenter_parent=obj.fundcenter_parent)
-                except Exception as e:
-                    messages.error(request, f"Error updating parent sequence: {str(e)}")
-                    return render(
-                        request,
-                        "costcenter/fundcenter-form.html",
-                        {"form": form, "url_name": "fundcenter-table", "title": "Fund Center Update"},
-                    )
+            new_parent = obj.fundcenter_parent
+            obj.fundcenter_parent = current.fundcenter_parent
+            obj.sequence = current.sequence
 
             try:
-                obj.save()
+                with transaction.atomic():
+                    obj.save()
+                    if new_parent != current.fundcenter_parent:
+                        FinancialStructureManager().move_subtree(obj, new_parent)
                 messages.success(request, f"Fund center {obj.fundcenter} updated successfully")
                 return redirect("fundcenter-table")
-            except IntegrityError:
-                messages.error(request, "A fund center with this code already exists")
+            except IntegrityError as err:
+                messages.error(request, f"Fund center {obj.fundcenter} not updated: {err}")
         else:
             messages.error(request, "Please correct the errors below")
     else:
@@ -64,6 +64,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "bft.middleware.ReferenceDataMiddleware",
+    "bft.middleware.BftStatusMiddleware",
     "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
 
@@ -80,6 +82,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "bft.context_processors.bft_status",
             ],
         },
     },
@@ -221,3 +224,4 @@ LOGIN_URL = "/bft/login/"
 AUTH_USER_MODEL = "bft.BftUser"
 UPLOADS = BASE_DIR / "uploads/"
 UPLOAD_LOG = LOG_DIR / "upload.log"
+PERIOD_HISTORY_DIR = BASE_DIR / "drmis_data/history"
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from bft.models import DataVersion
 from reports.models import (CostCenterInYearEncumbrance,
                             CostCenterMonthlyAllocation,
                             CostCenterMonthlyEncumbrance,
@@ -51,6 +52,14 @@ class CostCenterMonthlyEncumbranceAdmin(admin.ModelAdmin):
         "working_plan",
     )
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        DataVersion.objects.bump()  # The period history reads the table again
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        DataVersion.objects.bump()
+
 
 class CostCenterInYearEncumbranceAdmin(admin.ModelAdmin):
     list_display = (
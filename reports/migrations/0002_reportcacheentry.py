@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportCacheEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=255, unique=True, verbose_name="Key")),
+                ("version", models.PositiveBigIntegerField(verbose_name="Data Version")),
+                ("content", models.TextField(null=True, verbose_name="Content")),
+                ("used", models.DateTimeField(db_index=True, verbose_name="Last Used")),
+            ],
+            options={
+                "verbose_name_plural": "Report Cache Entries",
+            },
+        ),
+    ]
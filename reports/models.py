@@ -111,3 +111,18 @@ class CostCenterInYearEncumbrance(MonthlyData):
 
     class Meta(MonthlyData.Meta):
         verbose_name_plural = "Cost Center In Year Encumbrance"
+
+
+class ReportCacheEntry(models.Model):
+    """A report rendered by reports.reportcache.ReportCache, kept for the version of the data it was built from."""
+
+    key = models.CharField("Key", max_length=255, unique=True)
+    version = models.PositiveBigIntegerField("Data Version")
+    content = models.TextField("Content", null=True)
+    used = models.DateTimeField("Last Used", db_index=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+    class Meta:
+        verbose_name_plural = "Report Cache Entries"
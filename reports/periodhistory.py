@@ -0,0 +1,281 @@
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count, Max
+
+from bft.models import DataVersion
+from reports.models import CostCenterMonthlyEncumbrance
+
+logger = logging.getLogger("django")
+
+
+class PeriodHistory:
+    """
+    Columnar history of the monthly encumbrance of a fiscal year, kept as NumPy arrays in one file per FY under
+    settings.PERIOD_HISTORY_DIR.
+
+    Every cost center and fund pair holds one vector per measure across periods 1 to 14, so that trends and
+    year-over-year comparisons are array slices instead of scans of CostCenterMonthlyEncumbrance.  The history
+    is updated one period at a time, each time the period is snapshotted, and rebuilt from the table when its
+    file does not exist.
+
+    Loaded histories are kept in memory by each process, with the DataVersion they were loaded at, so that a read
+    costs one primary key lookup while the data does not change.  update() bumps DataVersion once the file is
+    saved, and so does saving a row in place (see reports.signals) or deleting rows from the admin.
+
+    When DataVersion changed, the file is loaded again.  Each of its periods carries the number of rows and the
+    highest id it was read from, which are compared with the table in one query; the periods that differ are
+    read again.  This catches rows inserted or deleted by populate or another process, and a period lost to two
+    processes saving the file at once.  The file is replaced in one rename.
+
+    Arrays of the file:
+
+    - costcenters, funds: the pairs, one row each.
+    - values: amounts, shaped (pairs, periods, measures).
+    - present: True where the pair has a row in the period, shaped (pairs, periods).
+    - periods: True for the periods that were snapshotted.
+    - stamps: number of rows and highest id of each period, shaped (periods, 2).
+
+    Usage:
+        PeriodHistory(2023).update(5)
+        PeriodHistory(2023).dataframe(costcenter="8484WA", fund="C113")
+        PeriodHistory.year_over_year([2022, 2023], "8484WA")
+
+    Args:
+        fy (int | str): Fiscal year of the history.
+        directory (str | Path, optional): Where the files are saved. Defaults to settings.PERIOD_HISTORY_DIR.
+    """
+
+    MEASURES = ("spent", "commitment", "pre_commitment", "fund_reservation", "balance", "working_plan")
+    PERIODS = 14
+    ARRAYS = ("costcenters", "funds", "values", "present", "periods", "stamps")
+
+    _lock = threading.RLock()
+    #: Loaded arrays of each file, as {path: (data version, arrays)}.
+    _loaded = {}
+
+    def __init__(self, fy, directory=None):
+        self.fy = str(fy)
+        self.directory = Path(directory or settings.PERIOD_HISTORY_DIR)
+        self._clear()
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"encumbrance-{self.fy}.npz"
+
+    def _clear(self):
+        self.costcenters = np.array([], dtype="<U6")
+        self.funds = np.array([], dtype="<U4")
+        self.values = np.zeros((0, self.PERIODS, len(self.MEASURES)))
+        self.present = np.zeros((0, self.PERIODS), dtype=bool)
+        self.periods = np.zeros(self.PERIODS, dtype=bool)
+        self.stamps = np.zeros((self.PERIODS, 2), dtype=np.int64)
+
+    def load(self) -> bool:
+        """Read the history from its file.
+
+        Returns:
+            bool: False when the file does not exist or predates stamps, the history is then empty.
+        """
+        self._clear()
+        try:
+            with np.load(self.path) as data:
+                self.costcenters = data["costcenters"]
+                self.funds = data["funds"]
+                self.values = data["values"]
+                self.present = data["present"]
+                self.periods = data["periods"]
+                self.stamps = data["stamps"]
+        except (FileNotFoundError, KeyError):
+            self._clear()
+            return False
+        return True
+
+    def _arrays(self) -> dict:
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def save(self):
+        """Write the history to a temporary file that then replaces its file, so readers never see half of it."""
+        PeriodHistory._loaded.pop(str(self.path), None)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(prefix=f"encumbrance-{self.fy}-", suffix=".npz", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **self._arrays())
+            os.replace(tmpname, self.path)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+
+    def _rows(self, **lookups) -> tuple[list[tuple[str, str]], np.ndarray, np.ndarray]:
+        """Pairs, periods and amounts of the CostCenterMonthlyEncumbrance rows of the FY, read with one query.
+        The stamps of the periods read are set from the same rows."""
+        rows = CostCenterMonthlyEncumbrance.objects.filter(fy=self.fy, **lookups).values_list(
+            "id", "costcenter", "fund", "period", *self.MEASURES
+        )
+        keys, periods, amounts, ids = [], [], [], []
+        for pk, costcenter, fund, period, *values in rows:
+            ids.append(pk)
+            keys.append((costcenter, fund))
+            periods.append(int(period))
+            amounts.append([float(v or 0) for v in values])
+        amounts = np.array(amounts, dtype=float).reshape(len(keys), len(self.MEASURES))
+        periods = np.array(periods, dtype=np.int64)
+        ids = np.array(ids, dtype=np.int64)
+        for period in np.unique(periods):
+            self.stamps[period - 1] = (np.count_nonzero(periods == period), ids[periods == period].max())
+        return keys, periods, amounts
+
+    def _table_stamps(self) -> np.ndarray:
+        """Number of rows and highest id of each period of the FY in CostCenterMonthlyEncumbrance."""
+        stamps = np.zeros((self.PERIODS, 2), dtype=np.int64)
+        rows = (
+            CostCenterMonthlyEncumbrance.objects.filter(fy=self.fy)
+            .order_by()
+            .values("period")
+            .annotate(rows=Count("id"), last=Max("id"))
+            .values_list("period", "rows", "last")
+        )
+        for period, count, last in rows:
+            stamps[int(period) - 1] = (count, last)
+        return stamps
+
+    def _replace(self, periods):
+        """Replace the given periods of the history with the CostCenterMonthlyEncumbrance rows of the FY."""
+        indexes = [p - 1 for p in periods]
+        self.values[:, indexes] = 0
+        self.present[:, indexes] = False
+        self.stamps[indexes] = 0
+        keys, periods, amounts = self._rows(period__in=[str(p) for p in periods])
+        self._fill(keys, periods, amounts)
+        self.periods[np.unique(periods) - 1] = True
+        return keys
+
+    def _fill(self, keys, periods, amounts):
+        """Store rows in the arrays, adding the pairs not seen yet."""
+        index = {key: i for i, key in enumerate(zip(self.costcenters.tolist(), self.funds.tolist()))}
+        new = list(dict.fromkeys(key for key in keys if key not in index))
+        if new:
+            index.update({key: len(index) + i for i, key in enumerate(new)})
+            self.costcenters = np.concatenate([self.costcenters, [k[0] for k in new]])
+            self.funds = np.concatenate([self.funds, [k[1] for k in new]])
+            self.values = np.concatenate([self.values, np.zeros((len(new),) + self.values.shape[1:])])
+            self.present = np.concatenate([self.present, np.zeros((len(new), self.PERIODS), dtype=bool)])
+        rows = np.array([index[key] for key in keys], dtype=np.int64)
+        self.values[rows, periods - 1] = amounts
+        self.present[rows, periods - 1] = True
+
+    def rebuild(self) -> int:
+        """Build the history of the FY from every CostCenterMonthlyEncumbrance row and save it.
+
+        Returns:
+            int: Number of rows read.
+        """
+        with self._lock:
+            self._clear()
+            keys, periods, amounts = self._rows()
+            self._fill(keys, periods, amounts)
+            self.periods[np.unique(periods) - 1] = True
+            self.save()
+        logger.info(f"Period history of FY {self.fy} rebuilt from {len(keys)} rows.")
+        return len(keys)
+
+    def update(self, period) -> int:
+        """Replace one period of the history with the CostCenterMonthlyEncumbrance rows of the FY and period.
+        The whole history is rebuilt when its file does not exist yet.  DataVersion is then bumped, so that other
+        processes load the file again.
+
+        Args:
+            period (int | str): Period that was snapshotted.
+
+        Returns:
+            int: Number of rows read.
+        """
+        period = int(period)
+        if not 1 <= period <= self.PERIODS:
+            raise ValueError(f"{period} is not a valid period.")
+        with self._lock:
+            if not self.load():
+                count = self.rebuild()
+            else:
+                keys = self._replace([period])
+                self.periods[period - 1] = True
+                self.save()
+                count = len(keys)
+                logger.info(f"Period history of FY {self.fy} period {period} updated with {count} rows.")
+        DataVersion.objects.bump()
+        return count
+
+    def _ensure_loaded(self):
+        """Use the arrays kept in memory while DataVersion has not changed.  Otherwise load the history, rebuilt
+        when its file does not exist, and read again the periods whose stamp does not match the table."""
+        version = DataVersion.objects.current()  # Read first, a change made while loading outdates the arrays
+        with self._lock:
+            loaded = PeriodHistory._loaded.get(str(self.path))
+            if loaded and loaded[0] == version:
+                self.__dict__.update(loaded[1])
+                return
+            if not self.load():
+                self.rebuild()
+            else:
+                stale = np.nonzero((self._table_stamps() != self.stamps).any(axis=1))[0] + 1
+                if len(stale):
+                    self._replace(stale.tolist())
+                    self.save()
+                    logger.info(f"Period history of FY {self.fy} periods {stale.tolist()} read again, they changed.")
+            PeriodHistory._loaded[str(self.path)] = (version, self._arrays())
+
+    def _mask(self, costcenter: str = None, fund: str = None) -> np.ndarray:
+        mask = np.ones(len(self.costcenters), dtype=bool)
+        if costcenter:
+            mask &= self.costcenters == costcenter.upper()
+        if fund:
+            mask &= self.funds == fund.upper()
+        return mask
+
+    def series(self, costcenter: str = None, fund: str = None, measure: str = "spent") -> np.ndarray:
+        """Total of one measure across periods 1 to 14, for all pairs matching the cost center and fund.
+
+        Returns:
+            np.ndarray: 14 amounts, NaN for the periods not snapshotted.
+        """
+        self._ensure_loaded()
+        totals = self.values[self._mask(costcenter, fund), :, self.MEASURES.index(measure)].sum(axis=0)
+        return np.where(self.periods, totals, np.nan)
+
+    def dataframe(self, costcenter: str = None, fund: str = None) -> pd.DataFrame:
+        """One row per cost center, fund and period found in CostCenterMonthlyEncumbrance, sorted by period.
+
+        Returns:
+            pd.DataFrame: Columns Cost Center, Fund, FY, Period and the measures, named after their verbose
+            name.  Period is an integer.
+        """
+        self._ensure_loaded()
+        rows, periods = np.nonzero(self.present & self._mask(costcenter, fund)[:, None])
+        if not len(rows):
+            return pd.DataFrame()
+        names = [CostCenterMonthlyEncumbrance._meta.get_field(m).verbose_name for m in self.MEASURES]
+        df = pd.DataFrame(self.values[rows, periods], columns=names)
+        df.insert(0, "Cost Center", self.costcenters[rows])
+        df.insert(1, "Fund", self.funds[rows])
+        df.insert(2, "FY", self.fy)
+        df.insert(3, "Period", periods + 1)
+        return df.sort_values(["Period", "Cost Center", "Fund"], ignore_index=True)
+
+    @classmethod
+    def year_over_year(
+        cls, years, costcenter: str = None, fund: str = None, measure: str = "spent", directory=None
+    ) -> pd.DataFrame:
+        """Compare one measure across fiscal years.
+
+        Returns:
+            pd.DataFrame: Periods 1 to 14 as index, one column per FY, NaN for the periods not snapshotted.
+        """
+        data = {str(fy): cls(fy, directory).series(costcenter, fund, measure) for fy in years}
+        return pd.DataFrame(data, index=pd.RangeIndex(1, cls.PERIODS + 1, name="Period"))
@@ -0,0 +1,124 @@
+import logging
+import time
+
+from django.db import models
+from django.db.models import Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from bft.exceptions import LineItemsDoNotExistError
+from bft.models import DataVersion, FundCenterManager, FundManager
+from reports import screeningreport, utils
+from reports.models import ReportCacheEntry
+
+logger = logging.getLogger("django")
+
+
+class ReportCache:
+    """
+    Rendered reports kept in ReportCacheEntry, keyed by report name and parameters, and valid for the version of
+    the data they were built from.
+
+    The version comes from DataVersion, which changes with every upload, allocation or forecast edit and change
+    to the financial structure, whichever process made it.  A cached report is therefore shared by every web
+    process and by the warmreports command.  The cache holds at most MAX_ENTRIES reports; the least recently
+    used ones are dropped first, along with the reports of outdated versions.
+
+    Usage:
+        html = ReportCache.get_or_build("screening", build, fundcenter="2184DA", fund="C113", fy=2023, quarter=1)
+    """
+
+    #: Number of reports kept.
+    MAX_ENTRIES = 500
+    #: Seconds during which a hit does not record the use of the report again, to spare a write per hit.
+    TOUCH_AFTER = 60
+
+    @staticmethod
+    def key(report: str, **params) -> str:
+        """Key of a report, such as screening?fund=C113&fundcenter=2184DA&fy=2023&quarter=1."""
+        values = "&".join(f"{name}={str(value or '').upper()}" for name, value in sorted(params.items()))
+        return f"{report}?{values}"
+
+    @classmethod
+    def get(cls, key: str) -> tuple[bool, str | None]:
+        """Look up a report of the current version with one query.
+
+        Returns:
+            tuple[bool, str | None]: Whether the report was found, and its content.
+        """
+        version = Coalesce(
+            Subquery(DataVersion.objects.values("version")[:1]),
+            Value(0),
+            output_field=models.PositiveBigIntegerField(),
+        )
+        entry = ReportCacheEntry.objects.filter(key=key, version=version).values("pk", "content", "used").first()
+        if entry is None:
+            return False, None
+        now = timezone.now()
+        if (now - entry["used"]).total_seconds() > cls.TOUCH_AFTER:
+            ReportCacheEntry.objects.filter(pk=entry["pk"]).update(used=now)
+        return True, entry["content"]
+
+    @classmethod
+    def put(cls, key: str, version: int, content: str | None) -> None:
+        """Save a report built from the given version of the data, then drop outdated and least recently used
+        reports."""
+        ReportCacheEntry.objects.update_or_create(
+            key=key, defaults={"version": version, "content": content, "used": timezone.now()}
+        )
+        ReportCacheEntry.objects.filter(version__lt=version).delete()
+        unused = ReportCacheEntry.objects.order_by("-used", "-pk").values_list("pk", flat=True)[cls.MAX_ENTRIES :]
+        ReportCacheEntry.objects.filter(pk__in=list(unused)).delete()
+
+    @classmethod
+    def get_or_build(cls, report: str, build, **params) -> str | None:
+        """Cached report for the parameters, built and cached when missing or outdated.
+
+        Args:
+            report (str): Name of the report.
+            build (callable): Builds the report when it is not cached.  Takes no argument.
+            **params: Parameters of the report, part of the key.
+        """
+        key = cls.key(report, **params)
+        hit, content = cls.get(key)
+        if hit:
+            return content
+        version = DataVersion.objects.current()  # Read first, a change made while building outdates the report
+        start = time.perf_counter()
+        content = build()
+        cls.put(key, version, content)
+        logger.info(f"Report {key} built for data version {version} in {time.perf_counter() - start:.3f}s")
+        return content
+
+    @classmethod
+    def clear(cls) -> int:
+        """Drop every cached report."""
+        deleted, _ = ReportCacheEntry.objects.all().delete()
+        return deleted
+
+
+def screening_report(fundcenter: str, fund: str, fy, quarter) -> str | None:
+    """HTML table of the BMT screening report, None when there are no line items to report."""
+
+    def build():
+        sr = screeningreport.ScreeningReport(
+            FundCenterManager().fundcenter(fundcenter), FundManager().fund(fund), fy, quarter
+        )
+        try:
+            sr.main()
+        except LineItemsDoNotExistError:
+            return None
+        return sr.html()
+
+    return ReportCache.get_or_build("screening", build, fundcenter=fundcenter, fund=fund, fy=fy, quarter=quarter)
+
+
+def allocation_status_report(fundcenter: str, fund: str, fy, quarter) -> str | None:
+    """HTML table of the allocation status report."""
+
+    def build():
+        return utils.AllocationStatusReport().main(fundcenter, fund, fy, quarter)
+
+    return ReportCache.get_or_build(
+        "allocation-status", build, fundcenter=fundcenter, fund=fund, fy=fy, quarter=quarter
+    )
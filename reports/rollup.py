@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from bft.models import FinancialStructureTree
+
+
+def parent_sequence(sequence: str) -> str | None:
+    """Sequence number of the parent of a fund center or a cost center, None for a root.
+
+    Args:
+        sequence (str): A fund center sequence such as 1.2.3 or a cost center sequence such as 1.2.3.0.4
+
+    Returns:
+        str | None: The parent sequence, 1.2 and 1.2.3 for the examples above.
+    """
+    parent, marker, _ = sequence.rpartition(".0.")
+    if marker:
+        return parent
+    parent, _, _ = sequence.rpartition(".")
+    return parent or None
+
+
+class HierarchyRollup:
+    """
+    Aggregates measures of the financial structure bottom-up, so that every node holds the total of its own
+    values and the values of all its descendants.
+
+    Nodes are numbered once and each one knows the index of its parent.  Totals are then pushed one level at a
+    time, deepest level first, with numpy.add.at, which makes a rollup linear in the number of nodes.
+
+    Args:
+        sequences (iterable, optional): Sequence numbers of the nodes.  Defaults to the whole structure as found
+            in FinancialStructureTree.  Sequences found in the data to roll up are added to these.
+    """
+
+    def __init__(self, sequences=None):
+        if sequences is None:
+            sequences = FinancialStructureTree.get().sequences.keys()
+        self._sequences = set(sequences)
+
+    def _nodes(self, sequences) -> tuple[list[str], np.ndarray, np.ndarray]:
+        nodes = set(self._sequences).union(sequences)
+        for sequence in list(nodes):  # make sure every ancestor is a node
+            parent = parent_sequence(sequence)
+            while parent and parent not in nodes:
+                nodes.add(parent)
+                parent = parent_sequence(parent)
+        nodes = sorted(nodes)
+        index = {sequence: i for i, sequence in enumerate(nodes)}
+        parents = np.array([index.get(parent_sequence(s), -1) for s in nodes], dtype=np.int64)
+        depths = np.array([s.count(".") - s.count(".0.") for s in nodes], dtype=np.int64)
+        return nodes, parents, depths
+
+    def totals(
+        self, data: pd.DataFrame, measures: list[str], by: list[str] = None, sequence: str = "sequence"
+    ) -> pd.DataFrame:
+        """Roll up measures of data over the hierarchy.
+
+        Args:
+            data (pd.DataFrame): One or more rows per node, with a sequence column, the measure columns and the
+                by columns.  Rows of the same node and by values are added up.
+            measures (list[str]): Numeric columns to roll up.  Missing values count as 0.
+            by (list[str], optional): Columns that split the rollup, such as fund.  Defaults to None.
+            sequence (str, optional): Name of the sequence column. Defaults to "sequence".
+
+        Returns:
+            pd.DataFrame: Totals of every node whose subtree has data, indexed by sequence and the by columns.
+        """
+        by = list(by or [])
+        index_names = [sequence] + by
+        if data.empty:
+            return pd.DataFrame(columns=index_names + list(measures)).set_index(index_names)
+        nodes, parents, depths = self._nodes(data[sequence].unique())
+
+        values = data[index_names + list(measures)].copy()
+        values[measures] = values[measures].apply(pd.to_numeric, errors="coerce").fillna(0)
+        values["_rows"] = 1
+        if by:
+            wide = values.groupby(index_names)[list(measures) + ["_rows"]].sum().unstack(by, fill_value=0)
+        else:
+            wide = values.groupby(sequence)[list(measures) + ["_rows"]].sum()
+        wide = wide.reindex(nodes, fill_value=0)
+
+        matrix = wide.to_numpy(dtype=float, copy=True)
+        for depth in range(depths.max(), 0, -1):
+            children = np.flatnonzero((depths == depth) & (parents >= 0))
+            np.add.at(matrix, parents[children], matrix[children])
+
+        rolled = pd.DataFrame(matrix, index=wide.index, columns=wide.columns)
+        rolled.index.name = sequence
+        if by:
+            rolled = rolled.stack(by, future_stack=True)
+        rolled = rolled[rolled["_rows"] > 0].drop(columns="_rows")
+        return rolled.reorder_levels(index_names).sort_index() if by else rolled
@@ -3,8 +3,10 @@ from django.db.models import IntegerField, Q, Sum
 from django.db.models.functions import Cast
 
 from bft.exceptions import LineItemsDoNotExistError
-from bft.models import (CostCenter, CostCenterAllocation, ForecastAdjustment,
-                        Fund, FundCenter, FundCenterAllocation, LineItem)
+from bft.models import (CostCenterAllocation, FinancialStructureManager,
+                        ForecastAdjustment, Fund, FundCenter,
+                        FundCenterAllocation, LineItem)
+from reports.rollup import HierarchyRollup
 
 
 def caster(value):
@@ -18,7 +20,7 @@ class ScreeningReport:
         self.fy = fy
         self.quarter = quarter
 
-        self.cc_children = CostCenter.objects.filter(sequence__startswith=self.top_fc.sequence)
+        self.cc_children = FinancialStructureManager().CostCenters(self.top_fc)
         self.report_lines = None
         self.cc_allocations = None
         self.fc_allocations = None
@@ -63,7 +65,7 @@ class ScreeningReport:
             "costcenter__costcenter_parent__fundcenter",
             "fund__fund",
         ]
-        costcenters = CostCenter.objects.filter(sequence__startswith=self.top_fc.sequence)
+        costcenters = self.cc_children
         allocations = CostCenterAllocation.objects.filter(
             costcenter__in=costcenters, fy=self.fy, quarter=self.quarter, fund=self.fund
         ).values(*allocation_fields)
@@ -91,7 +93,7 @@ class ScreeningReport:
             "amount",
             "fund__fund",
         ]
-        fundcenters = FundCenter.objects.filter(sequence__startswith=self.top_fc.sequence)
+        fundcenters = FinancialStructureManager().get_fundcenter_descendants(self.top_fc)
         allocations = FundCenterAllocation.objects.filter(
             fundcenter__in=fundcenters, fy=self.fy, quarter=self.quarter, fund=self.fund
         ).values(*allocation_fields)
@@ -107,7 +109,7 @@ class ScreeningReport:
         return df
 
     def get_forecast_adjustments(self) -> pd.DataFrame:
-        costcenters = CostCenter.objects.filter(sequence__startswith=self.top_fc.sequence)
+        costcenters = self.cc_children
         fcst_fields = [
             "costcenter__sequence",
             "costcenter__costcenter",
@@ -138,22 +140,24 @@ class ScreeningReport:
         grouping = df.groupby("fund").sum()
         return grouping
 
+    #: Columns of the report replaced by the total of the row and of all its descendants of the same fund.
+    SUBTOTAL_MEASURES = ["Spent", "Balance", "Working_plan", "CO", "PC", "FR", "Forecast", "fcst adj", "Allocation"]
+
     def report_subtotals(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replace the measures of every fund center and cost center row by the total of its subtree, fund by fund.
+        Allocation is left as is and the allocation of the descendants goes to Allocation_calc.
+
+        Totals are computed in one bottom-up pass over the sequence tree by HierarchyRollup, then written back to
+        every row at once.
+        """
         report = df.reset_index()
-        sequences = report["sequence"].items()
-        for i, s in sequences:
-            descendants = report[
-                (report["sequence"].str.startswith(s)) & (report["fund"] == report["fund"][i])
-            ]
-            report.at[i, "Spent"] = descendants["Spent"].sum()
-            report.at[i, "Balance"] = descendants["Balance"].sum()
-            report.at[i, "Working_plan"] = descendants["Working_plan"].sum()
-            report.at[i, "CO"] = descendants["CO"].sum()
-            report.at[i, "PC"] = descendants["PC"].sum()
-            report.at[i, "FR"] = descendants["FR"].sum()
-            report.at[i, "Forecast"] = descendants["Forecast"].sum()
-            report.at[i, "fcst adj"] = descendants["fcst adj"].sum()
-            report.at[i, "Allocation_calc"] = descendants["Allocation"].sum() - report.at[i, "Allocation"]
+        measures = [m for m in self.SUBTOTAL_MEASURES if m in report.columns]
+        totals = HierarchyRollup(report["sequence"]).totals(report, measures, by=["fund"])
+        rows = pd.MultiIndex.from_frame(report[["sequence", "fund"]])
+        subtotals = totals.reindex(rows).fillna(0).set_axis(report.index)
+        allocation = subtotals.pop("Allocation") if "Allocation" in measures else 0
+        report[subtotals.columns] = subtotals
+        report["Allocation_calc"] = allocation - pd.to_numeric(report["Allocation"])
         report = report.set_index(["sequence", "fundcenter", "costcenter", "fund"]).sort_index()
         return report
 
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from reports.models import CostCenterMonthlyEncumbrance
+from reports.periodhistory import PeriodHistory
+
+
+@receiver(post_save, sender=CostCenterMonthlyEncumbrance)
+def update_period_history(sender, instance, **kwargs):
+    """An amount changed in place, by the admin for instance, leaves the stamps of its period as they were, the
+    period is updated, which bumps DataVersion, once the change is committed."""
+    transaction.on_commit(lambda: PeriodHistory(instance.fy).update(instance.period), robust=True)
@@ -1,5 +1,6 @@
 import pytest
 
+from bft.conftest import bft_status, financial_structure_tree, period_history_dir  # noqa: F401
 from bft.management.commands import populate, uploadcsv
 
 
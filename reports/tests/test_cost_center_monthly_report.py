@@ -1,6 +1,9 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from reports.utils import CostCenterMonthlyEncumbranceReport
+from reports.models import CostCenterInYearEncumbrance, CostCenterMonthlyEncumbrance
+from reports.utils import CostCenterInYearEncumbranceReport, CostCenterMonthlyEncumbranceReport
 
 
 @pytest.mark.django_db
@@ -37,6 +40,27 @@ class TestCostCenterMonthlyReport:
         inserted = cm.insert_line_items(lines)
         assert 2 == inserted
 
+    def test_insert_line_items_with_insert_select(self, populatedata, upload):
+        cm = CostCenterMonthlyEncumbranceReport(2023, 1, "8484WA", "C113")
+        cm.insert_line_items(cm.sum_line_items())
+        fields = ["costcenter", "fund", "fy", "period", "spent", "balance", "working_plan", "commitment"]
+        expected = sorted(CostCenterMonthlyEncumbrance.objects.values_list(*fields))
+
+        assert 2 == cm.insert_line_items(cm.sum_line_items(), insert_select=True)
+        assert expected == sorted(CostCenterMonthlyEncumbrance.objects.values_list(*fields))
+
+        inyear = CostCenterInYearEncumbranceReport(2023)
+        assert 2 == inyear.insert_line_items(inyear.sum_line_items(), insert_select=True)
+        assert {""} == set(CostCenterInYearEncumbrance.objects.values_list("period", flat=True))
+
+    def test_insert_line_items_evaluates_aggregation_once(self, populatedata, upload):
+        cm = CostCenterMonthlyEncumbranceReport(2023, 1, "8484WA", "C113")
+        with CaptureQueriesContext(connection) as context:
+            assert 2 == cm.insert_line_items(cm.sum_line_items(), batch_size=1)
+        sqls = [q["sql"] for q in context.captured_queries]
+        assert 1 == len([sql for sql in sqls if "SUM(" in sql])
+        assert 2 == len([sql for sql in sqls if sql.startswith("INSERT")])
+
     def test_insert_line_items_when_none(self, populatedata):
         cm = CostCenterMonthlyEncumbranceReport(2023, 1, "8484WA", "C113")
         lines = []
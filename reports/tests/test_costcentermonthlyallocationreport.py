@@ -25,24 +25,26 @@ class TestCostCenterMonthlyAllocationReport:
         assert 120000.99 == float(alloc_sum["amount__sum"])
 
     def test_costcenter_monthly_allocation_on_insert_allocation(self, populatedata, setup):
-        """After populate, 8484WA C113 has allocation of 10.  Insert 1000 allocation."""
+        """After populate, 8484WA C113 has allocation of 100000.  Insert 1000 allocation in another fiscal year,
+        it must not be part of the snapshot of the current fiscal year."""
         new_alloc = CostCenterAllocation()
         new_alloc.amount = 1000
         new_alloc.fund = self.fund
         new_alloc.costcenter = self.costcenter
         new_alloc.quarter = 1
+        new_alloc.fy = int(self.fy) + 1
         new_alloc.save()
 
         CCMAR = CostCenterMonthlyAllocationReport(fy=self.fy, period=self.period, quarter=self.quarter)
 
         grouped_sum = CCMAR.sum_allocation_cost_center()
-        assert 101000 == float(grouped_sum[0]["allocation"])
+        assert 100000 == float(grouped_sum[0]["allocation"])
 
         affected_count = CCMAR.insert_grouped_allocation(grouped_sum)
         assert 2 == affected_count
 
         cc_alloc = CostCenterMonthlyAllocation.objects.filter(costcenter=self.cc_str).aggregate(Sum("allocation"))
-        assert 101000 == float(cc_alloc["allocation__sum"])
+        assert 100000 == float(cc_alloc["allocation__sum"])
 
     def test_costcenter_monthly_allocation_on_update_allocation(self, populatedata, setup):
         """After populate, 8484WA C113 has allocation of 10000.  Let's update to 2000."""
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+from django.contrib import admin
+
+from bft.models import DataVersion
+from reports.models import CostCenterMonthlyEncumbrance
+from reports.periodhistory import PeriodHistory
+from reports.utils import CostCenterInYearEncumbranceReport, CostCenterMonthlyEncumbranceReport
+
+
+def encumbrance(period, spent, costcenter="8484WA", fund="C113", fy="2023"):
+    return CostCenterMonthlyEncumbrance.objects.create(
+        costcenter=costcenter, fund=fund, fy=fy, period=str(period), spent=spent, balance=spent * 2
+    )
+
+
+@pytest.mark.django_db
+class TestPeriodHistory:
+    def test_rebuild_when_file_missing(self):
+        encumbrance(1, 10)
+        encumbrance(2, 20)
+        encumbrance(2, 5, costcenter="8484XA")
+        history = PeriodHistory(2023)
+        assert not history.path.exists()
+
+        series = history.series("8484WA", "C113")
+
+        assert history.path.exists()
+        assert [10, 20] == list(series[:2])
+        assert np.isnan(series[2:]).all()
+        assert [10, 25] == list(history.series()[:2])
+        assert [20, 50] == list(history.series(measure="balance")[:2])
+
+    def test_update_replaces_one_period(self, django_assert_num_queries):
+        encumbrance(1, 10)
+        PeriodHistory(2023).rebuild()
+        encumbrance(2, 20, fund="L101")
+        DataVersion.objects.bump()
+
+        with django_assert_num_queries(2):  # The rows of the period, the data version bump
+            assert 1 == PeriodHistory(2023).update(2)
+        with django_assert_num_queries(2):  # The data version, the stamps of the periods
+            df = PeriodHistory(2023).dataframe()
+
+        assert [1, 2] == list(df.Period)
+        assert ["C113", "L101"] == list(df.Fund)
+        assert [10, 20] == list(df.Spent)
+
+    def test_update_empties_period(self):
+        encumbrance(1, 10)
+        encumbrance(2, 20)
+        PeriodHistory(2023).rebuild()
+        CostCenterMonthlyEncumbrance.objects.filter(period="2").delete()
+
+        assert 0 == PeriodHistory(2023).update(2)
+
+        history = PeriodHistory(2023)
+        assert [1] == list(history.dataframe().Period)
+        assert 0 == history.series()[1]
+
+    def test_read_again_periods_changed_since_saved(self, django_assert_num_queries):
+        encumbrance(1, 10)
+        encumbrance(2, 20)
+        PeriodHistory(2023).rebuild()
+        CostCenterMonthlyEncumbrance.objects.filter(period="2").delete()  # As populate or another process would
+        encumbrance(2, 5, costcenter="8484XA")
+        encumbrance(3, 30)
+
+        with django_assert_num_queries(3):  # The data version, the stamps, the rows of the changed periods
+            series = PeriodHistory(2023).series()
+
+        assert [10, 5, 30] == list(series[:3])
+        history = PeriodHistory(2023)
+        history.load()
+        assert (history._table_stamps() == history.stamps).all()
+
+    def test_arrays_kept_until_data_version_changes(self, django_assert_num_queries, monkeypatch):
+        encumbrance(1, 10)
+        assert 10 == PeriodHistory(2023).series()[0]
+        row = CostCenterMonthlyEncumbrance.objects.get()
+        CostCenterMonthlyEncumbrance.objects.filter(pk=row.pk).update(spent=15)  # In place, by another process
+
+        def fail(*args, **kwargs):
+            raise AssertionError("The file must not be read")
+
+        with monkeypatch.context() as m:
+            m.setattr(np, "load", fail)
+            with django_assert_num_queries(2):  # The data version of each read
+                assert 10 == PeriodHistory(2023).series()[0]
+                assert 1 == len(PeriodHistory(2023).dataframe())
+
+        PeriodHistory(2023).update(1)  # What the signal of the other process does once committed
+        assert 15 == PeriodHistory(2023).series()[0]
+
+    def test_admin_delete_bumps_data_version(self):
+        row = encumbrance(1, 10)
+        encumbrance(2, 20)
+        assert 10 == PeriodHistory(2023).series()[0]
+
+        admin.site._registry[CostCenterMonthlyEncumbrance].delete_model(None, row)
+
+        assert 0 == PeriodHistory(2023).series()[0]
+        assert 20 == PeriodHistory(2023).series()[1]
+
+    def test_rebuild_file_without_stamps(self):
+        encumbrance(1, 10)
+        history = PeriodHistory(2023)
+        history.rebuild()
+        with np.load(history.path) as data:
+            arrays = {name: data[name] for name in data.files if name != "stamps"}
+        np.savez(history.path, **arrays)
+
+        assert not PeriodHistory(2023).load()
+        assert 10 == PeriodHistory(2023).series()[0]
+
+    def test_save_updates_history(self, django_capture_on_commit_callbacks):
+        row = encumbrance(1, 10)
+        PeriodHistory(2023).rebuild()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            row.spent = 15
+            row.save()
+
+        history = PeriodHistory(2023)
+        history.load()
+        assert 15 == history.series()[0]
+
+    def test_update_invalid_period(self):
+        with pytest.raises(ValueError):
+            PeriodHistory(2023).update(15)
+
+    def test_year_over_year(self):
+        encumbrance(1, 10, fy="2022")
+        encumbrance(1, 30)
+        encumbrance(3, 40)
+
+        df = PeriodHistory.year_over_year([2022, 2023], "8484WA")
+
+        assert ["2022", "2023"] == list(df.columns)
+        assert 14 == len(df)
+        assert [10, 30] == list(df.loc[1])
+        assert np.isnan(df.at[3, "2022"])
+        assert 40 == df.at[3, "2023"]
+
+    def test_snapshot_updates_history(
+        self, populatedata, upload, django_capture_on_commit_callbacks, django_assert_num_queries
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            cm = CostCenterMonthlyEncumbranceReport(2023, 1, "8484WA", "C113")
+            cm.insert_line_items(cm.sum_line_items())
+
+        with django_assert_num_queries(2):  # The data version and the stamps, the rows come from the history
+            df = CostCenterInYearEncumbranceReport(fy=2023, costcenter="8484wa", fund="c113").dataframe()
+
+        assert 1 == len(df)
+        assert {"Cost Center", "Fund", "FY", "Period", "Spent", "Working Plan"} <= set(df.columns)
+        assert ("8484WA", "C113", 1) == (df.at[0, "Cost Center"], df.at[0, "Fund"], df.at[0, "Period"])
+
+    def test_dataframe_empty(self):
+        assert CostCenterInYearEncumbranceReport(fy=2023, costcenter="8484WA").dataframe().empty
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from bft.models import CostCenterAllocation, CostCenterManager, DataVersion, FundManager
+from reports.models import ReportCacheEntry
+from reports.reportcache import ReportCache, screening_report
+
+
+@pytest.mark.django_db
+class TestReportCache:
+    @pytest.fixture
+    def builds(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return f"report {len(calls)}"
+
+        build.calls = calls
+        return build
+
+    def test_key(self):
+        assert "screening?fund=C113&fundcenter=2184DA&fy=2023&quarter=1" == ReportCache.key(
+            "screening", fundcenter="2184da", fund="c113", fy=2023, quarter="1"
+        )
+
+    def test_hit_does_not_build(self, builds, django_assert_num_queries):
+        assert "report 1" == ReportCache.get_or_build("screening", builds, fund="C113")
+        with django_assert_num_queries(1):
+            assert "report 1" == ReportCache.get_or_build("screening", builds, fund="C113")
+        assert 1 == len(builds.calls)
+
+    def test_parameters_are_part_of_key(self, builds):
+        ReportCache.get_or_build("screening", builds, fund="C113")
+        assert "report 2" == ReportCache.get_or_build("screening", builds, fund="L101")
+
+    def test_bump_outdates_reports(self, builds):
+        ReportCache.get_or_build("screening", builds, fund="C113")
+        DataVersion.objects.bump()
+        assert "report 2" == ReportCache.get_or_build("screening", builds, fund="C113")
+        assert 1 == ReportCacheEntry.objects.count()
+
+    def test_allocation_edit_outdates_reports(self, populatedata, builds):
+        ReportCache.get_or_build("screening", builds, fund="C113")
+        CostCenterAllocation.objects.create(
+            costcenter=CostCenterManager().cost_center("8484WA"),
+            fund=FundManager().fund("C113"),
+            fy=2023,
+            quarter=2,
+            amount=10,
+        )
+        assert "report 2" == ReportCache.get_or_build("screening", builds, fund="C113")
+
+    def test_least_recently_used_evicted(self, builds, monkeypatch):
+        monkeypatch.setattr(ReportCache, "MAX_ENTRIES", 2)
+        ReportCache.get_or_build("screening", builds, fund="A")
+        ReportCache.get_or_build("screening", builds, fund="B")
+        ReportCacheEntry.objects.filter(key__endswith="=B").update(used=timezone.now() - timedelta(hours=1))
+        ReportCacheEntry.objects.filter(key__endswith="=A").update(used=timezone.now() - timedelta(hours=2))
+        ReportCache.get_or_build("screening", builds, fund="A")  # a hit makes A the most recently used
+
+        ReportCache.get_or_build("screening", builds, fund="C")
+
+        assert {"screening?fund=A", "screening?fund=C"} == set(ReportCacheEntry.objects.values_list("key", flat=True))
+
+    def test_screening_report(self, populatedata, upload):
+        table = screening_report("2184DA", "C113", 2023, 1)
+        assert table.startswith("<table id='screeningreport'>")
+        assert table == ReportCacheEntry.objects.get().content
+
+    def test_screening_report_without_line_items(self, populatedata):
+        assert screening_report("2184DA", "C113", 2023, 1) is None
+        assert screening_report("2184DA", "C113", 2023, 1) is None
+        assert 1 == ReportCacheEntry.objects.count()
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from reports.rollup import HierarchyRollup, parent_sequence
+
+
+def test_parent_sequence():
+    assert parent_sequence("1") is None
+    assert "1" == parent_sequence("1.10")
+    assert "1.10" == parent_sequence("1.10.0.2")
+    assert "1.2.3" == parent_sequence("1.2.3.0.10")
+
+
+class TestHierarchyRollup:
+    @pytest.fixture
+    def data(self):
+        return pd.DataFrame(
+            {
+                "sequence": ["1.1.0.1", "1.1.0.2", "1.2.0.1", "1.10.0.1", "1.1", "1.1.0.1"],
+                "fund": ["C113", "C113", "C113", "L101", "C113", "L101"],
+                "Spent": [1, 2, 4, 8, 16, 32],
+                "Balance": [1, 1, 1, 1, 1, None],
+            }
+        )
+
+    def test_totals(self, data):
+        totals = HierarchyRollup([]).totals(data, ["Spent", "Balance"])
+        assert 63 == totals.at["1", "Spent"]
+        assert 51 == totals.at["1.1", "Spent"]
+        assert 8 == totals.at["1.10", "Spent"]
+        assert 5 == totals.at["1", "Balance"]
+        assert 33 == totals.at["1.1.0.1", "Spent"]
+
+    def test_totals_by_fund(self, data):
+        totals = HierarchyRollup(["1.3"]).totals(data, ["Spent"], by=["fund"])
+        assert ["sequence", "fund"] == list(totals.index.names)
+        assert 23 == totals.at[("1", "C113"), "Spent"]
+        assert 40 == totals.at[("1", "L101"), "Spent"]
+        assert ("1.1", "L101") in totals.index
+        assert ("1.2", "L101") not in totals.index
+        assert "1.3" not in totals.index.get_level_values("sequence")
+
+    def test_empty(self):
+        assert HierarchyRollup([]).totals(pd.DataFrame(), ["Spent"]).empty
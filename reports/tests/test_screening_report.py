@@ -1,6 +1,8 @@
 import pandas as pd
 import pytest
 
+from bft.models import FundCenterManager, FundManager
+from reports.screeningreport import ScreeningReport
 from reports.utils import CostCenterScreeningReport
 
 
@@ -24,3 +26,45 @@ class TestCostCenterScreeningReport:
         r = CostCenterScreeningReport()
         data = r.cost_element_line_items("2184a3", "c113")
         assert 1 == len(data)
+
+
+@pytest.mark.django_db
+class TestScreeningReport:
+
+    @pytest.fixture
+    def report(self, populatedata):
+        fundcenter = FundCenterManager().fundcenter("2184DA")
+        return ScreeningReport(fundcenter, FundManager().fund("C113"), 2023, 1)
+
+    def test_report_subtotals(self, report):
+        df = pd.DataFrame(
+            {
+                "sequence": ["1", "1.1", "1.1.0.1", "1.1.0.2", "1.10", "1.10.0.1", "1.1.0.1"],
+                "fundcenter": ["A", "B", "B", "B", "C", "C", "B"],
+                "costcenter": [None, None, "CC1", "CC2", None, "CC3", "CC1"],
+                "fund": ["C113", "C113", "C113", "C113", "C113", "C113", "L101"],
+                "Spent": [None, None, 1, 2, None, 4, 8],
+                "Forecast": [None, None, 10, 20, None, 40, 80],
+                "Allocation": [1000, 100, 30, None, 200, 50, 5],
+            }
+        ).set_index(["sequence", "fundcenter", "costcenter", "fund"])
+
+        subtotals = report.report_subtotals(df).reset_index().set_index(["sequence", "fund"])
+
+        assert 7 == subtotals.at[("1", "C113"), "Spent"]
+        assert 3 == subtotals.at[("1.1", "C113"), "Spent"]  # 1.10 is not a child of 1.1
+        assert 4 == subtotals.at[("1.10", "C113"), "Spent"]
+        assert 8 == subtotals.at[("1.1.0.1", "L101"), "Spent"]
+        assert 70 == subtotals.at[("1", "C113"), "Forecast"]
+        assert 380 == subtotals.at[("1", "C113"), "Allocation_calc"]
+        assert 30 == subtotals.at[("1.1", "C113"), "Allocation_calc"]
+        assert 0 == subtotals.at[("1.1.0.1", "C113"), "Allocation_calc"]
+        assert 1000 == subtotals.at[("1", "C113"), "Allocation"]
+
+    def test_main(self, report, upload):
+        report.main()
+        subtotals = report.report.reset_index().set_index("sequence")
+        costcenters = subtotals[subtotals.costcenter.notna()]
+        top = subtotals.loc[FundCenterManager().fundcenter("2184DA").sequence]
+        assert costcenters.Spent.sum() == top.Spent
+        assert costcenters.Working_plan.sum() == top.Working_plan
@@ -1,9 +1,56 @@
 import pytest
 from django.test import Client
 
+from bft.models import FinancialStructureManager, FinancialStructureTree, FundCenter
+from reports.views import FinancialStructureRows
+
 
 @pytest.mark.django_db
 class TestCostCenterMonthlyPlanViews:
     def test_no_params(self):
         response = Client().get("/reports/costcenter-monthly-plan")
         assert response.status_code == 200
+
+
+@pytest.mark.django_db
+class TestFinancialStructureViews:
+    def test_report(self, populatedata):
+        response = Client().get("/reports/financial-structure/")
+        assert response.status_code == 200
+        rows = list(response.context["data"])
+        assert "0162ND" == rows[0]["Fund Center"]
+        assert ["8484WA", "8484XA", "8484YA"] == [row["Cost Center"] for row in rows if row["Cost Center"]]
+
+    def test_report_from_subtree_root(self, populatedata):
+        response = Client().get("/reports/financial-structure/", {"fundcenter": "2184a3"})
+        rows = list(response.context["data"])
+        assert {"2184A3"} == {row["Fund Center"] for row in rows}
+
+    def test_report_fetches_the_page_only(self, populatedata, django_assert_max_num_queries):
+        root = FundCenter.objects.get(fundcenter="0162ND")
+        FundCenter.objects.bulk_create(
+            [
+                FundCenter(
+                    fundcenter=f"3{i:05}", fundcenter_parent=root, sequence=f"{root.sequence}.{100 + i}", level=2
+                )
+                for i in range(150)
+            ]
+        )
+        FinancialStructureTree.invalidate()  # bulk_create sends no signal
+        everything = list(FinancialStructureManager().financial_structure_rows())
+        rows = FinancialStructureRows()
+        with django_assert_max_num_queries(2):  # One page of fund centers and its cost centers
+            page = rows[100:200]
+
+        assert everything[100:200] == page
+
+        response = Client().get("/reports/financial-structure/", {"page": 2})
+        assert everything[100:] == list(response.context["data"])
+        assert len(everything) == response.context["data"].paginator.count
+
+    def test_csv(self, populatedata):
+        response = Client().get("/reports/financial-structure-csv/", {"fundcenter": "2184DA"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[0].startswith("FC Path,Fund Center,Fund Center Name,Cost Center")
+        assert lines[1].startswith("1.1.1.1,2184DA,DAEME,,")
+        assert 3 == sum("2184A3" in line for line in lines)
@@ -12,6 +12,7 @@ urlpatterns = [
         name="allocation-status-report",
     ),
     path("financial-structure/", views.financial_structure_report, name="financial-structure-report"),
+    path("financial-structure-csv/", views.csv_financial_structure, name="financial-structure-csv"),
     path("lineitems/", views.line_items, name="lineitem-report"),
     path("lineitems-csv/", views.csv_line_items, name="lineitem-csv"),
     path("costcenter-monthly-data/", views.costcenter_monthly_data, name="costcenter-monthly-data"),
@@ -1,19 +1,22 @@
 import logging
+import time
 
 import pandas as pd
-from django.db import IntegrityError
+from django.db import IntegrityError, connection, transaction
 from django.db.models import F, IntegerField, Q, QuerySet, Sum, Value
 from django.db.models.functions import Cast
 
 from bft import conf
-from bft.models import (CostCenter, CostCenterAllocation, CostCenterManager,
-                        ForecastAdjustment, FundCenter, FundCenterAllocation,
-                        FundCenterManager, FundManager, LineForecast, LineItem)
+from bft.models import (CostCenterAllocation, CostCenterManager,
+                        FinancialStructureManager, ForecastAdjustment,
+                        FundCenter, FundCenterAllocation, FundCenterManager,
+                        FundManager, LineForecast, LineItem)
 from reports.models import (CostCenterInYearEncumbrance,
                             CostCenterMonthlyAllocation,
                             CostCenterMonthlyEncumbrance,
                             CostCenterMonthlyForecastAdjustment,
                             CostCenterMonthlyLineItemForecast)
+from reports.periodhistory import PeriodHistory
 from utils.dataframe import BFTDataFrame
 
 logger = logging.getLogger("django")
@@ -62,13 +65,88 @@ class MonthlyReport:
             self.period = None
 
 
+class SnapshotWriter:
+    """Replaces one slice, such as a FY and period, of a snapshot table with the rows of a grouped queryset.
+
+    The aggregation is evaluated exactly once.  By default its rows are pulled into Python and written with
+    bulk_create, batch_size rows at a time.  With insert_select, the rows are written by a single
+    INSERT ... SELECT, so they never leave the database.  The time taken by each step is logged.
+
+    Args:
+        model: The snapshot model, such as CostCenterMonthlyEncumbrance.
+        batch_size (int, optional): Rows per INSERT with bulk_create. Defaults to BATCH_SIZE.
+        insert_select (bool, optional): Write rows with INSERT ... SELECT. Defaults to False.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, model, batch_size: int = None, insert_select: bool = False):
+        self.model = model
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.insert_select = insert_select
+
+    def _insert_select(self, lines: QuerySet) -> int:
+        quote = connection.ops.quote_name
+        fields = list(lines.query.values_select) + list(lines.query.annotation_select)
+        defaults = [f for f in self.model._meta.concrete_fields if not f.primary_key and f.name not in fields]
+        columns = [quote(self.model._meta.get_field(f).column) for f in fields] + [quote(f.column) for f in defaults]
+        select = [quote(f) for f in fields] + ["%s"] * len(defaults)
+        sql, params = lines.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(self.model._meta.db_table)} ({', '.join(columns)}) "
+                f"SELECT {', '.join(select)} FROM ({sql}) snapshot",
+                [f.get_db_prep_save(f.get_default(), connection) for f in defaults] + list(params),
+            )
+            return cursor.rowcount
+
+    def replace(self, lines, keep_if_empty: bool = False, **lookups) -> int:
+        """Delete the slice and insert the lines in its place, in one transaction.
+
+        Args:
+            lines (QuerySet | list[dict]): Rows to insert, as dicts of model fields.  With insert_select, a values()
+                QuerySet whose fields are named as the model fields.
+            keep_if_empty (bool, optional): Leave the slice untouched when there are no lines. Defaults to False.
+            **lookups: Field lookups of the rows to replace, such as fy=2024, period=1.
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        timings = {}
+        start = time.perf_counter()
+        with transaction.atomic():
+            if not self.insert_select:
+                lines = list(lines)
+                timings["aggregate"] = time.perf_counter() - start
+                if not lines and keep_if_empty:
+                    logger.info(f"{self.model.__name__}: there are no lines to insert.")
+                    return 0
+            step = time.perf_counter()
+            self.model.objects.filter(**lookups).delete()
+            timings["delete"] = time.perf_counter() - step
+            step = time.perf_counter()
+            if self.insert_select:
+                inserted = self._insert_select(lines)
+                if not inserted and keep_if_empty:
+                    transaction.set_rollback(True)
+            else:
+                objs = self.model.objects.bulk_create(
+                    [self.model(**line) for line in lines], batch_size=self.batch_size
+                )
+                inserted = len(objs)
+            timings["insert"] = time.perf_counter() - step
+        times = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items())
+        logger.info(f"{self.model.__name__} {lookups}: {inserted} rows inserted, {times}.")
+        return inserted
+
+
 class CostCenterMonthlyAllocationReport(MonthlyReport):
     def sum_allocation_cost_center(self) -> QuerySet:
-        """Given a FY, quarter and period, sum the allocation of cost centers grouped by fund and period."""
+        """Given a FY, quarter and period, sum the allocation of cost centers of the FY and quarter grouped by fund."""
         if not all([self.fy, self.quarter, self.period]):
             raise ValueError(f"Argument cannot be none in FY={self.fy}, quarter={self.quarter}, period={self.period}")
         grouped_sum = (
-            CostCenterAllocation.objects.filter(quarter=self.quarter)
+            CostCenterAllocation.objects.filter(fy=self.fy, quarter=self.quarter)
             .values("costcenter__costcenter", "fund__fund")
             .annotate(
                 allocation=Sum("amount"),
@@ -86,14 +164,11 @@ class CostCenterMonthlyAllocationReport(MonthlyReport):
             "costcenter",
         )
 
-    def insert_grouped_allocation(self, lines: QuerySet) -> int:
-        """Delete all allocations for a given FY and period and insert allocations from given queryset of lines."""
-        if len(lines) == 0:
-            logger.info("There are no allocations to insert given the queryset provided.")
-            # return 0  otherwise, on delete an allocation, it will exit here because queryset is empty.
-        CostCenterMonthlyAllocation.objects.filter(fy=self.fy, period=self.period).delete()
-        md = CostCenterMonthlyAllocation.objects.bulk_create([CostCenterMonthlyAllocation(**q) for q in lines])
-        return len(md)
+    def insert_grouped_allocation(self, lines: QuerySet, batch_size: int = None, insert_select: bool = False) -> int:
+        """Delete all allocations for a given FY and period and insert allocations from given queryset of lines.
+        The slice is emptied even if there are no lines, so that a deleted allocation disappears from it."""
+        writer = SnapshotWriter(CostCenterMonthlyAllocation, batch_size, insert_select)
+        return writer.replace(lines, fy=self.fy, period=self.period)
 
     def dataframe(self) -> pd.DataFrame:
         """Create a pandas dataframe using CostCenterMonthlyAllocation data as source
@@ -140,16 +215,12 @@ class CostCenterMonthlyForecastLineItemReport(MonthlyReport):
             "costcenter",
         )
 
-    def insert_grouped_forecast_line_item(self, lines: QuerySet) -> int:
-        if len(lines) == 0:
-            logger.info("There are no line items.")
-            return 0
-        CostCenterMonthlyLineItemForecast.objects.filter(fy=self.fy, period=self.period).delete()
+    def insert_grouped_forecast_line_item(
+        self, lines: QuerySet, batch_size: int = None, insert_select: bool = False
+    ) -> int:
+        writer = SnapshotWriter(CostCenterMonthlyLineItemForecast, batch_size, insert_select)
         try:
-            md = CostCenterMonthlyLineItemForecast.objects.bulk_create(
-                [CostCenterMonthlyLineItemForecast(**q) for q in lines]
-            )
-            return len(md)
+            return writer.replace(lines, keep_if_empty=True, fy=self.fy, period=self.period)
         except IntegrityError as e:
             logger.error(f"insert_grouped_forecast_line_item: {e}")
 
@@ -199,14 +270,11 @@ class CostCenterMonthlyForecastAdjustmentReport(MonthlyReport):
             "costcenter",
         )
 
-    def insert_grouped_forecast_adjustment(self, lines: QuerySet) -> int:
-        if len(lines) == 0:
-            logger.info("There are no forecast adjustments to insert")
-        CostCenterMonthlyForecastAdjustment.objects.filter(fy=self.fy, period=self.period).delete()
-        md = CostCenterMonthlyForecastAdjustment.objects.bulk_create(
-            [CostCenterMonthlyForecastAdjustment(**q) for q in lines]
-        )
-        return len(md)
+    def insert_grouped_forecast_adjustment(
+        self, lines: QuerySet, batch_size: int = None, insert_select: bool = False
+    ) -> int:
+        writer = SnapshotWriter(CostCenterMonthlyForecastAdjustment, batch_size, insert_select)
+        return writer.replace(lines, fy=self.fy, period=self.period)
 
     def dataframe(self) -> pd.DataFrame:
         """Create a pandas dataframe using CostCenterMonthlyForecastAdjustment data as source
@@ -261,13 +329,14 @@ class CostCenterMonthlyEncumbranceReport(MonthlyReport):
             "costcenter",
         )
 
-    def insert_line_items(self, lines: QuerySet) -> int:
-        if len(lines) == 0:
-            logger.info("There are no lines to insert")
-            return 0
-        CostCenterMonthlyEncumbrance.objects.filter(fy=self.fy, period=self.period).delete()
-        md = CostCenterMonthlyEncumbrance.objects.bulk_create([CostCenterMonthlyEncumbrance(**q) for q in lines])
-        return len(md)
+    def insert_line_items(self, lines: QuerySet, batch_size: int = None, insert_select: bool = False) -> int:
+        """Replace the FY and period slice of CostCenterMonthlyEncumbrance, and the period in PeriodHistory once
+        the transaction is committed."""
+        writer = SnapshotWriter(CostCenterMonthlyEncumbrance, batch_size, insert_select)
+        inserted = writer.replace(lines, keep_if_empty=True, fy=self.fy, period=self.period)
+        if self.period:
+            transaction.on_commit(lambda: PeriodHistory(self.fy).update(self.period), robust=True)
+        return inserted
 
     def dataframe(self) -> pd.DataFrame:
         """Create a pandas dataframe using CostCenterMonthly data as source for the given FY and period.
@@ -300,6 +369,103 @@ class CostCenterMonthlyEncumbranceReport(MonthlyReport):
         return monthly_df.build(qst)
 
 
+class CostCenterMonthlySnapshot(MonthlyReport):
+    """Month-end snapshot of every cost center and fund, written to the four CostCenterMonthly tables and to
+    CostCenterInYearEncumbrance at once.
+
+    Line items are scanned once, with their forecast, in a single grouped query that gives the encumbrance
+    totals and the line item forecast of every cost center and fund.  Allocations of the quarter and forecast
+    adjustments are grouped with the queries of CostCenterMonthlyAllocationReport and
+    CostCenterMonthlyForecastAdjustmentReport.  The (fy, period) slice of every monthly table, and the fy
+    slice of the in-year table, are then replaced in one transaction, so the tables always agree with each
+    other.  As with the monthly commands, the encumbrance, line item forecast and in-year slices are left
+    untouched when there are no line items, while allocations and forecast adjustments are always replaced.
+
+    Usage:
+        CostCenterMonthlySnapshot(fy, period, quarter=quarter).main()
+    """
+
+    ENCUMBRANCE_FIELDS = ["spent", "commitment", "pre_commitment", "fund_reservation", "balance", "working_plan"]
+    #: Tables whose slice is kept when there are no rows to write, as their insert_* methods do.
+    KEEP_IF_EMPTY = (CostCenterMonthlyEncumbrance, CostCenterMonthlyLineItemForecast, CostCenterInYearEncumbrance)
+
+    def sum_line_items(self) -> QuerySet:
+        """Encumbrance totals and line item forecast of every cost center and fund."""
+        return LineItem.objects.values("costcenter__costcenter", "fund").annotate(
+            spent=Sum("spent"),
+            commitment=Sum("balance", filter=Q(doctype="CO")),
+            pre_commitment=Sum("balance", filter=Q(doctype="PC")),
+            fund_reservation=Sum("balance", filter=Q(doctype="FR")),
+            balance=Sum("balance"),
+            working_plan=Sum("workingplan"),
+            line_item_forecast=Sum("fcst__forecastamount"),
+        )
+
+    def snapshot(self, insert_select: bool = False) -> dict[type, list | QuerySet]:
+        """Rows of each snapshot table, as dicts of model fields, keyed by model.  Allocations and forecast
+        adjustments are the grouped querysets of their monthly reports.  With insert_select, the other tables
+        also get the grouped querysets of their reports, so that no row is read in Python."""
+        quarter = getattr(self, "quarter", None)
+        if not all([self.fy, self.period, quarter]):
+            raise ValueError(f"Argument cannot be none in FY={self.fy}, quarter={quarter}, period={self.period}")
+        monthly = {"fy": self.fy, "period": self.period}
+        rows = {
+            CostCenterMonthlyEncumbrance: [],
+            CostCenterMonthlyLineItemForecast: [],
+            CostCenterMonthlyAllocation: CostCenterMonthlyAllocationReport(
+                self.fy, self.period, quarter=quarter
+            ).sum_allocation_cost_center(),
+            CostCenterMonthlyForecastAdjustment: CostCenterMonthlyForecastAdjustmentReport(
+                self.fy, self.period
+            ).sum_forecast_adjustments(),
+            CostCenterInYearEncumbrance: [],
+        }
+        if insert_select:
+            rows[CostCenterMonthlyEncumbrance] = CostCenterMonthlyEncumbranceReport(
+                self.fy, self.period
+            ).sum_line_items()
+            rows[CostCenterMonthlyLineItemForecast] = CostCenterMonthlyForecastLineItemReport(
+                self.fy, self.period
+            ).sum_forecast_line_item()
+            rows[CostCenterInYearEncumbrance] = CostCenterInYearEncumbranceReport(self.fy).sum_line_items()
+            return rows
+        for line in self.sum_line_items():
+            key = {"costcenter": line["costcenter__costcenter"], "fund": line["fund"]}
+            totals = {field: line[field] for field in self.ENCUMBRANCE_FIELDS}
+            rows[CostCenterMonthlyEncumbrance].append({**key, **monthly, **totals})
+            rows[CostCenterInYearEncumbrance].append({**key, "fy": self.fy, **totals})
+            if line["line_item_forecast"] is not None:
+                rows[CostCenterMonthlyLineItemForecast].append(
+                    {**key, **monthly, "line_item_forecast": line["line_item_forecast"]}
+                )
+        return rows
+
+    def main(self, batch_size: int = None, insert_select: bool = False) -> dict[str, int]:
+        """Replace the FY and period slice of every snapshot table.
+
+        Args:
+            batch_size (int, optional): Rows per INSERT. Defaults to SnapshotWriter.BATCH_SIZE.
+            insert_select (bool, optional): Write every table with INSERT ... SELECT. Line items are then
+                grouped once per table instead of once for all tables. Defaults to False.
+
+        Returns:
+            dict[str, int]: Number of rows written, keyed by model name.
+        """
+        rows = self.snapshot(insert_select)
+        counts = {}
+        with transaction.atomic():
+            for model, lines in rows.items():
+                if model is CostCenterInYearEncumbrance:
+                    lookups = {"fy": self.fy}
+                else:
+                    lookups = {"fy": self.fy, "period": self.period}
+                writer = SnapshotWriter(model, batch_size, insert_select)
+                counts[model.__name__] = writer.replace(lines, keep_if_empty=model in self.KEEP_IF_EMPTY, **lookups)
+            transaction.on_commit(lambda: PeriodHistory(self.fy).update(self.period), robust=True)
+        logger.info(f"Monthly snapshot for FY {self.fy} period {self.period}: {counts}")
+        return counts
+
+
 class CostCenterScreeningReport:
     def __init__(self):
         self.fcm = FundCenterManager()
@@ -396,8 +562,7 @@ class CostCenterScreeningReport:
         """
         lines = LineItem.objects.all()
         fc = FundCenter.objects.get(fundcenter=fundcenter.upper())
-        path = fc.sequence
-        ccs = CostCenter.objects.filter(sequence__startswith=path)
+        ccs = FinancialStructureManager().CostCenters(fc)
         lines = lines.filter(costcenter__in=ccs)
         lines = lines.filter(fund=fund.upper())
         if doctype:
@@ -448,27 +613,6 @@ class CostCenterScreeningReport:
             ids[v["Path"]] = v
         return ids
 
-    def allocation_rollup(self, alloc: dict) -> dict:
-        """Update the financial data of the specified dict by summing up the numbers based on parent hierarchy.
-
-        Args:
-            alloc (dict): Allocations to process
-
-        Returns:
-            dict: A dictionary which financial data is rolled up.
-        """
-
-        for _, item in alloc.items():
-            parent_path = alloc.get(item["Parent Path"], {"Path": None})["Path"]
-            if parent_path:
-                for p in alloc:
-                    if alloc[p]["Path"] == parent_path:
-                        continue
-                    if parent_path in alloc[p]["Path"]:
-                        alloc[parent_path]["Spent"] += item["Spent"]
-
-        return alloc
-
     def init_fin_values(self, allocation: dict) -> dict:
         init_values = {
             "CO": 0,
@@ -769,25 +913,20 @@ class CostCenterInYearEncumbranceReport(InYearReport):
             "costcenter",
         )
 
-    def insert_line_items(self, lines: QuerySet) -> int:
-        if len(lines) == 0:
-            logger.info("There are no lines to insert")
-            return 0
-        CostCenterInYearEncumbrance.objects.filter(fy=self.fy).delete()
-        md = CostCenterInYearEncumbrance.objects.bulk_create([CostCenterInYearEncumbrance(**q) for q in lines])
-        return len(md)
+    def insert_line_items(self, lines: QuerySet, batch_size: int = None, insert_select: bool = False) -> int:
+        writer = SnapshotWriter(CostCenterInYearEncumbrance, batch_size, insert_select)
+        return writer.replace(lines, keep_if_empty=True, fy=self.fy)
 
     def dataframe(self) -> pd.DataFrame:
-        """Create a pandas dataframe using CostCenterInYear data as source for the given FY.
+        """Create a pandas dataframe of the monthly encumbrance of the given FY, read from PeriodHistory.
 
         Returns:
-            pandas.DataFrame: dataframe containing cost center monthly data with the following columns :
-            "ID",
-            "Fund",
-            "Source",
+            pandas.DataFrame: dataframe containing cost center monthly data sorted by period, with the following
+            columns :
             "Cost Center",
-            "Fund Center",
+            "Fund",
             "FY",
+            "Period",
             "Spent",
             "Commitment",
             "Pre Commitment",
@@ -795,15 +934,4 @@ class CostCenterInYearEncumbranceReport(InYearReport):
             "Balance",
             "Working Plan"
         """
-        inyear_df = BFTDataFrame(CostCenterMonthlyEncumbrance)
-        qst = CostCenterMonthlyEncumbrance.objects.filter(fy=self.fy)
-        if self.fund:
-            qst = qst.filter(fund=self.fund)
-        if self.costcenter:
-            qst = qst.filter(costcenter=self.costcenter)
-        if qst.count() == 0:
-            return pd.DataFrame()
-        inyear_df = inyear_df.build(qst)
-        inyear_df.Period = inyear_df.Period.astype("int")
-        inyear_df = inyear_df.sort_values("Period")
-        return inyear_df
+        return PeriodHistory(self.fy).dataframe(costcenter=self.costcenter, fund=self.fund)
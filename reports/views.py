@@ -1,21 +1,21 @@
 import csv
+from itertools import chain, islice
 
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Value as V
 from django.db.models.functions import Concat
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 
 from bft import conf
 from bft.conf import QUARTERKEYS
-from bft.exceptions import LineItemsDoNotExistError
 from bft.models import (BftStatus, BftStatusManager, CapitalProjectManager,
                         CostCenterAllocation, CostCenterChargeMonthly,
                         CostCenterManager, FinancialStructureManager,
                         FundCenterAllocation, FundCenterManager, FundManager,
                         LineItem)
-from reports import capitalforecasting, screeningreport, utils
+from reports import capitalforecasting, reportcache, utils
 from reports.forms import (SearchAllocationAnalysisForm,
                            SearchCapitalEstimatesForm, SearchCapitalFearsForm,
                            SearchCapitalForecastingDashboardForm,
@@ -31,11 +31,12 @@ from reports.forms import (SearchAllocationAnalysisForm,
 
 
 def bmt_screening_report(request):
+    status = BftStatus.current
     initial = {
         "fundcenter": None,
         "fund": None,
-        "fy": BftStatus.current.fy(),
-        "quarter": BftStatus.current.quarter(),
+        "fy": status.fy(),
+        "quarter": status.quarter(),
     }
 
     query_string = None
@@ -78,11 +79,8 @@ def bmt_screening_report(request):
         query_string = request.GET.urlencode()
 
     if initial["fundcenter"] and initial["fund"]:
-        sr = screeningreport.ScreeningReport(fundcenter, fund, fy, quarter)
-        try:
-            sr.main()
-            table = sr.html()
-        except LineItemsDoNotExistError:
+        table = reportcache.screening_report(initial["fundcenter"], initial["fund"], fy, quarter)
+        if table is None:
             messages.warning(request, f"No lines items found for {fund} and {fundcenter}")
             table = ""
 
@@ -92,7 +90,7 @@ def bmt_screening_report(request):
         "form_filter": form_filter,
         "initial": initial,
         "table": table,
-        "fy": BftStatus.current.fy(),
+        "fy": status.fy(),
         "url_name": "bmt-screening-report",
         "title": "BMT Screening Report",
         "query_string": query_string,
@@ -139,10 +137,7 @@ def allocation_status_report(request):
     }
 
     if has_cc_allocation or has_fc_allocation:
-        r = utils.AllocationStatusReport()
-        table = r.main(
-            fundcenter, fund, fy, quarter
-        )  # allocation_status_dataframe(fundcenter, fund, fy, int(quarter))
+        table = reportcache.allocation_status_report(fundcenter, fund, fy, quarter)
 
     form = SearchAllocationAnalysisForm(initial=initial)
     context = {
@@ -596,16 +591,17 @@ def costcenter_in_year_fear(request):
                 messages.warning(request, "There are no allocations recorded")
 
             # CC forecast adjustment for given CC, period and fund.  For chart threshold line
+            period = BftStatusManager().period()
             fcst_adj = utils.CostCenterMonthlyForecastAdjustmentReport(
                 fy=initial["fy"],
-                period=BftStatusManager().period(),
+                period=period,
                 costcenter=initial["costcenter"],
                 fund=initial["fund"],
             )
             fcst_adj_df = fcst_adj.dataframe()
             fcst_line_items = utils.CostCenterMonthlyForecastLineItemReport(
                 fy=initial["fy"],
-                period=BftStatusManager().period(),
+                period=period,
                 costcenter=initial["costcenter"],
                 fund=initial["fund"],
             )
@@ -650,26 +646,64 @@ def line_items(request):
     return render(request, "lineitem-report.html", context)
 
 
+class FinancialStructureRows:
+    """Rows of the financial structure report for a Paginator, counted and sliced on the walk of the cached tree,
+    so that only the rows of the page get their field values fetched."""
+
+    def __init__(self, root: str = None):
+        self.root = root
+        self.manager = FinancialStructureManager()
+
+    def count(self) -> int:
+        return sum(1 for _ in self.manager.financial_structure_nodes(self.root))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, key: slice) -> list[dict]:
+        nodes = islice(self.manager.financial_structure_nodes(self.root), key.start, key.stop)
+        return list(self.manager.financial_structure_rows(nodes=nodes))
+
+
 def financial_structure_report(request):
-    fsm = FinancialStructureManager()
-    data = fsm.financial_structure_dataframe()
-    if not data.empty:
-        data = fsm.financial_structure_styler(data)
-        data = data.to_html(bold_rows=False)
-    else:
-        messages.info(request, "No data")
-        data = ""
+    root = request.GET.get("fundcenter", "").upper()
+    paginator = Paginator(FinancialStructureRows(root or None), 100)
+    if not paginator.count:
+        messages.info(request, f"No data for {root}" if root else "No data")
     return render(
         request,
         "financial-structure-report.html",
         {
-            "table": data,
+            "data": paginator.get_page(request.GET.get("page")),
+            "columns": FinancialStructureManager.FINANCIAL_STRUCTURE_COLUMNS,
+            "fundcenter": root,
+            "query_string": f"fundcenter={root}" if root else "",
             "title": "Financial Structure Report",
             "url_name": "financial-structure-report",
         },
     )
 
 
+class Echo:
+    """File-like object that returns what is written, so csv.writer can feed a StreamingHttpResponse."""
+
+    def write(self, value):
+        return value
+
+
+def csv_financial_structure(request):
+    root = request.GET.get("fundcenter", "").upper()
+    columns = FinancialStructureManager.FINANCIAL_STRUCTURE_COLUMNS
+    writer = csv.writer(Echo())
+    rows = FinancialStructureManager().financial_structure_rows(root or None)
+    lines = chain([columns], ([row[column] for column in columns] for row in rows))
+    return StreamingHttpResponse(
+        (writer.writerow(line) for line in lines),
+        content_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="financial-structure.csv"'},
+    )
+
+
 """
 Writes line item report to csv.
 """